@@ -0,0 +1,139 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+"""Asyncio twin of TSApiWrapper to fan out calls to TS app."""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import tsApi
+from globalClasses import Constants, Result
+
+
+def _threaded(method_name):
+    """Creates a coroutine method which runs the TSApiWrapper method of the
+       same name in the executor of the AsyncTSApiWrapper.
+       @param method_name: Name of the TSApiWrapper method.
+       @return: Coroutine function to be used as a method.
+    """
+
+    async def method(self, *args, **kwargs):
+        return await self._call(getattr(self.ts_handle, method_name),
+                                *args, **kwargs)
+
+    method.__name__ = method_name
+    method.__doc__ = getattr(tsApi.TSApiWrapper, method_name).__doc__
+    return method
+
+
+# pylint: disable=R0903
+class AsyncTSApiWrapper():
+    """Asyncio version of TSApiWrapper with the same method surface. Each
+       method is a coroutine returning the same Result object as its blocking
+       counterpart.
+
+       The calls are made by a TSApiWrapper on a bounded pool of threads
+       sharing its session, hence cookies and connection pool. A semaphore
+       bounds the number of requests in flight so that callers can gather
+       hundreds of calls without overwhelming the cluster.
+
+       NOTE: The org context of the session is shared by all calls, so calls
+       which depend on the current org must not be gathered together with a
+       switch_org call.
+    """
+
+    DEFAULT_MAX_IN_FLIGHT = 8
+
+    def __init__(self, ts_handle=None, max_in_flight=None, disable_ssl=False):
+        """@param ts_handle: Logged in TSApiWrapper to make the calls with. A
+           new one is created if not given and login needs to be called.
+           @param max_in_flight: Maximum number of requests in flight.
+           @param disable_ssl: Flag to disable SSL verification, used only if
+           ts_handle is not given.
+        """
+        self.ts_handle = ts_handle or tsApi.TSApiWrapper(disable_ssl)
+        self.max_in_flight = (max_in_flight
+                              or AsyncTSApiWrapper.DEFAULT_MAX_IN_FLIGHT)
+        self.ts_handle._ensure_pool_size(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        # Created lazily as it has to belong to the running event loop.
+        self._semaphore = None
+
+    def close(self):
+        """Releases the threads used to make the calls."""
+        self._executor.shutdown(wait=True)
+
+    async def _call(self, function, *args, **kwargs):
+        """Runs a blocking call in the executor once a request slot is free.
+           @param function: Blocking function to call.
+           @return: Return value of the function.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(function, *args, **kwargs))
+
+    # Authentication Functions #
+    login = _threaded("login")
+    info = _threaded("info")
+    is_admin = _threaded("is_admin")
+    switch_org = _threaded("switch_org")
+
+    # User Functions #
+    search_user = _threaded("search_user")
+    create_user = _threaded("create_user")
+    update_user = _threaded("update_user")
+    update_user_org = _threaded("update_user_org")
+    sync_user = _threaded("sync_user")
+    delete_users = _threaded("delete_users")
+
+    # Group Functions #
+    search_group = _threaded("search_group")
+    create_ts_group = _threaded("create_ts_group")
+    update_group = _threaded("update_group")
+    sync_group = _threaded("sync_group")
+    delete_groups = _threaded("delete_groups")
+    add_user_to_group = _threaded("add_user_to_group")
+    add_groups_to_group = _threaded("add_groups_to_group")
+    update_users_to_group = _threaded("update_users_to_group")
+    update_groups_to_group = _threaded("update_groups_to_group")
+
+    # Org Functions #
+    create_org = _threaded("create_org")
+
+    # List Functions #
+    list_users = _threaded("list_users")
+    list_groups = _threaded("list_groups")
+    list_orgs = _threaded("list_orgs")
+    list_users_in_group = _threaded("list_users_in_group")
+    list_groups_in_group = _threaded("list_groups_in_group")
+    get_userid_with_name = _threaded("get_userid_with_name")
+    get_groupid_with_name = _threaded("get_groupid_with_name")
+
+    async def sync_users(self, users, upsert_user=False, all_org_scope=False):
+        """Sync a batch of users with TS like TSApiWrapper.sync_users, with
+           the create/update calls of the users which differ from TS system
+           made concurrently.
+           @param users: List of desired user states, see
+           TSApiWrapper.sync_users.
+           @param upsert_user: Upsert the users if true else only create.
+           @param all_org_scope: if the sync call is in all org scope.
+           @return: Result object with operation status and data. Here data is
+           a dictionary of user name to the Result object of its sync.
+        """
+        result = await self._call(self.ts_handle.list_users_to_sync, users,
+                                  upsert_user)
+        if result.status != Constants.OPERATION_SUCCESS:
+            return result
+        ts_users = result.data
+
+        user_results = await asyncio.gather(*[
+            self._call(self.ts_handle.sync_listed_user, user,
+                       ts_users.get(user["name"].lower()), upsert_user,
+                       all_org_scope)
+            for user in users])
+        return Result(
+            Constants.OPERATION_SUCCESS,
+            {user["name"]: user_result
+             for user, user_result in zip(users, user_results)})
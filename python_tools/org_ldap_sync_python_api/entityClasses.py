@@ -3,6 +3,23 @@
 # Author: Vishwas B Sharma (vishwas.sharma@thoughtspot.com)
 """Classes to define and use Entity types we support in TS."""
 
+import sys
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import islice
+
+
+def intern_str(value):
+    """Interns strings so that names and DNs repeated across listings,
+       member lists and indexes are stored once.
+       @param value: String to intern, other values are returned as is.
+       @return: Interned string or the value.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
 
 class EntityType():
     """Entity Class to define and use different types of entities.
@@ -22,16 +39,208 @@ class EntityProperty():
        objects of this class.
     """
 
-    def __init__(self, prop_id, prop_name, prop_type=None, prop_orgids=None):
+    __slots__ = ("id", "name", "type", "orgIds", "display_name", "email")
+
+    def __init__(self, prop_id, prop_name, prop_type=None, prop_orgids=None,
+                 prop_display_name=None, prop_email=None):
         """@param prop_id: ID used to view/delete User/Group entities.
            @param prop_name: Unique name property of the entity.
            @param prop_type: Type property of the entity.
            @param prop_orgIds: orgs for entity.
+           @param prop_display_name: Display name of the entity if known.
+           @param prop_email: Email of the user if known.
         """
-        self.id = prop_id
-        self.name = prop_name
-        self.type = prop_type
+        self.id = intern_str(prop_id)
+        self.name = intern_str(prop_name)
+        self.type = intern_str(prop_type)
         self.orgIds = prop_orgids
+        self.display_name = prop_display_name
+        self.email = prop_email
 
     def __repr__(self):
         return "ID: {} Name: {} Type: {}".format(self.id, self.name, self.type)
+
+
+class PrincipalIndex():
+    """In memory snapshot of the principals (users or groups) present in TS
+       system. The snapshot is built once from a listing call and then kept
+       in sync by the write calls made during the session, so that name to ID
+       lookups do not need another listing call to the TS system.
+    """
+
+    def __init__(self, entities=None):
+        """@param entities: List of EntityProperty objects to seed the index
+           with.
+        """
+        self._by_id = {}
+        self._by_name = {}
+        self._by_name_org = {}
+        # Group ID to member IDs, stored per member EntityType.
+        self._members = {}
+        # Whether the memberships of all the groups were fetched in bulk.
+        self.memberships_loaded = False
+        for entity in entities or []:
+            self.add(entity)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, entity_id):
+        return entity_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def add(self, entity):
+        """Adds or replaces an entity in the index.
+           @param entity: EntityProperty object to index.
+        """
+        if entity.id in self._by_id:
+            self.remove(entity.id)
+        name = intern_str(entity.name.lower())
+        self._by_id[entity.id] = entity
+        self._by_name[name] = entity
+        for org_id in entity.orgIds or []:
+            self._by_name_org[(name, org_id)] = entity
+
+    def remove(self, entity_id):
+        """Removes an entity from the index.
+           @param entity_id: ID of the entity to remove.
+           @return: Removed EntityProperty object or None if not indexed.
+        """
+        entity = self._by_id.pop(entity_id, None)
+        if entity is None:
+            return None
+        name = entity.name.lower()
+        if self._by_name.get(name) is entity:
+            del self._by_name[name]
+        for org_id in entity.orgIds or []:
+            if self._by_name_org.get((name, org_id)) is entity:
+                del self._by_name_org[(name, org_id)]
+        self._members.pop(entity_id, None)
+        for members in self._members.values():
+            for member_ids in members.values():
+                member_ids.discard(entity_id)
+        return entity
+
+    def get_by_id(self, entity_id):
+        """@param entity_id: ID of the entity.
+           @return: EntityProperty object or None if not indexed.
+        """
+        return self._by_id.get(entity_id)
+
+    def get_by_name(self, name, org_id=None):
+        """Case insensitive lookup of an entity by its unique name.
+           @param name: Unique name of the entity.
+           @param org_id: Restrict the lookup to the entity in this org.
+           @return: EntityProperty object or None if not indexed.
+        """
+        if org_id is None:
+            return self._by_name.get(name.lower())
+        return self._by_name_org.get((name.lower(), org_id))
+
+    def set_members(self, group_id, member_type, member_ids):
+        """Records the member list of a group.
+           @param group_id: ID of the parent group.
+           @param member_type: EntityType of the members.
+           @param member_ids: IDs of the members.
+        """
+        self._members.setdefault(group_id, {})[member_type] = set(member_ids)
+
+    def get_members(self, group_id, member_type):
+        """@param group_id: ID of the parent group.
+           @param member_type: EntityType of the members.
+           @return: Set of member IDs or None if membership is not indexed.
+        """
+        return self._members.get(group_id, {}).get(member_type)
+
+
+class MembershipGraph():
+    """Set of (member DN, group DN) pairs of the groups to sync. Each DN is
+       numbered once and a pair is stored as the two numbers packed into an
+       array, instead of a tuple of two strings per pair. A pair with None as
+       the member DN records an empty group.
+       The array holds a sorted prefix without duplicates followed by the
+       pairs added since. These are sorted and merged into the prefix, dropping
+       pairs added twice, when the pairs are next counted, looked up or
+       iterated over, or once they reach a quarter of the prefix. The latter
+       bounds the temporary list sorting them, and the duplicates held.
+    """
+
+    # Bits of a packed pair holding the number of the group DN.
+    GROUP_BITS = 32
+    # Least number of pairs added before they are merged on add.
+    COMPACT_MIN = 1 << 16
+
+    def __init__(self, pairs=None):
+        """@param pairs: Iterable of (member DN, group DN) pairs to add."""
+        # DNs by their number, 0 stands for None.
+        self._dns = [None]
+        self._numbers = {}
+        self._pairs = array("Q")
+        # Length of the sorted prefix of the pairs.
+        self._sorted_len = 0
+        for pair in pairs or []:
+            self.add(pair)
+
+    def _number(self, dn):
+        """@param dn: Distinguished name or None.
+           @return: Number of the DN, assigned on first use.
+        """
+        if dn is None:
+            return 0
+        number = self._numbers.get(dn)
+        if number is None:
+            dn = intern_str(dn)
+            number = len(self._dns)
+            self._numbers[dn] = number
+            self._dns.append(dn)
+        return number
+
+    def _compact(self):
+        """Merges the pairs added since the last call into the sorted prefix,
+           dropping duplicates in one pass over the merged pairs.
+        """
+        if self._sorted_len == len(self._pairs):
+            return
+        added = sorted(self._pairs[self._sorted_len:])
+        pairs = array("Q")
+        last = None
+        for packed in merge(islice(self._pairs, self._sorted_len), added):
+            if packed != last:
+                pairs.append(packed)
+                last = packed
+        self._pairs = pairs
+        self._sorted_len = len(pairs)
+
+    def add(self, pair):
+        """Adds a pair.
+           @param pair: (member DN, group DN) tuple.
+        """
+        member_dn, group_dn = pair
+        self._pairs.append(self._number(member_dn) << self.GROUP_BITS
+                           | self._number(group_dn))
+        if (len(self._pairs) - self._sorted_len
+                >= max(self._sorted_len >> 2, self.COMPACT_MIN)):
+            self._compact()
+
+    def __len__(self):
+        self._compact()
+        return len(self._pairs)
+
+    def __iter__(self):
+        self._compact()
+        mask = (1 << self.GROUP_BITS) - 1
+        for packed in self._pairs:
+            yield self._dns[packed >> self.GROUP_BITS], self._dns[packed & mask]
+
+    def __contains__(self, pair):
+        member_dn, group_dn = pair
+        if (member_dn is not None and member_dn not in self._numbers) \
+                or group_dn not in self._numbers:
+            return False
+        self._compact()
+        packed = (self._number(member_dn) << self.GROUP_BITS
+                  | self._number(group_dn))
+        ind = bisect_left(self._pairs, packed)
+        return ind < len(self._pairs) and self._pairs[ind] == packed
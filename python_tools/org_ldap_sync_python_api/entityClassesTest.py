@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Unit tests for the MembershipGraph of entityClasses.py.
+
+Example command:
+
+>>> python entityClassesTest.py
+"""
+
+import unittest
+from unittest import mock
+
+from entityClasses import MembershipGraph
+
+
+class TestMembershipGraph(unittest.TestCase):
+
+    def test_dedup(self):
+        """Tests pairs added twice are kept once, whether they were added
+           before or after the last merge.
+        """
+        graph = MembershipGraph([("cn=a", "cn=g"), ("cn=b", "cn=g"),
+                                 ("cn=a", "cn=g")])
+        self.assertEqual(len(graph), 2)
+        graph.add(("cn=b", "cn=g"))
+        graph.add(("cn=a", "cn=h"))
+        graph.add(("cn=a", "cn=h"))
+        self.assertEqual(len(graph), 3)
+
+    def test_iteration(self):
+        """Tests pairs are iterated over once each with their DNs, including
+           the None member of empty groups.
+        """
+        pairs = [("cn=b", "cn=g"), (None, "cn=e"), ("cn=a", "cn=g"),
+                 ("cn=g", "cn=h")]
+        graph = MembershipGraph(pairs + pairs[:2])
+        self.assertEqual(sorted(graph, key=str), sorted(pairs, key=str))
+        graph.add(("cn=c", "cn=g"))
+        self.assertEqual(len(list(graph)), 5)
+
+    def test_contains(self):
+        """Tests pairs are found whether they were merged yet or not."""
+        graph = MembershipGraph([("cn=a", "cn=g"), (None, "cn=e")])
+        len(graph)
+        graph.add(("cn=b", "cn=g"))
+        self.assertIn(("cn=a", "cn=g"), graph)
+        self.assertIn(("cn=b", "cn=g"), graph)
+        self.assertIn((None, "cn=e"), graph)
+        self.assertNotIn(("cn=b", "cn=e"), graph)
+        self.assertNotIn((None, "cn=g"), graph)
+        self.assertNotIn(("cn=c", "cn=g"), graph)
+        self.assertEqual(len(graph), 3)
+
+    def test_compact_on_add(self):
+        """Tests pairs are merged once they reach a quarter of the merged
+           ones, so that duplicates do not pile up.
+        """
+        with mock.patch.object(MembershipGraph, "COMPACT_MIN", 4):
+            graph = MembershipGraph()
+            for _ in range(3):
+                for ind in range(8):
+                    graph.add(("cn=u{}".format(ind), "cn=g"))
+            self.assertLessEqual(len(graph._pairs), 8 + 4)
+            self.assertEqual(len(graph), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
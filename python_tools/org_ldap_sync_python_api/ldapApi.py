@@ -3,15 +3,23 @@
 # Author: Vishwas B Sharma (vishwas.sharma@thoughtspot.com)
 """Classes and Functions to log into and use LDAP System."""
 
+import datetime
 import logging
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import wraps
 
 import ldap3
 from ldap3.core.exceptions import (
     LDAPInvalidCredentialsResult,
     LDAPServerPoolError,
+    LDAPException,
     LDAPExceptionError)
-from entityClasses import EntityType
+from ldap3.utils.conv import escape_filter_chars
+from entityClasses import EntityType, intern_str
 from globalClasses import Constants, Result
 
 def safe_str(inp):
@@ -50,12 +58,212 @@ def pre_check(function):
     return wrapper
 
 
+class LDAPEntryCache():
+    """Size bounded cache of LDAP entries keyed by distinguished name. Least
+    recently used entries are evicted once the bound is reached. Entries which
+    are neither users nor groups are cached as None so that they are not
+    searched for again either.
+    """
+
+    DEFAULT_MAX_SIZE = 200000
+
+    def __init__(self, max_size=None):
+        """Constructor.
+
+        :param max_size: Maximum number of entries held by the cache.
+        """
+        self.max_size = max_size or LDAPEntryCache.DEFAULT_MAX_SIZE
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Tells if an entry is cached without counting a hit/miss."""
+        return key in self._entries
+
+    def lookup(self, key):
+        """Looks up an entry and counts the hit/miss.
+
+        :param key: Cache key of the entry.
+        :return: Tuple of a flag telling if the entry was found and the entry.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, entry):
+        """Adds or replaces an entry.
+
+        :param key: Cache key of the entry.
+        :param entry: User/Group object or None.
+        """
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """:return: Dictionary with hits, misses, size and hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": float(self.hits) / lookups if lookups else 0.0
+        }
+
+
+class LDAPConnectionPool():
+    """Thread safe pool of bound connections per domain. At most size
+    connections are bound to a domain, a checkout waits for one of them to be
+    returned once all are in use.
+
+    A thread gets back the connection it already holds for a domain when it
+    checks out again for the same domain, so that nested searches, like
+    fetching member ranges of a group while iterating over groups, do not
+    wait on themselves.
+    """
+
+    DEFAULT_SIZE = 1
+
+    def __init__(self, bind, size=None):
+        """Constructor.
+
+        :param bind: Function binding a new connection for a pool key.
+        :param size: Maximum number of connections per domain.
+        """
+        self._bind = bind
+        self.size = size or LDAPConnectionPool.DEFAULT_SIZE
+        self._condition = threading.Condition()
+        self._idle = defaultdict(list)
+        self._bound_cnt = defaultdict(int)
+        self._conn_keys = {}
+        # Connection id to the held connections of the thread holding it, so
+        # that it can be returned from another thread, e.g. by a generator
+        # finalized elsewhere.
+        self._holders = {}
+        self._held = threading.local()
+        # Connection id to connection of all the connections of the pool.
+        self.connections = {}
+
+    def _held_connections(self):
+        """:return: Dictionary of key to [connection, checkout count] of the
+        connections held by the current thread.
+        """
+        if not hasattr(self._held, "connections"):
+            self._held.connections = {}
+        return self._held.connections
+
+    def add(self, key, conn):
+        """Adds an already bound connection to the pool.
+
+        :param key: Pool key of the domain.
+        :param conn: Bound connection.
+        """
+        with self._condition:
+            self._bound_cnt[key] += 1
+            self._conn_keys[id(conn)] = key
+            self.connections[id(conn)] = conn
+            self._idle[key].append(conn)
+            self._condition.notify()
+
+    def checkout(self, key):
+        """Takes a connection to a domain out of the pool, binding a new one
+        if all bound ones are in use and the limit is not reached yet.
+
+        :param key: Pool key of the domain.
+        :return: Bound connection.
+        """
+        held = self._held_connections()
+        if key in held:
+            held[key][1] += 1
+            return held[key][0]
+
+        with self._condition:
+            while not self._idle[key] and self._bound_cnt[key] >= self.size:
+                self._condition.wait()
+            if self._idle[key]:
+                conn = self._idle[key].pop()
+            else:
+                # Reserve the slot, binding happens outside of the lock.
+                conn = None
+                self._bound_cnt[key] += 1
+
+        if conn is None:
+            try:
+                conn = self._bind(key)
+            except Exception:
+                with self._condition:
+                    self._bound_cnt[key] -= 1
+                    self._condition.notify()
+                raise
+            logging.debug("Bound connection %d to %s.",
+                          self._bound_cnt[key], key)
+            with self._condition:
+                self._conn_keys[id(conn)] = key
+                self.connections[id(conn)] = conn
+
+        held[key] = [conn, 1]
+        with self._condition:
+            self._holders[id(conn)] = held
+        return conn
+
+    def checkin(self, conn):
+        """Returns a connection taken out with checkout to the pool.
+
+        :param conn: Connection to return.
+        """
+        with self._condition:
+            key = self._conn_keys[id(conn)]
+            held = self._holders[id(conn)]
+        held[key][1] -= 1
+        if held[key][1] > 0:
+            return
+        del held[key]
+        with self._condition:
+            del self._holders[id(conn)]
+            self._idle[key].append(conn)
+            self._condition.notify()
+
+    def close(self):
+        """Unbinds all the connections of the pool, including the ones
+        checked out, and empties it.
+        """
+        with self._condition:
+            for conn in self.connections.values():
+                conn.unbind()
+            self._idle.clear()
+            self._bound_cnt.clear()
+            self._conn_keys.clear()
+            self._holders.clear()
+            self.connections.clear()
+
+
 class LDAPApiWrapper():
     """Wrapper class to connect to and fetch information from LDAP System."""
 
     class User():
         """Entity class to hold most important details of User object."""
 
+        __slots__ = ("dn", "name", "display_name", "email")
+        type = EntityType.USER
+
         def __init__(self, dn, name, display_name, email=None):
             """Constructor.
 
@@ -64,9 +272,8 @@ class LDAPApiWrapper():
             :param display_name: Display name for the user.
             :param email: Email of the user.
             """
-            self.type = EntityType.USER
-            self.dn = dn
-            self.name = name
+            self.dn = intern_str(dn)
+            self.name = intern_str(name)
             self.display_name = display_name
             self.email = email
 
@@ -77,7 +284,13 @@ class LDAPApiWrapper():
             )
 
     class Group():
-        """Entity class to hold most important details of Group object."""
+        """Entity class to hold most important details of Group object.
+        Member DNs are interned, so that a DN listed by many groups is stored
+        once.
+        """
+
+        __slots__ = ("dn", "name", "display_name", "members")
+        type = EntityType.GROUP
 
         def __init__(self, dn, name, display_name, members):
             """Constructor.
@@ -87,11 +300,10 @@ class LDAPApiWrapper():
             :param display_name: Display name property of the group.
             :param members: Distinguished name list of members of the group.
             """
-            self.type = EntityType.GROUP
-            self.dn = dn
-            self.name = name
+            self.dn = intern_str(dn)
+            self.name = intern_str(name)
             self.display_name = display_name
-            self.members = members
+            self.members = [intern_str(member) for member in members]
 
         def __repr__(self):
             prn = "Type: {} DN: {} Name: {} DisplayName: {} Members: {}"
@@ -111,6 +323,9 @@ class LDAPApiWrapper():
                       "(objectClass=groupOfUniqueNames))"
     FILTER_ADD = "(&{}{})"
     FILTER_OR = "(|{}{})"
+    # Escapes in a DN value: a hex pair, an escaped character, or a character
+    # special to filters which is not escaped in DNs.
+    RDN_ESCAPE_RE = re.compile(r"\\([0-9a-fA-F]{2})|\\(.)|([*()\x00])")
     ATTR_UPN = "userPrincipalName"
     ATTR_NAME = "name"
     ATTR_DISPLAY_NAME = "displayName"
@@ -120,6 +335,21 @@ class LDAPApiWrapper():
     ATTR_CATRECID = "catrecid"
     ATTR_UM = "uniqueMember"
     LIST_MEM_FILTER = "(cn=*)"
+    # Object classes matched by the user/group filters above, lower cased.
+    ATTR_OBJECT_CLASS = "objectClass"
+    USER_CLASSES_OPEN_LDAP = ("inetorgperson",)
+    GROUP_CLASSES_OPEN_LDAP = ("group", "groupofuniquenames")
+    USER_CLASSES_AD = ("user", "person")
+    GROUP_CLASSES_AD = ("group", "container", "groupofuniquenames")
+    # Attributes tracking changes to entries.
+    ATTR_USN_CHANGED = "uSNChanged"
+    ATTR_HIGHEST_USN = "highestCommittedUSN"
+    ATTR_SERVER_NAME = "serverName"
+    ATTR_MODIFY_TIMESTAMP = "modifyTimestamp"
+    ATTR_CONTEXT_CSN = "contextCSN"
+    ATTR_NAMING_CONTEXTS = "namingContexts"
+    # Generalized time before any change, the mark of an empty tree.
+    EPOCH_TIMESTAMP = "19700101000000Z"
 
     #AD Attribute settings
     AD_ATTR_UID = "sAMAccountName"
@@ -132,8 +362,22 @@ class LDAPApiWrapper():
     USER_AUTHENTICATION_SUCCESS = "User successfully authenticated."
     UNKNOWN_ENTITY_TYPE = "Unknown entity type."
 
-    def __init__(self):
-        """Constructor."""
+    # AD serves at most MaxPageSize (1000 by default) entries per page.
+    DEFAULT_PAGE_SIZE = 1000
+    # Maximum number of DNs resolved by a search of dns_to_objs, bounding
+    # the size of the OR filter.
+    DNS_PER_SEARCH = 200
+
+    def __init__(self, cache_size=None, page_size=None, pool_size=None):
+        """Constructor.
+
+        :param cache_size: Maximum number of entries kept in the DN to
+        user/group object cache.
+        :param page_size: Number of entries fetched per page of a search,
+        0 to fetch all entries of a search with a single request.
+        :param pool_size: Maximum number of connections bound to a domain,
+        which is also the number of searches run in parallel per domain.
+        """
         # As we allow both ldap and ldaps, we want to avoid self signed
         # certificates during ldaps authentication.
         # TODO:
@@ -145,13 +389,21 @@ class LDAPApiWrapper():
         attrs.extend(['catrecid'])
         ldap3.set_config_parameter('ATTRIBUTES_EXCLUDED_FROM_CHECK', attrs)
         self.connection_pool = {}
+        self._connection_lock = threading.Lock()
+        self.pool = LDAPConnectionPool(self._bind_pool_key, pool_size)
+        self.entry_cache = LDAPEntryCache(cache_size)
+        if page_size is None:
+            page_size = LDAPApiWrapper.DEFAULT_PAGE_SIZE
+        self.page_size = page_size
 
     def __del__(self):
         """On destructor call unbind and clear connection pool."""
+        # The primary connections are part of the pool, which unbinds them.
         for (_, conn) in list(self.connection_pool.items()):
-            if conn:
+            if conn and id(conn) not in self.pool.connections:
                 conn.unbind()
         self.connection_pool.clear()
+        self.pool.close()
 
     def bind_to(self, hostport, username, password):
         """Bind.
@@ -166,10 +418,27 @@ class LDAPApiWrapper():
         conn = ldap3.Connection(server, user=username, password=password,
                                 auto_referrals=False, receive_timeout=10,
                                 return_empty_attributes=False,
-                                raise_exceptions=True)
+                                raise_exceptions=True, collect_usage=True)
         conn.bind()
         return conn
 
+    def usage_stats(self):
+        """Sums up the usage statistics ldap3 collects for the connections.
+
+        :return: Dictionary of the number of connections, searches made and
+        bytes sent/received.
+        """
+        stats = {"connections": 0, "searches": 0, "bytes_sent": 0,
+                 "bytes_received": 0}
+        for conn in list(self.pool.connections.values()):
+            stats["connections"] += 1
+            if conn.usage is None:
+                continue
+            stats["searches"] += conn.usage.search_operations
+            stats["bytes_sent"] += conn.usage.bytes_transmitted
+            stats["bytes_received"] += conn.usage.bytes_received
+        return stats
+
     def get_hostport_from_dn(self, dn):
         """Try deriving the subdomain to connect to by using the DN.
 
@@ -179,34 +448,86 @@ class LDAPApiWrapper():
         hostport = self.__protocol + domain[1:]
         return hostport.lower()
 
-    def get_connection_to(self, hostport):
-        """Get connection to a specific domain/sub-domain from the pool.
+    def _get_pool_key(self, hostport):
+        """Resolves the key of the connections to use for a domain, binding
+        the primary connection to it if not done yet.
 
-        :param hostport: HostPort to connect to.
+        :param hostport: HostPort, or distinguished name to derive it from.
+        :return: HostPort to connect to, "default" if the domain could not be
+        bound to.
         """
         if not hostport.startswith("ldap"):
             # Try deriving hostport.
             hostport = self.get_hostport_from_dn(hostport)
 
-        # If connection not in pool create the same in pool.
-        if hostport not in self.connection_pool:
-            try:
-                conn = self.bind_to(hostport, self.__username, self.__password)
-                self.connection_pool[hostport] = conn
-                logging.debug("Binding to %s", hostport)
-            except:
-                # Use the default connection if there is an issue connecting to
-                # sub-domain.
-                self.connection_pool[hostport] = None
-                logging.debug("Failed to bind to %s.", hostport)
+        with self._connection_lock:
+            # If connection not in pool create the same in pool.
+            if hostport not in self.connection_pool:
+                try:
+                    conn = self.bind_to(
+                        hostport, self.__username, self.__password)
+                    self.connection_pool[hostport] = conn
+                    self.pool.add(hostport, conn)
+                    logging.debug("Binding to %s", hostport)
+                except:
+                    # Use the default connection if there is an issue
+                    # connecting to sub-domain.
+                    self.connection_pool[hostport] = None
+                    logging.debug("Failed to bind to %s.", hostport)
 
         # Implementing it this way will ensure we do not try an already failed
         # connection again and hence prevent an unnecessary network call to AD.
         if self.connection_pool[hostport]:
-            return self.connection_pool[hostport]
+            return hostport
 
         logging.debug("Returning default connection for %s.", hostport)
-        return self.connection_pool["default"]
+        return "default"
+
+    def _bind_pool_key(self, key):
+        """Binds an additional connection for a pool key.
+
+        :param key: Pool key as returned by _get_pool_key.
+        :return: Bound connection.
+        """
+        if key == "default":
+            key = self.__hostport
+        return self.bind_to(key, self.__username, self.__password)
+
+    def get_connection_to(self, hostport):
+        """Get connection to a specific domain/sub-domain from the pool.
+
+        :param hostport: HostPort to connect to.
+        """
+        return self.connection_pool[self._get_pool_key(hostport)]
+
+    def checkout_connection(self, hostport):
+        """Takes a connection to a specific domain/sub-domain out of the pool
+        for exclusive use by the calling thread. It has to be given back with
+        return_connection.
+
+        :param hostport: HostPort to connect to.
+        :return: Bound connection.
+        """
+        return self.pool.checkout(self._get_pool_key(hostport))
+
+    def return_connection(self, conn):
+        """Returns a connection taken out with checkout_connection.
+
+        :param conn: Connection to return.
+        """
+        self.pool.checkin(conn)
+
+    @contextmanager
+    def connection_to(self, hostport):
+        """Context manager version of checkout_connection/return_connection.
+
+        :param hostport: HostPort to connect to.
+        """
+        conn = self.checkout_connection(hostport)
+        try:
+            yield conn
+        finally:
+            self.return_connection(conn)
 
     def login(self, hostport, username, password):
         """Logs the user into LDAP system.
@@ -219,6 +540,7 @@ class LDAPApiWrapper():
         set to None.
         """
         # Store for future use.
+        self.__hostport = hostport
         if hostport.startswith("ldap://"):
             self.__protocol = "ldap://"
         else:
@@ -230,6 +552,7 @@ class LDAPApiWrapper():
             conn = self.bind_to(hostport, self.__username, self.__password)
             logging.debug(LDAPApiWrapper.USER_AUTHENTICATION_SUCCESS)
             self.connection_pool["default"] = conn
+            self.pool.add("default", conn)
             return Result(Constants.OPERATION_SUCCESS)
         except LDAPInvalidCredentialsResult as e:
             logging.error("Invalid credentials provided.")
@@ -275,7 +598,8 @@ class LDAPApiWrapper():
             filter_str=None,
             log_entities=True,
             authdomain_identifier=None,
-            member_str=None
+            member_str=None,
+            stream=False
     ):
     # pylint: enable=too-many-arguments
         """Fetches users present in LDAP System.
@@ -291,8 +615,12 @@ class LDAPApiWrapper():
         :param email_identifier: Identifier key to be used for user email.
         :param user_display_name_identifier: Identifier key to be used for
         displaying user's name
+        :param stream: Flag to return the users as they are fetched instead
+        of a list. The search is then run while the generator is consumed and
+        search errors are raised from it.
         :return: Result object with operation status and data. Here data is
-        a list of User objects present in LDAP System.
+        a list of User objects present in LDAP System, or a generator of
+        them if stream is set.
         """
         if LDAPApiWrapper.OPEN_LDAP == ldap_type:
             if user_identifier is None:
@@ -314,8 +642,6 @@ class LDAPApiWrapper():
             LDAPApiWrapper.ATTR_CATRECID
         ]
 
-        entity_list = []
-
         # Add user_identifier to attr_list if not already in retrieval list.
         if user_identifier is not None and user_identifier not in attr_list:
             attr_list.append(user_identifier)
@@ -351,102 +677,34 @@ class LDAPApiWrapper():
             logging.debug("Base DN: %s", basedn)
             logging.debug("Filter String: %s", filter_str)
             logging.debug("Attr List: %s", attr_list)
-        item_list = []
+
+        # Per entry messages are only built when they are going to be logged.
+        explain = log_entities and logging.getLogger().isEnabledFor(
+            logging.DEBUG)
+
+        def user_generator():
+            """Generator of users built from the entries fetched."""
+            for dn, entry in self._paged_search(
+                    basedn, scope, filter_str, attr_list):
+                user, msg = self._entry_to_user(
+                    dn, entry, user_identifier, email_identifier,
+                    user_display_name_identifier, authdomain_identifier,
+                    explain)
+                if explain:
+                    logging.debug("==> [%s,%s]\n%s", dn, entry, msg)
+                if user is not None:
+                    yield user
+
+        if stream:
+            return Result(Constants.OPERATION_SUCCESS, user_generator())
         try:
-            local_conn = self.get_connection_to(basedn)
-            local_conn.search(search_base=basedn,
-                              search_scope=scope,
-                              search_filter=filter_str,
-                              attributes=attr_list
-            )
-            for entry in local_conn.response:
-                i_entry = (entry['dn'], entry['attributes'])
-                item_list.append(i_entry)
+            entity_list = list(user_generator())
         except Exception as e:
             logging.debug("Threw exception for basedn %s with filter_string "
                           "%s.", basedn, filter_str)
             logging.error(e)
             return Result(Constants.OPERATION_FAILURE, e)
 
-        msg = "List of DNs retrieved from LDAP server:\n"
-        for dn, entry in item_list:
-            # Skip entities which are None
-            #
-            # NOTE: This becomes necessary because when we get the list of
-            # entities back we also have a reference entity describing where
-            # it was fetched from which has a None value for dn.
-            #
-            # This filtering helps us skip these metadata information.
-            if dn is None:
-                continue
-            msg += f"==> [{dn},{entry}]\n"
-
-            name = None
-
-            # Entity specific attributes and handling of unique name attribute
-            # if defaults are not present.
-            # Default attributes to be used as unique names.
-            if user_identifier in entry:
-                name = (
-                    safe_str(entry[user_identifier])
-                    + self._get_domain_name(
-                        dn,
-                        user_identifier,
-                        authdomain_identifier
-                    )
-                )
-                msg += (
-                    "Using `" + user_identifier + "` for"
-                    + " constructing unique name.\n"
-                )
-            elif LDAPApiWrapper.AD_ATTR_UID in entry:
-                # If userPrincipalName not present then use sAMAccountName to
-                # construct user name.
-                # For sAMAccountName, also append domain name in user name.
-                name = (
-                    safe_str(entry[LDAPApiWrapper.AD_ATTR_UID])
-                    + self._get_domain_name(
-                        dn,
-                        LDAPApiWrapper.AD_ATTR_UID,
-                        authdomain_identifier
-                    )
-                )
-                msg += (
-                    "Using `sAMAccountName` for"
-                    + " constructing unique name.\n"
-                )
-
-            if user_display_name_identifier in entry:
-                display_name = safe_str(entry[user_display_name_identifier])
-            elif LDAPApiWrapper.ATTR_DISPLAY_NAME in entry:
-                display_name = safe_str(
-                    entry[LDAPApiWrapper.ATTR_DISPLAY_NAME])
-            elif LDAPApiWrapper.ATTR_NAME in entry:
-                display_name = safe_str(entry[LDAPApiWrapper.ATTR_NAME])
-            elif LDAPApiWrapper.ATTR_CN in entry:
-                display_name = safe_str(entry[LDAPApiWrapper.ATTR_CN])
-            else:
-                display_name = name
-
-            email = None
-            if email_identifier in entry:
-                email = safe_str(entry[email_identifier])
-            # Unique name is required to login. Hence any user without
-            # a userPrincipalName/sAMAccountName would not be created
-            # as such a user cannot log into the system.
-            # NOTE: Should not be combined with previous if/elif as that
-            # would miss the case where one of them is present but is None.
-            if name is None:
-                msg += "No unique name found for entry\n"
-                continue
-
-            entity_list.append(
-                LDAPApiWrapper.User(dn, name, display_name, email)
-            )
-
-        if log_entities:
-            logging.debug(msg)
-
         return Result(Constants.OPERATION_SUCCESS, entity_list)
 
     @pre_check
@@ -459,7 +717,8 @@ class LDAPApiWrapper():
             scope=None,
             filter_str=None,
             log_entities=True,
-            member_str=None
+            member_str=None,
+            stream=False
     ):
         """Fetches groups present in LDAP System.
 
@@ -470,8 +729,12 @@ class LDAPApiWrapper():
         :param log_entities: Flag if entity logging should be done.
         :param group_display_name_identifier key is to be used for displaying
         group name
+        :param stream: Flag to return the groups as they are fetched instead
+        of a list. The search is then run while the generator is consumed and
+        search errors are raised from it.
         :return: Result object with operation status and data. Here data is
-        a list of Group objects present in LDAP System.
+        a list of Group objects present in LDAP System, or a generator of
+        them if stream is set.
         """
         if LDAPApiWrapper.OPEN_LDAP == ldap_type:
             if user_identifier is None:
@@ -500,7 +763,6 @@ class LDAPApiWrapper():
                 LDAPApiWrapper.ATTR_UM
             ]
             group_filter = LDAPApiWrapper.GROUP_FILTER_AD
-        entity_list = []
 
         if scope is None:
             scope = ldap3.SUBTREE
@@ -521,124 +783,272 @@ class LDAPApiWrapper():
             )
 
 
+        # Members are requested as an open range so that AD returns as many
+        # of them as it allows at once, see _fetch_remaining_members.
+        memberrange = f"{member_str};range=0-*"
+        attr_list = common_attrs + [memberrange]
+        if group_display_name_identifier is not None:
+            if group_display_name_identifier not in attr_list:
+                attr_list.append(group_display_name_identifier)
+
         if log_entities:
             logging.debug("Base DN: %s", basedn)
             logging.debug("Filter String: %s", filter_str)
+            logging.debug("Attr List: %s", attr_list)
 
-        item_list = []
-        window = 999
-        total_lim = 10000
-        for ind in range(0, total_lim, window + 1):
-            st, en = ind, ind + window
-            memberrange = f"member;range={st}-{en}"
-            attr_list = common_attrs + [memberrange]
-
-            if group_display_name_identifier is not None:
-                if group_display_name_identifier is not attr_list:
-                    attr_list.append(group_display_name_identifier)
-
-            if log_entities:
-                logging.debug(
-                    "Basedn %s with member range %s filter_str %s.",
-                    basedn,
-                    memberrange,
-                    filter_str,
+        explain = log_entities and logging.getLogger().isEnabledFor(
+            logging.DEBUG)
+
+        def group_generator():
+            """Generator of groups built from the entries fetched."""
+            for dn, entry in self._paged_search(
+                    basedn, scope, filter_str, attr_list):
+                if explain:
+                    logging.debug("==> [%s,%s]", dn, entry)
+                group = self._entry_to_group(
+                    dn, entry, group_display_name_identifier, member_str)
+                self._fetch_remaining_members(group, entry, member_str)
+                yield group
+
+        if stream:
+            return Result(Constants.OPERATION_SUCCESS, group_generator())
+        entity_list = []
+        try:
+            for group in group_generator():
+                entity_list.append(group)
+        except Exception as e:
+            logging.debug("Threw exception for basedn %s with member "
+                          "range %s filter_str %s.", basedn,
+                          memberrange, filter_str)
+            logging.error(e)
+
+        return Result(Constants.OPERATION_SUCCESS, entity_list)
+
+    # Helper Functions #
+
+    def _paged_search(self, basedn, scope, filter_str, attr_list):
+        """Searches using the simple paged results control (RFC 2696) so
+        that servers capping the number of entries per search, like AD with
+        MaxPageSize, return all the entries.
+
+        :param basedn: Distinguished name for the base in LDAP System.
+        :param scope: Scope to limit the search to
+        (BASE:"BASE", LEVEL:"LEVEL", SUBTREE:"SUBTREE").
+        :param filter_str: Filter string to apply to search.
+        :param attr_list: List of attributes to fetch.
+        :return: Generator of (dn, attributes) tuples of the entries found.
+        A page is fetched only once the previous one is consumed. The
+        connection used is held until the generator is exhausted or closed.
+        """
+        with self.connection_to(basedn) as local_conn:
+            if self.page_size > 0:
+                response = local_conn.extend.standard.paged_search(
+                    search_base=basedn,
+                    search_filter=filter_str,
+                    search_scope=scope,
+                    attributes=attr_list,
+                    paged_size=self.page_size,
+                    generator=True
                 )
-            try:
-                local_conn = self.get_connection_to(basedn)
+            else:
                 local_conn.search(search_base=basedn,
                                   search_scope=scope,
                                   search_filter=filter_str,
                                   attributes=attr_list
                 )
-                new_list = []
-                for entry in local_conn.response:
-                    i_entry = (entry['dn'], entry['attributes'])
-                    new_list.append(i_entry)
-                # new_list here should be of the form (dn, attr)
-                if not new_list:
-                    if log_entities:
-                        logging.debug("Empty return for basedn %s with member "
-                                      "range %s filter_str %s.", basedn,
-                                      memberrange, filter_str)
-                    break
-                item_list.extend(new_list)
-            except Exception as e:
-                logging.debug("Threw exception for basedn %s with member "
-                              "range %s filter_str %s.", basedn,
-                              memberrange, filter_str)
-                logging.error(e)
+                response = local_conn.response
+            for entry in response:
+                # Skip entities which are None
+                #
+                # NOTE: This becomes necessary because when we get the list
+                # of entities back we also have a reference entity describing
+                # where it was fetched from which has a None value for dn.
+                #
+                # This filtering helps us skip these metadata information.
+                if (entry.get('type') != 'searchResEntry'
+                        or not entry.get('dn')):
+                    continue
+                yield entry['dn'], entry['attributes']
+
+    def _fetch_remaining_members(self, group, entry, member_str):
+        """AD returns at most MaxValRange (1500 by default) values of an
+        attribute at once. Members of bigger groups come as a partial range
+        like "member;range=0-1499" instead of "member". Fetches the rest of
+        the members chunk by chunk with "member;range=N-*" requests until AD
+        marks the final chunk with "*" as in "member;range=N-*".
+
+        :param group: Group object built from the entry, the members fetched
+        are added to it.
+        :param entry: Dictionary of attributes of the group entry.
+        :param member_str: Attribute holding the members of the group.
+        """
+        range_prefix = member_str.lower() + ";range="
+        # End of the last range fetched, "*" if it was the final one.
+        range_end = None
+        for key in entry:
+            if key.lower().startswith(range_prefix):
+                range_end = key.rsplit("-", 1)[1]
+        if range_end in (None, "*"):
+            return
+
+        known_members = set(group.members)
+        chunk_cnt = 1
+        while range_end not in (None, "*"):
+            start = int(range_end) + 1
+            memberrange = f"{member_str};range={start}-*"
+            range_end = None
+            for _, range_entry in self._paged_search(
+                    group.dn, ldap3.BASE, "(objectClass=*)", [memberrange]):
+                for key, members in range_entry.items():
+                    if not key.lower().startswith(range_prefix):
+                        continue
+                    range_end = key.rsplit("-", 1)[1]
+                    for member in members:
+                        member = intern_str(safe_str(member))
+                        if member not in known_members:
+                            known_members.add(member)
+                            group.members.append(member)
+            chunk_cnt += 1
+            # Guard against a server repeating a range.
+            if range_end not in (None, "*") and int(range_end) < start:
+                logging.error("Invalid member range %s returned for group "
+                              "DN(%s).", range_end, group.dn)
                 break
+        logging.debug("Group DN(%s) has %d members fetched in %d chunks.",
+                      group.dn, len(group.members), chunk_cnt)
 
-        valid_dn_cnt = 0
-        none_dn_cnt = 0
-        msg = "List of DNs retrieved from LDAP server:\n"
-        for dn, entry in item_list:
-            # Skip entities which are None
-            #
-            # NOTE: This becomes necessary because when we get the list of
-            # entities back we also have a reference entity describing where
-            # it was fetched from which has a None value for dn.
-            #
-            # This filtering helps us skip these metadata information.
-            if dn is None:
-                none_dn_cnt += 1
-                continue
-            msg += f"==> [{dn},{entry}]\n"
-            valid_dn_cnt += 1
-
-            # Entity specific attributes and handling of unique name attribute
-            # if defaults are not present.
-            name = ".".join(
-                self._fetch_components_from_dn(dn)[0]
-            ) + self.fetch_domain_name_from_dn(dn)
-            # If name follows a consistant rule then we can use patterns
-            # to create good looking display names.
-            if group_display_name_identifier in entry:
-                display_name = safe_str(entry[group_display_name_identifier])
-            elif LDAPApiWrapper.ATTR_DISPLAY_NAME in entry:
-                display_name = safe_str(
-                    entry[LDAPApiWrapper.ATTR_DISPLAY_NAME])
-            elif LDAPApiWrapper.ATTR_NAME in entry:
-                display_name = safe_str(entry[LDAPApiWrapper.ATTR_NAME])
-            elif LDAPApiWrapper.ATTR_CN in entry:
-                display_name = safe_str(entry[LDAPApiWrapper.ATTR_CN])
-            else:
-                display_name = dn
-
-            # Populate member information.
-            member = []
-            for member_key in entry:
-                if member_key.startswith(member_str):
-                    member.extend(entry[member_key])
-            if not member:
-                logging.debug("Group DN(%s) has no key: %s.", dn, member_str)
-            else:
-                member = [safe_str(mem) for mem in member]
+    def _entry_to_user(
+            self,
+            dn,
+            entry,
+            user_identifier,
+            email_identifier,
+            user_display_name_identifier,
+            authdomain_identifier=None,
+            explain=True
+    ):
+        """Builds a User object from the attributes of an LDAP entry.
 
-            entity_list.append(
-                LDAPApiWrapper.Group(dn, name, display_name, member)
+        :param dn: Distinguished name of the entry.
+        :param entry: Dictionary of attributes of the entry.
+        :param user_identifier: Identifier key to be used for user name.
+        :param email_identifier: Identifier key to be used for user email.
+        :param user_display_name_identifier: Identifier key to be used for
+        displaying user's name
+        :param authdomain_identifier: Custom domain name to be appended to
+        user identifier key for user name.
+        :param explain: Flag if the debug message should be built.
+        :return: Tuple of the User object, None if the entry has no unique
+        name, and the debug message describing how it was built, empty if
+        explain is not set.
+        """
+        msg = ""
+        name = None
+
+        # Entity specific attributes and handling of unique name attribute
+        # if defaults are not present.
+        # Default attributes to be used as unique names.
+        if user_identifier in entry:
+            name = (
+                safe_str(entry[user_identifier])
+                + self._get_domain_name(
+                    dn,
+                    user_identifier,
+                    authdomain_identifier
+                )
             )
+            if explain:
+                msg += (
+                    "Using `" + user_identifier + "` for"
+                    + " constructing unique name.\n"
+                )
+        elif LDAPApiWrapper.AD_ATTR_UID in entry:
+            # If userPrincipalName not present then use sAMAccountName to
+            # construct user name.
+            # For sAMAccountName, also append domain name in user name.
+            name = (
+                safe_str(entry[LDAPApiWrapper.AD_ATTR_UID])
+                + self._get_domain_name(
+                    dn,
+                    LDAPApiWrapper.AD_ATTR_UID,
+                    authdomain_identifier
+                )
+            )
+            if explain:
+                msg += (
+                    "Using `sAMAccountName` for"
+                    + " constructing unique name.\n"
+                )
 
-        if log_entities:
-            logging.debug(
-                "valid_dn_cnt %d none_dn_cnt %d procured",
-                valid_dn_cnt,
-                none_dn_cnt)
-            logging.debug(msg)
-
-        # Ensure we send back unique entities with all members and not
-        # duplicate entities with members in parts.
-        entity_map = {}
-        for entity in entity_list:
-            if entity.dn in entity_map:
-                entity_map[entity.dn].members.extend(entity.members)
-            else:
-                entity_map[entity.dn] = entity
+        if user_display_name_identifier in entry:
+            display_name = safe_str(entry[user_display_name_identifier])
+        elif LDAPApiWrapper.ATTR_DISPLAY_NAME in entry:
+            display_name = safe_str(
+                entry[LDAPApiWrapper.ATTR_DISPLAY_NAME])
+        elif LDAPApiWrapper.ATTR_NAME in entry:
+            display_name = safe_str(entry[LDAPApiWrapper.ATTR_NAME])
+        elif LDAPApiWrapper.ATTR_CN in entry:
+            display_name = safe_str(entry[LDAPApiWrapper.ATTR_CN])
+        else:
+            display_name = name
+
+        email = None
+        if email_identifier in entry:
+            email = safe_str(entry[email_identifier])
+        # Unique name is required to login. Hence any user without
+        # a userPrincipalName/sAMAccountName would not be created
+        # as such a user cannot log into the system.
+        # NOTE: Should not be combined with previous if/elif as that
+        # would miss the case where one of them is present but is None.
+        if name is None:
+            if explain:
+                msg += "No unique name found for entry\n"
+            return None, msg
 
-        return Result(Constants.OPERATION_SUCCESS, list(entity_map.values()))
+        return LDAPApiWrapper.User(dn, name, display_name, email), msg
 
-    # Helper Functions #
+    def _entry_to_group(
+            self, dn, entry, group_display_name_identifier, member_str):
+        """Builds a Group object from the attributes of an LDAP entry.
+
+        :param dn: Distinguished name of the entry.
+        :param entry: Dictionary of attributes of the entry.
+        :param group_display_name_identifier: Identifier key to be used for
+        displaying group's name
+        :param member_str: Attribute holding the members of the group.
+        :return: Group object.
+        """
+        # Entity specific attributes and handling of unique name attribute
+        # if defaults are not present.
+        name = ".".join(
+            self._fetch_components_from_dn(dn)[0]
+        ) + self.fetch_domain_name_from_dn(dn)
+        # If name follows a consistant rule then we can use patterns
+        # to create good looking display names.
+        if group_display_name_identifier in entry:
+            display_name = safe_str(entry[group_display_name_identifier])
+        elif LDAPApiWrapper.ATTR_DISPLAY_NAME in entry:
+            display_name = safe_str(
+                entry[LDAPApiWrapper.ATTR_DISPLAY_NAME])
+        elif LDAPApiWrapper.ATTR_NAME in entry:
+            display_name = safe_str(entry[LDAPApiWrapper.ATTR_NAME])
+        elif LDAPApiWrapper.ATTR_CN in entry:
+            display_name = safe_str(entry[LDAPApiWrapper.ATTR_CN])
+        else:
+            display_name = dn
+
+        # Populate member information.
+        member = []
+        for member_key in entry:
+            if member_key.startswith(member_str):
+                member.extend(entry[member_key])
+        if not member:
+            logging.debug("Group DN(%s) has no key: %s.", dn, member_str)
+        else:
+            # Members may come both as member and as a member range.
+            member = list(dict.fromkeys(safe_str(mem) for mem in member))
+
+        return LDAPApiWrapper.Group(dn, name, display_name, member)
 
     def _get_domain_name(self, dn, user_identifier, authdomain_identifier=None):
         """Fetches domain name for the LDAP entity.
@@ -688,7 +1098,8 @@ class LDAPApiWrapper():
         return "@" + ".".join(domain_name)
 
     @pre_check
-    def list_member_dns(self, basedn, scope=None, filter_str=None):
+    def list_member_dns(self, basedn, scope=None, filter_str=None,
+                        stream=False):
         """Fetches list of DNs of member entities recursively. This includes
         both users and groups.
 
@@ -696,10 +1107,12 @@ class LDAPApiWrapper():
         (BASE:"BASE", LEVEL:"LEVEL", SUBTREE:"SUBTREE").
         :param basedn: Distinguished name for the base in LDAP System.
         :param filter_str: String to filter the Distinguished Names.
+        :param stream: Flag to return the DNs as they are fetched instead of
+        a list. The search is then run while the generator is consumed and
+        search errors are raised from it.
         :return: Result object with operation status and data. Here data is
-        a list of member DNs.
+        a list of member DNs, or a generator of them if stream is set.
         """
-        entity_list = []
         attr_list = []
 
         if scope is None:
@@ -709,28 +1122,510 @@ class LDAPApiWrapper():
 
         logging.debug("Base DN: %s", basedn)
         logging.debug("Filter String: %s", filter_str)
+
+        def dn_generator():
+            """Generator of the DNs fetched."""
+            for dn, _ in self._paged_search(
+                    basedn, scope, filter_str, attr_list):
+                logging.debug("==> [%s]", dn)
+                yield dn
+
+        if stream:
+            return Result(Constants.OPERATION_SUCCESS, dn_generator())
         try:
-            local_conn = self.get_connection_to(basedn)
-            local_conn.search(search_base=basedn,
-                              search_scope=scope,
-                              search_filter=filter_str,
-                              attributes=attr_list
-            )
+            entity_list = list(dn_generator())
         except Exception as e:
             logging.debug("Threw exception for basedn %s with filter_string "
                           "%s.", basedn, filter_str)
             logging.error(e)
             return Result(Constants.OPERATION_FAILURE, e)
+        return Result(Constants.OPERATION_SUCCESS, entity_list)
+
+    @pre_check
+    # pylint: disable=too-many-arguments, too-many-locals
+    def harvest_subtree(
+            self,
+            basedn,
+            ldap_type,
+            user_identifier,
+            email_identifier,
+            user_display_name_identifier,
+            group_display_name_identifier,
+            scope=None,
+            filter_str=None,
+            authdomain_identifier=None,
+            member_str=None,
+            changed_since=None
+    ):
+    # pylint: enable=too-many-arguments, too-many-locals
+        """Fetches users and groups under basedn with a single search. Unlike
+        list_member_dns followed by isOfType for every DN, the entries are
+        fetched with objectClass and all user/group attributes, so they are
+        classified and built without further searches. The built objects are
+        added to the entry cache, hence later dn_to_obj/isOfType calls with
+        the same identifiers for these DNs need no search either. The search
+        is paged over a single connection whatever the pool size, the pool
+        only serves the parallel searches of prefetch_dns.
+
+        :param basedn: Distinguished name for the base in LDAP System.
+        :param ldap_type: Type of LDAP System (openldap/AD).
+        :param user_identifier: Identifier key to be used for user name.
+        :param email_identifier: Identifier key to be used for user email.
+        :param user_display_name_identifier: Identifier key to be used for
+        displaying user's name
+        :param group_display_name_identifier: Identifier key to be used for
+        displaying group's name
+        :param scope: Scope to limit the search to
+        (BASE:"BASE", LEVEL:"LEVEL", SUBTREE:"SUBTREE").
+        :param filter_str: String to filter the Distinguished Names.
+        :param authdomain_identifier: Custom domain name to be appended to
+        user identifier key for user name.
+        :param member_str: Attribute holding the members of a group.
+        :param changed_since: High-water mark from get_watermark to fetch
+        only entries changed after it.
+        :return: Result object with operation status and data. Here data is
+        a list of User and Group objects in the order of the search result.
+        """
+        config = (ldap_type, user_identifier, email_identifier,
+                  user_display_name_identifier, group_display_name_identifier,
+                  authdomain_identifier, member_str)
+        user_classes, group_classes = self._entity_classes(ldap_type)
+
+        if scope is None:
+            scope = ldap3.SUBTREE
+        if filter_str is None:
+            filter_str = LDAPApiWrapper.LIST_MEM_FILTER
+        if changed_since is not None:
+            filter_str = LDAPApiWrapper.FILTER_ADD.format(
+                filter_str, self.changed_since_filter(changed_since))
+        if member_str is None:
+            member_str = LDAPApiWrapper.ATTR_MEMBER
+
+        attr_list = self._entity_attr_list(config)
 
-        msg = "List of DNs in Base DN for input filter:\n"
-        for entry in local_conn.entries:
-            dn = entry.entry_dn
-            if dn:
-                entity_list.append(dn)
-                msg += f"==> [{dn}]\n"
-        logging.debug(msg)
+        logging.debug("Base DN: %s", basedn)
+        logging.debug("Filter String: %s", filter_str)
+        logging.debug("Attr List: %s", attr_list)
+        entity_list = []
+        try:
+            # Entries are built as their pages arrive so that only the built
+            # objects are held in memory.
+            for dn, entry in self._paged_search(
+                    basedn, scope, filter_str, attr_list):
+                entity = self._harvested_entry_to_obj(
+                    dn, entry, config, user_classes, group_classes)
+                if entity is not None:
+                    entity_list.append(entity)
+        except Exception as e:
+            logging.debug("Threw exception for basedn %s with filter_string "
+                          "%s.", basedn, filter_str)
+            logging.error(e)
+            return Result(Constants.OPERATION_FAILURE, e)
         return Result(Constants.OPERATION_SUCCESS, entity_list)
 
+    @staticmethod
+    def _entity_classes(ldap_type):
+        """:param ldap_type: Type of LDAP System (openldap/AD).
+        :return: Tuple of the lower cased object classes of users and groups.
+        """
+        if LDAPApiWrapper.OPEN_LDAP == ldap_type:
+            return (LDAPApiWrapper.USER_CLASSES_OPEN_LDAP,
+                    LDAPApiWrapper.GROUP_CLASSES_OPEN_LDAP)
+        return (LDAPApiWrapper.USER_CLASSES_AD,
+                LDAPApiWrapper.GROUP_CLASSES_AD)
+
+    @staticmethod
+    def _entity_attr_list(config):
+        """:param config: Tuple of identifiers to build the objects with, see
+        cache_entries.
+        :return: List of the attributes to fetch to classify entries and
+        build users and groups from them.
+        """
+        attr_list = [
+            LDAPApiWrapper.ATTR_OBJECT_CLASS,
+            LDAPApiWrapper.AD_ATTR_UID,
+            LDAPApiWrapper.OPEN_LDAP_ATTR_UID,
+            LDAPApiWrapper.ATTR_UPN,
+            LDAPApiWrapper.ATTR_NAME,
+            LDAPApiWrapper.ATTR_DISPLAY_NAME,
+            LDAPApiWrapper.ATTR_CN,
+            LDAPApiWrapper.ATTR_EMAIL,
+            LDAPApiWrapper.ATTR_MEMBER,
+            LDAPApiWrapper.ATTR_UM
+        ]
+        (_, user_identifier, email_identifier, user_display_name_identifier,
+         group_display_name_identifier, _, member_str) = config
+        for identifier in (user_identifier, email_identifier,
+                           user_display_name_identifier,
+                           group_display_name_identifier, member_str):
+            if identifier is not None and identifier not in attr_list:
+                attr_list.append(identifier)
+        return attr_list
+
+    @pre_check
+    def get_watermark(self, basedn, ldap_type, since=None):
+        """Reads the current high-water mark of changes. For AD it is the
+        highest committed USN of the domain controller serving basedn. USNs
+        are specific to a domain controller, hence its name is part of the
+        mark. For OpenLDAP it is the latest modifyTimestamp of the server,
+        see _latest_modify_timestamp, so that it does not depend on the
+        clock of this host.
+
+        :param basedn: Distinguished name for the base in LDAP System.
+        :param ldap_type: Type of LDAP System (openldap/AD).
+        :param since: Previous high-water mark, if any. For OpenLDAP without
+        contextCSN, only entries changed since it are searched for the latest
+        modifyTimestamp.
+        :return: Result object with operation status and data. Here data is
+        a dictionary with the type, value and server of the mark.
+        """
+        if LDAPApiWrapper.OPEN_LDAP == ldap_type:
+            if (since is not None and since.get("type")
+                    != LDAPApiWrapper.ATTR_MODIFY_TIMESTAMP):
+                since = None
+            try:
+                watermark = {
+                    "type": LDAPApiWrapper.ATTR_MODIFY_TIMESTAMP,
+                    "value": self._latest_modify_timestamp(basedn, since),
+                    "server": None
+                }
+            except Exception as e:
+                logging.debug("Threw exception reading the latest "
+                              "modifyTimestamp for basedn %s.", basedn)
+                logging.error(e)
+                return Result(Constants.OPERATION_FAILURE, e)
+            logging.debug("High-water mark: %s", watermark)
+            return Result(Constants.OPERATION_SUCCESS, watermark)
+
+        attr_list = [LDAPApiWrapper.ATTR_HIGHEST_USN,
+                     LDAPApiWrapper.ATTR_SERVER_NAME]
+        try:
+            with self.connection_to(basedn) as local_conn:
+                local_conn.search(search_base="",
+                                  search_scope=ldap3.BASE,
+                                  search_filter="(objectClass=*)",
+                                  attributes=attr_list
+                )
+                root_dse = local_conn.response[0]['attributes']
+            watermark = {
+                "type": LDAPApiWrapper.ATTR_USN_CHANGED,
+                "value": int(safe_str(
+                    root_dse[LDAPApiWrapper.ATTR_HIGHEST_USN])),
+                "server": safe_str(root_dse[LDAPApiWrapper.ATTR_SERVER_NAME])
+            }
+        except Exception as e:
+            logging.debug("Threw exception reading root DSE for basedn %s.",
+                          basedn)
+            logging.error(e)
+            return Result(Constants.OPERATION_FAILURE, e)
+        logging.debug("High-water mark: %s", watermark)
+        return Result(Constants.OPERATION_SUCCESS, watermark)
+
+    @staticmethod
+    def _generalized_time(value):
+        """:param value: modifyTimestamp as a datetime, or a generalized time
+        or CSN string, e.g. 20240101120000.000000Z#000000#000#000000.
+        :return: Generalized time in UTC to the second, e.g. 20240101120000Z.
+        """
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(datetime.timezone.utc)
+            return value.strftime("%Y%m%d%H%M%SZ")
+        return safe_str(value)[:14] + "Z"
+
+    def _latest_modify_timestamp(self, basedn, since=None):
+        """Reads the time of the latest change on the server. It is the
+        contextCSN of the database holding basedn, kept up to date by the
+        syncprov overlay. Without it, the latest modifyTimestamp of the
+        entries under basedn is searched for. Changes are then matched from
+        the same second on, hence none made within it is missed.
+
+        :param basedn: Distinguished name for the base in LDAP System.
+        :param since: Previous high-water mark, if any, to search only the
+        entries changed since it.
+        :return: Generalized time of the latest change.
+        """
+        with self.connection_to(basedn) as local_conn:
+            local_conn.search(search_base="",
+                              search_scope=ldap3.BASE,
+                              search_filter="(objectClass=*)",
+                              attributes=[LDAPApiWrapper.ATTR_NAMING_CONTEXTS])
+            root_dse = (local_conn.response[0]['attributes']
+                        if local_conn.response else {})
+            naming_contexts = [
+                safe_str(context) for context in
+                root_dse.get(LDAPApiWrapper.ATTR_NAMING_CONTEXTS, [])]
+        suffixes = [context for context in naming_contexts
+                    if basedn.lower().endswith(context.lower())]
+        if suffixes:
+            suffix = max(suffixes, key=len)
+            try:
+                for _, entry in self._paged_search(
+                        suffix, ldap3.BASE, "(objectClass=*)",
+                        [LDAPApiWrapper.ATTR_CONTEXT_CSN]):
+                    # One CSN per server id with multi-provider replication.
+                    csns = entry.get(LDAPApiWrapper.ATTR_CONTEXT_CSN)
+                    if csns:
+                        return max(LDAPApiWrapper._generalized_time(csn)
+                                   for csn in csns)
+            except LDAPException as e:
+                logging.debug("Failed to read contextCSN of %s. %s", suffix,
+                              e)
+
+        logging.debug("No contextCSN for basedn %s, searching for the latest "
+                      "modifyTimestamp.", basedn)
+        if since is None:
+            filter_str = "(objectClass=*)"
+            latest = LDAPApiWrapper.EPOCH_TIMESTAMP
+        else:
+            filter_str = self.changed_since_filter(since)
+            latest = since["value"]
+        for _, entry in self._paged_search(
+                basedn, ldap3.SUBTREE, filter_str,
+                [LDAPApiWrapper.ATTR_MODIFY_TIMESTAMP]):
+            value = entry.get(LDAPApiWrapper.ATTR_MODIFY_TIMESTAMP)
+            if isinstance(value, list):
+                value = value[0] if value else None
+            if value:
+                latest = max(latest, LDAPApiWrapper._generalized_time(value))
+        return latest
+
+    @staticmethod
+    def changed_since_filter(watermark):
+        """Builds the filter matching entries changed after a high-water mark.
+
+        :param watermark: High-water mark from get_watermark.
+        :return: Filter string.
+        """
+        if watermark["type"] == LDAPApiWrapper.ATTR_USN_CHANGED:
+            # LDAP filters have no strict greater than.
+            return "({}>={})".format(LDAPApiWrapper.ATTR_USN_CHANGED,
+                                     watermark["value"] + 1)
+        return "({}>={})".format(LDAPApiWrapper.ATTR_MODIFY_TIMESTAMP,
+                                 watermark["value"])
+
+    def _harvested_entry_to_obj(
+            self, dn, entry, config, user_classes, group_classes):
+        """Classifies an entry fetched by harvest_subtree, builds the
+        corresponding User/Group object and adds it to the entry cache.
+
+        :param dn: Distinguished name of the entry.
+        :param entry: Dictionary of attributes of the entry.
+        :param config: Tuple of identifiers to build the object with, see
+        cache_entries.
+        :param user_classes: Lower cased object classes of users.
+        :param group_classes: Lower cased object classes of groups.
+        :return: User/Group object, None for other entries.
+        """
+        (_, user_identifier, email_identifier, user_display_name_identifier,
+         group_display_name_identifier, authdomain_identifier,
+         member_str) = config
+        if member_str is None:
+            member_str = LDAPApiWrapper.ATTR_MEMBER
+        explain = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if explain:
+            logging.debug("==> [%s,%s]", dn, entry)
+        object_classes = {
+            safe_str(object_class).lower() for object_class in
+            entry.get(LDAPApiWrapper.ATTR_OBJECT_CLASS, [])}
+        # Groups are checked first to classify like dn_to_obj does.
+        if object_classes.intersection(group_classes):
+            entity = self._entry_to_group(
+                dn, entry, group_display_name_identifier, member_str)
+            self._fetch_remaining_members(entity, entry, member_str)
+        elif object_classes.intersection(user_classes):
+            entity, msg = self._entry_to_user(
+                dn, entry, user_identifier, email_identifier,
+                user_display_name_identifier, authdomain_identifier, explain)
+            if explain:
+                logging.debug(msg)
+        else:
+            entity = None
+        self.entry_cache.put(self._entry_cache_key(dn, config), entity)
+        return entity
+
+    # pylint: disable=too-many-arguments
+    def prefetch_dns(
+            self,
+            dns,
+            ldap_type,
+            user_identifier,
+            email_identifier,
+            user_display_name_identifier,
+            group_display_name_identifier,
+            authdomain_identifier=None,
+            member_str=None
+    ):
+    # pylint: enable=too-many-arguments
+        """Resolves DNs not in the entry cache yet through dns_to_objs, so
+        that later dn_to_obj calls for them need no search.
+
+        :param dns: Distinguished names to resolve.
+        :param ldap_type: Type of LDAP System (openldap/AD).
+        :param user_identifier: Identifier key to be used for user name.
+        :param email_identifier: Identifier key to be used for user email.
+        :param user_display_name_identifier: Identifier key to be used for
+        displaying user's name
+        :param group_display_name_identifier: Identifier key to be used for
+        displaying group's name
+        :param authdomain_identifier: Custom domain name to be appended to
+        user identifier key for user name.
+        :param member_str: Attribute holding the members of a group.
+        :return: Result object with operation status and data. Here data is
+        a dictionary of the DNs resolved to their user/group object, None for
+        others. DNs already cached or failing to resolve are left out.
+        """
+        config = (ldap_type, user_identifier, email_identifier,
+                  user_display_name_identifier, group_display_name_identifier,
+                  authdomain_identifier, member_str)
+        pending = [pending_dn for pending_dn in dict.fromkeys(dns)
+                   if self._entry_cache_key(pending_dn, config)
+                   not in self.entry_cache]
+        if not pending:
+            return Result(Constants.OPERATION_SUCCESS, {})
+        logging.debug("Prefetching %d DNs.", len(pending))
+        return self.dns_to_objs(pending, *config)
+
+    @staticmethod
+    def _dn_key(dn):
+        """Normalizes a DN to match DNs differing in case or spacing only.
+
+        :param dn: Distinguished name.
+        :return: Normalized DN.
+        """
+        return ",".join(component.strip()
+                        for component in ldap3.utils.dn.to_dn(dn)).lower()
+
+    @staticmethod
+    def _rdn_filter(dn):
+        """Builds a filter matching the first RDN of a DN. Values escaped in
+        the DN are escaped for the filter instead.
+
+        :param dn: Distinguished name.
+        :return: Filter string, None if the DN is only made of domain
+        components or cannot be parsed.
+        """
+        try:
+            attr, value, _ = ldap3.utils.dn.parse_dn(
+                ldap3.utils.dn.to_dn(dn)[0].strip())[0]
+        except (LDAPExceptionError, IndexError):
+            return None
+        if attr.lower() == "dc":
+            return None
+        value = LDAPApiWrapper.RDN_ESCAPE_RE.sub(
+            lambda match: ("\\" + match.group(1) if match.group(1)
+                           else escape_filter_chars(match.group(2)
+                                                    or match.group(3))),
+            value)
+        return "({}={})".format(attr, value)
+
+    # pylint: disable=too-many-arguments, too-many-locals
+    @pre_check
+    def dns_to_objs(
+            self,
+            dns,
+            ldap_type=None,
+            user_identifier=None,
+            email_identifier=None,
+            user_display_name_identifier=None,
+            group_display_name_identifier=None,
+            authdomain_identifier=None,
+            member_str=None
+    ):
+    # pylint: enable=too-many-arguments, too-many-locals
+        """Bulk version of dn_to_obj. Rather than searching once or twice per
+        DN, the DNs are grouped by their parent container and each container
+        is searched one level deep with an OR filter of the first RDNs of up
+        to DNS_PER_SEARCH of its DNs. Entries are mapped back by their DN.
+        Searches of different containers run in parallel with up to pool
+        size searches per domain. DNs in the entry cache are not searched
+        and the objects built are added to it.
+
+        :param dns: Distinguished names to resolve.
+        :param ldap_type: Type of LDAP System (openldap/AD).
+        :param user_identifier: Identifier key to be used for user name.
+        :param email_identifier: Identifier key to be used for user email.
+        :param user_display_name_identifier: Identifier key to be used for
+        displaying user's name
+        :param group_display_name_identifier: Identifier key to be used for
+        displaying group's name
+        :param authdomain_identifier: Custom domain name to be appended to
+        user identifier key for user name.
+        :param member_str: Attribute holding the members of a group.
+        :return: Result object with operation status and data. Here data is
+        a dictionary of the DNs to their user/group object, None for DNs
+        which are neither or are not found. DNs whose search failed are left
+        out.
+        """
+        config = (ldap_type, user_identifier, email_identifier,
+                  user_display_name_identifier, group_display_name_identifier,
+                  authdomain_identifier, member_str)
+        resolved = {}
+        # Parent container to the DNs to search under it by their key.
+        by_parent = defaultdict(dict)
+        for dn in dict.fromkeys(dns):
+            found, entity = self.entry_cache.lookup(
+                self._entry_cache_key(dn, config))
+            if found:
+                resolved[dn] = entity
+                continue
+            rdn_filter = self._rdn_filter(dn)
+            if rdn_filter is None:
+                # LDAP doesn't provide an information object when queried
+                # for just the domain component.
+                resolved[dn] = None
+                self.entry_cache.put(self._entry_cache_key(dn, config), None)
+                continue
+            parent = ",".join(component.strip() for component
+                              in ldap3.utils.dn.to_dn(dn)[1:])
+            by_parent[parent.lower()][self._dn_key(dn)] = (dn, rdn_filter,
+                                                           parent)
+        if not by_parent:
+            return Result(Constants.OPERATION_SUCCESS, resolved)
+
+        chunks = []
+        for parent_dns in by_parent.values():
+            items = list(parent_dns.items())
+            for ind in range(0, len(items), LDAPApiWrapper.DNS_PER_SEARCH):
+                chunks.append(dict(items[ind:ind
+                                         + LDAPApiWrapper.DNS_PER_SEARCH]))
+        user_classes, group_classes = self._entity_classes(ldap_type)
+        attr_list = self._entity_attr_list(config)
+
+        def search(chunk):
+            chunk_parent = next(iter(chunk.values()))[2]
+            filter_str = "(|{})".format("".join(
+                chunk_filter for _, chunk_filter, _ in chunk.values()))
+            found = {}
+            try:
+                for entry_dn, entry in self._paged_search(
+                        chunk_parent, ldap3.LEVEL, filter_str, attr_list):
+                    key = self._dn_key(entry_dn)
+                    if key in chunk:
+                        found[key] = self._harvested_entry_to_obj(
+                            entry_dn, entry, config, user_classes,
+                            group_classes)
+            except Exception as e:
+                logging.error("Failed to resolve %d DNs under %s. %s",
+                              len(chunk), chunk_parent, e)
+                return {}
+            for key, (chunk_dn, _, _) in chunk.items():
+                found.setdefault(key, None)
+                self.entry_cache.put(self._entry_cache_key(chunk_dn, config),
+                                     found[key])
+            return {chunk[key][0]: entity for key, entity in found.items()}
+
+        domain_cnt = len({self.fetch_domain_name_from_dn(parent_dn)
+                          for parent_dn in by_parent})
+        logging.debug("Resolving %d DNs of %d containers with %d searches.",
+                      sum(len(chunk) for chunk in chunks), len(by_parent),
+                      len(chunks))
+        workers = min(self.pool.size * domain_cnt, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk_resolved in executor.map(search, chunks):
+                resolved.update(chunk_resolved)
+        return Result(Constants.OPERATION_SUCCESS, resolved)
+
     def dn_to_obj(
             self,
             basedn,
@@ -758,12 +1653,23 @@ class LDAPApiWrapper():
         :return: Result object with operation status and data. Here data is
         a LDAP user/group object corresponding to the basedn. None for others.
         """
+        # Objects built for a DN depend on the identifiers they are built
+        # with, hence these are part of the cache key.
+        config = (ldap_type, user_identifier, email_identifier,
+                  user_display_name_identifier, group_display_name_identifier,
+                  authdomain_identifier, member_str)
+        found, entry = self.entry_cache.lookup(
+            self._entry_cache_key(basedn, config))
+        if found:
+            return Result(Constants.OPERATION_SUCCESS, entry)
+
         components = ldap3.utils.dn.to_dn(basedn)
         # LDAP doesn't provide an information object when queried for just the
         # domain component.
         if (components == []
                 or components[0].startswith("DC")
                 or components[0].startswith("dc")):
+            self.entry_cache.put(self._entry_cache_key(basedn, config), None)
             return Result(Constants.OPERATION_SUCCESS)
 
         filter_str = f"({components[0]})"
@@ -777,6 +1683,7 @@ class LDAPApiWrapper():
                                   log_entities,
                                   member_str)
         if result.status == Constants.OPERATION_SUCCESS and result.data:
+            self.cache_entries(result.data, config)
             return Result(Constants.OPERATION_SUCCESS, result.data[0])
         if result.status == Constants.AUTHENTICATION_FAILURE:
             return Result(Constants.AUTHENTICATION_FAILURE)
@@ -793,12 +1700,39 @@ class LDAPApiWrapper():
             authdomain_identifier,
             member_str)
         if result.status == Constants.OPERATION_SUCCESS and result.data:
+            self.cache_entries(result.data, config)
             return Result(Constants.OPERATION_SUCCESS, result.data[0])
         if result.status == Constants.AUTHENTICATION_FAILURE:
             return Result(Constants.AUTHENTICATION_FAILURE)
 
+        if result.status == Constants.OPERATION_SUCCESS:
+            self.entry_cache.put(self._entry_cache_key(basedn, config), None)
         return Result(Constants.OPERATION_SUCCESS)
 
+    @staticmethod
+    def _entry_cache_key(dn, config):
+        """Builds the entry cache key for a DN. DNs are case insensitive.
+
+        :param dn: Distinguished name.
+        :param config: Tuple of identifiers the objects are built with.
+        :return: Cache key.
+        """
+        return (dn.lower(), config)
+
+    def cache_entries(self, entities, config):
+        """Adds user/group objects fetched by a search to the entry cache so
+        that later dn_to_obj calls for them need no search.
+
+        :param entities: List of User/Group objects.
+        :param config: Tuple of identifiers the objects were built with in
+        the order of the dn_to_obj arguments i.e. (ldap_type, user_identifier,
+        email_identifier, user_display_name_identifier,
+        group_display_name_identifier, authdomain_identifier, member_str).
+        """
+        for entity in entities:
+            self.entry_cache.put(self._entry_cache_key(entity.dn, config),
+                                 entity)
+
     def isOfType(self,
                  basedn,
                  ldap_type,
@@ -819,14 +1753,15 @@ class LDAPApiWrapper():
         EntityType.User for User, EntityType.Group for Group, None for DC
         and others.
         """
-        result = self.dn_to_obj(basedn,
-                                ldap_type,
-                                user_identifier,
-                                email_identifier,
-                                user_display_name_identifier,
-                                group_display_name_identifier,
-                                member_str,
-                                authdomain_identifier)
+        result = self.dn_to_obj(
+            basedn,
+            ldap_type,
+            user_identifier,
+            email_identifier,
+            user_display_name_identifier,
+            group_display_name_identifier,
+            authdomain_identifier=authdomain_identifier,
+            member_str=member_str)
         if result.status == Constants.OPERATION_SUCCESS:
             if result.data is not None:
                 return Result(Constants.OPERATION_SUCCESS, result.data.type)
@@ -0,0 +1,352 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Benchmarks for ldapApi.py.
+
+Without a hostport the benchmarks run against an in-memory LDAP server
+(ldap3 MOCK_SYNC) which serves multi-valued attributes in ranges like AD does.
+
+1. Fetching a group with all its members.
+2. Resolving DNs spread over several domains one by one with dn_to_obj, and
+   in bulk with 1 and pool_size connections per domain. The mock server
+   matches every entry against every term of a filter, so compare the number
+   of searches rather than the time of bulk lookups there.
+
+Help command:
+
+>>> python ldapApiBenchmark.py --help
+
+Example commands:
+
+>>> python ldapApiBenchmark.py --members 100000
+
+>>> python ldapApiBenchmark.py
+        --hostport <hostport>
+        --username <username>
+        --password <password>
+        --group_dn <groupdn>
+"""
+
+import argparse
+import functools
+import logging
+import re
+import threading
+import time
+
+import ldap3
+
+from globalClasses import Constants
+from ldapApi import LDAPApiWrapper
+
+MOCK_HOSTPORT = "ldap://mock.thoughtspot.com"
+MOCK_USERNAME = "cn=admin,dc=mock,dc=thoughtspot,dc=com"
+MOCK_PASSWORD = "password"
+MOCK_BASEDN = "ou=bench,dc=mock,dc=thoughtspot,dc=com"
+# AD default for the maximum number of values returned for an attribute.
+MAX_VAL_RANGE = 1500
+
+RANGE_RE = re.compile(r"^(?P<attr>[^;]+);range=(?P<start>\d+)-(?P<end>\d+|\*)$",
+                      re.IGNORECASE)
+
+
+class MockADServer():
+    """ldap3 MOCK_SYNC server which returns multi-valued attributes the way
+       AD does. Values beyond MAX_VAL_RANGE are returned as a partial range
+       like "member;range=0-1499" and the rest can be fetched with
+       "member;range=1500-*" requests.
+    """
+
+    def __init__(self, multi_valued, latency=0.0):
+        """:param multi_valued: Dictionary of DN to a dictionary of attribute
+        name to values served in ranges.
+        :param latency: Seconds each search takes in addition.
+        """
+        self.server = ldap3.Server("mock", get_info=ldap3.OFFLINE_AD_2012_R2)
+        self.multi_valued = multi_valued
+        self.latency = latency
+        self.search_cnt = 0
+        self.bind_cnt = 0
+        self._lock = threading.Lock()
+        self.connect().strategy.add_entry(
+            MOCK_USERNAME, {"userPassword": MOCK_PASSWORD, "sn": "admin"})
+
+    def connect(self):
+        """:return: New connection to the server, not bound yet."""
+        conn = ldap3.Connection(self.server,
+                                user=MOCK_USERNAME,
+                                password=MOCK_PASSWORD,
+                                client_strategy=ldap3.MOCK_SYNC,
+                                raise_exceptions=True,
+                                collect_usage=True)
+        conn.search = functools.partial(self.search, conn, conn.search)
+        return conn
+
+    def add_entry(self, dn, attributes):
+        """Adds an entry to the server.
+
+        :param dn: Distinguished name of the entry.
+        :param attributes: Dictionary of attributes of the entry.
+        """
+        self.connect().strategy.add_entry(dn, attributes)
+
+    def search(self, conn, conn_search, search_base, search_filter,
+               search_scope=ldap3.SUBTREE, *args, attributes=None, **kwargs):
+        """Search of a connection with the ranged attributes handled."""
+        with self._lock:
+            self.search_cnt += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if len(args) >= 2:
+            # Positional call from ldap3 paged_search.
+            attributes = args[1]
+        plain_attrs = [RANGE_RE.sub(r"\g<attr>", attr)
+                       for attr in attributes or []]
+        if len(args) >= 2:
+            args = args[:1] + (plain_attrs,) + args[2:]
+        else:
+            kwargs["attributes"] = plain_attrs
+        result = conn_search(search_base, search_filter, search_scope,
+                             *args, **kwargs)
+        for entry in conn.response:
+            values = self.multi_valued.get(entry.get("dn"), {})
+            for attr in attributes or []:
+                self._serve_range(entry["attributes"], attr, values)
+        return result
+
+    @staticmethod
+    def _serve_range(entry_attrs, attr, values):
+        """Replaces the values of a requested attribute by the range AD
+        would return for it.
+        """
+        match = RANGE_RE.match(attr)
+        name = match.group("attr") if match else attr
+        if name not in values:
+            return
+        entry_attrs.pop(name, None)
+        all_values = values[name]
+        start = int(match.group("start")) if match else 0
+        if match is None and len(all_values) <= MAX_VAL_RANGE:
+            entry_attrs[name] = all_values
+            return
+        end = start + MAX_VAL_RANGE - 1
+        if end >= len(all_values) - 1:
+            entry_attrs[f"{name};range={start}-*"] = all_values[start:]
+        else:
+            entry_attrs[f"{name};range={start}-{end}"] = \
+                all_values[start:end + 1]
+
+
+class MockLDAPApiWrapper(LDAPApiWrapper):
+    """LDAPApiWrapper connecting to a MockADServer for all the domains."""
+
+    def __init__(self, mock_server, *args, **kwargs):
+        """:param mock_server: MockADServer to connect to."""
+        super().__init__(*args, **kwargs)
+        self.mock_server = mock_server
+
+    def bind_to(self, hostport, username, password):
+        """Bind to the mock server."""
+        conn = self.mock_server.connect()
+        conn.bind()
+        with self.mock_server._lock:
+            self.mock_server.bind_cnt += 1
+        return conn
+
+
+def build_mock_group(member_cnt):
+    """Builds a mock server with a group having the given number of members.
+
+    :param member_cnt: Number of members of the group.
+    :return: Tuple of MockADServer and DN of the group.
+    """
+    group_dn = f"cn=big_group,{MOCK_BASEDN}"
+    members = [f"cn=user{ind},{MOCK_BASEDN}" for ind in range(member_cnt)]
+    mock_server = MockADServer({group_dn: {"member": members}})
+    mock_server.add_entry(MOCK_BASEDN,
+                          {"objectClass": ["organizationalUnit"]})
+    mock_server.add_entry(group_dn, {"objectClass": ["group"],
+                                     "cn": "big_group",
+                                     "displayName": "Big Group"})
+    return mock_server, group_dn
+
+
+def build_mock_forest(domain_cnt, user_cnt, latency):
+    """Builds a mock server with users spread over the domains of a forest.
+
+    :param domain_cnt: Number of domains.
+    :param user_cnt: Number of users per domain.
+    :param latency: Seconds each search takes.
+    :return: Tuple of MockADServer and DNs of the users.
+    """
+    mock_server = MockADServer({}, latency)
+    user_dns = []
+    for domain_ind in range(domain_cnt):
+        basedn = f"ou=bench,dc=domain{domain_ind},dc=mock,dc=thoughtspot,dc=com"
+        mock_server.add_entry(basedn, {"objectClass": ["organizationalUnit"]})
+        for user_ind in range(user_cnt):
+            user_dn = f"cn=user{user_ind},{basedn}"
+            mock_server.add_entry(user_dn, {
+                "objectClass": ["user"],
+                "cn": f"user{user_ind}",
+                "sAMAccountName": f"user{user_ind}",
+                "displayName": f"User {user_ind}"})
+            user_dns.append(user_dn)
+    return mock_server, user_dns
+
+
+def bench_group_members(ldap_handle, group_dn, count_searches=None):
+    """Times fetching a group with all its members through dn_to_obj.
+
+    :param ldap_handle: Logged in LDAPApiWrapper.
+    :param group_dn: Distinguished name of the group.
+    :param count_searches: Function returning the number of searches made so
+    far, if available.
+    """
+    searches = count_searches() if count_searches else None
+    start = time.perf_counter()
+    result = ldap_handle.dn_to_obj(group_dn, LDAPApiWrapper.AD,
+                                   log_entities=False)
+    elapsed = time.perf_counter() - start
+    assert result.status == Constants.OPERATION_SUCCESS, result.data
+    assert result.data is not None, f"No group found at {group_dn}."
+    msg = (f"Fetched {len(result.data.members)} members of {group_dn} "
+           f"in {elapsed:.2f}s")
+    if count_searches:
+        msg += f" with {count_searches() - searches} searches"
+    print(msg + ".")
+
+
+def bench_dn_to_obj(ldap_handle, dns, count_searches=None):
+    """Times resolving DNs one at a time with dn_to_obj.
+
+    :param ldap_handle: Logged in LDAPApiWrapper.
+    :param dns: Distinguished names to resolve.
+    :param count_searches: Function returning the number of searches made so
+    far, if available.
+    """
+    searches = count_searches() if count_searches else None
+    start = time.perf_counter()
+    for dn in dns:
+        result = ldap_handle.dn_to_obj(dn, LDAPApiWrapper.AD,
+                                       log_entities=False)
+        assert result.status == Constants.OPERATION_SUCCESS, result.data
+    elapsed = time.perf_counter() - start
+    msg = f"Resolved {len(dns)} DNs one by one in {elapsed:.2f}s"
+    if count_searches:
+        msg += f" with {count_searches() - searches} searches"
+    print(msg + ".")
+
+
+def bench_prefetch(ldap_handle, dns, count_searches=None):
+    """Times resolving DNs, possibly of several domains, with prefetch_dns.
+
+    :param ldap_handle: Logged in LDAPApiWrapper.
+    :param dns: Distinguished names to resolve.
+    :param count_searches: Function returning the number of searches made so
+    far, if available.
+    """
+    searches = count_searches() if count_searches else None
+    start = time.perf_counter()
+    result = ldap_handle.prefetch_dns(dns, LDAPApiWrapper.AD, None, None,
+                                      None, None)
+    elapsed = time.perf_counter() - start
+    assert result.status == Constants.OPERATION_SUCCESS, result.data
+    msg = (f"Resolved {len(result.data)} DNs with {ldap_handle.pool.size} "
+           f"connection(s) per domain in {elapsed:.2f}s")
+    if count_searches:
+        msg += f" with {count_searches() - searches} searches"
+    print(msg + ".")
+
+
+def main():
+    """Runs the benchmarks."""
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--hostport",
+        help="Hostport in the format ldap(s)://host:port or ldap(s)://host. "
+             "In-memory LDAP server is used if not given.",
+        default=None,
+    )
+    parser.add_argument("--username", help="Username", default=None)
+    parser.add_argument("--password", help="Password", default=None)
+    parser.add_argument(
+        "--group_dn", help="Group distinguished name", default=None
+    )
+    parser.add_argument(
+        "--members",
+        help="Number of members of the group on the in-memory LDAP server",
+        type=int,
+        default=100000,
+    )
+    parser.add_argument(
+        "--pool_size",
+        help="Number of connections per domain to resolve DNs with",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--domains",
+        help="Number of domains of the forest on the in-memory LDAP server",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--domain_users",
+        help="Number of users per domain on the in-memory LDAP server",
+        type=int,
+        default=50,
+    )
+    parser.add_argument(
+        "--latency",
+        help="Seconds each search on the in-memory LDAP server takes",
+        type=float,
+        default=0.02,
+    )
+    arguments = parser.parse_args()
+
+    if arguments.hostport is None:
+        mock_server, group_dn = build_mock_group(arguments.members)
+        ldap_handle = MockLDAPApiWrapper(mock_server)
+        ldap_handle.login(MOCK_HOSTPORT, MOCK_USERNAME, MOCK_PASSWORD)
+        bench_group_members(ldap_handle, group_dn,
+                            lambda: mock_server.search_cnt)
+
+        mock_server, user_dns = build_mock_forest(
+            arguments.domains, arguments.domain_users, arguments.latency)
+        ldap_handle = MockLDAPApiWrapper(mock_server)
+        ldap_handle.login(MOCK_HOSTPORT, MOCK_USERNAME, MOCK_PASSWORD)
+        bench_dn_to_obj(ldap_handle, user_dns, lambda: mock_server.search_cnt)
+        for pool_size in sorted({1, arguments.pool_size}):
+            ldap_handle = MockLDAPApiWrapper(mock_server,
+                                             pool_size=pool_size)
+            ldap_handle.login(MOCK_HOSTPORT, MOCK_USERNAME, MOCK_PASSWORD)
+            bench_prefetch(ldap_handle, user_dns,
+                           lambda: mock_server.search_cnt)
+        return
+
+    assert arguments.username is not None, "Username cannot be None."
+    assert arguments.password is not None, "Password cannot be None."
+    assert arguments.group_dn is not None, "Group DN cannot be None."
+    ldap_handle = LDAPApiWrapper()
+    result = ldap_handle.login(arguments.hostport, arguments.username,
+                               arguments.password)
+    assert result.status == Constants.OPERATION_SUCCESS, result.data
+    bench_group_members(ldap_handle, arguments.group_dn)
+
+    members = ldap_handle.dn_to_obj(arguments.group_dn).data.members
+    ldap_handle = LDAPApiWrapper()
+    ldap_handle.login(arguments.hostport, arguments.username,
+                      arguments.password)
+    bench_dn_to_obj(ldap_handle, members)
+    for pool_size in sorted({1, arguments.pool_size}):
+        ldap_handle = LDAPApiWrapper(pool_size=pool_size)
+        ldap_handle.login(arguments.hostport, arguments.username,
+                          arguments.password)
+        bench_prefetch(ldap_handle, members)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,11 +23,12 @@ import argparse
 import logging
 import string
 import sys
+import threading
 import unittest
 import ldap3
 
 from globalClasses import Constants
-from ldapApi import LDAPApiWrapper
+from ldapApi import LDAPApiWrapper, LDAPConnectionPool, LDAPEntryCache
 
 HOSTPORT = None
 USERNAME = None
@@ -56,6 +57,46 @@ class TestLDAPApi(unittest.TestCase):
         result = ldap_handle.list_groups(GROUP_DN, None, None, None, )
         self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
 
+    def test_list_users_stream(self):
+        ldap_handle = LDAPApiWrapper(page_size=2)
+        ldap_handle.login(HOSTPORT, USERNAME, PASSWORD)
+        result = ldap_handle.list_users(USER_DN, None, "objectGUID", None,
+                                        None, stream=True)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        streamed = [user.dn for user in result.data]
+        result = ldap_handle.list_users(USER_DN, None, "objectGUID", None,
+                                        None)
+        self.assertEqual(streamed, [user.dn for user in result.data])
+
+    def test_harvest_subtree(self):
+        ldap_handle = LDAPApiWrapper()
+        ldap_handle.login(HOSTPORT, USERNAME, PASSWORD)
+        result = ldap_handle.harvest_subtree(
+            GROUP_DN, None, None, None, None, None)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        # Harvested entities are served from the entry cache.
+        for entity in result.data:
+            self.assertEqual(
+                ldap_handle.isOfType(entity.dn, None, None, None, None,
+                                     None, None, None).data,
+                entity.type)
+        self.assertEqual(ldap_handle.entry_cache.stats()["misses"], 0)
+
+    def test_dns_to_objs(self):
+        ldap_handle = LDAPApiWrapper()
+        ldap_handle.login(HOSTPORT, USERNAME, PASSWORD)
+        members = ldap_handle.dn_to_obj(GROUP_DN).data.members
+        result = ldap_handle.dns_to_objs(members)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        self.assertEqual(set(result.data), set(members))
+        # Bulk lookups agree with resolving the DNs one by one.
+        single_handle = LDAPApiWrapper()
+        single_handle.login(HOSTPORT, USERNAME, PASSWORD)
+        for dn, entity in result.data.items():
+            single = single_handle.dn_to_obj(dn).data
+            self.assertEqual(entity.dn if entity else None,
+                             single.dn if single else None)
+
     def test_fetch_components_from_dn(self):
         test_dn = "CN=A,CN=B,OU=engg,DC=ldap,DC=thoughtspot,DC=com"
         ldap_handle = LDAPApiWrapper()
@@ -69,6 +110,67 @@ class TestLDAPApi(unittest.TestCase):
         domain_name = ldap_handle.fetch_domain_name_from_dn(test_dn)
         self.assertEqual(domain_name, "@ldap.thoughtspot.com")
 
+    def test_rdn_filter(self):
+        self.assertEqual(
+            LDAPApiWrapper._rdn_filter("CN=Doe\\, John (x),OU=engg,DC=com"),
+            "(CN=Doe, John \\28x\\29)")
+        self.assertEqual(LDAPApiWrapper._rdn_filter("cn=a\\5cb*,dc=com"),
+                         "(cn=a\\5cb\\2a)")
+        self.assertIsNone(LDAPApiWrapper._rdn_filter("DC=ldap,DC=com"))
+        self.assertEqual(LDAPApiWrapper._dn_key("CN=A, OU=engg,DC=com"),
+                         "cn=a,ou=engg,dc=com")
+
+    def test_entry_cache(self):
+        cache = LDAPEntryCache(max_size=2)
+        self.assertEqual(cache.lookup("a"), (False, None))
+        cache.put("a", "user_a")
+        cache.put("b", None)
+        self.assertEqual(cache.lookup("a"), (True, "user_a"))
+        # Entries which are neither users nor groups are cached as None.
+        self.assertEqual(cache.lookup("b"), (True, None))
+        # "a" is least recently used now and gets evicted.
+        cache.lookup("b")
+        cache.put("c", "group_c")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.lookup("a"), (False, None))
+        self.assertEqual(cache.stats()["hits"], 3)
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_connection_pool(self):
+        bound = []
+
+        def bind(key):
+            bound.append(key)
+            return object()
+
+        pool = LDAPConnectionPool(bind, size=2)
+        conn = pool.checkout("ldap://a")
+        # Same thread gets back the connection it holds.
+        self.assertIs(pool.checkout("ldap://a"), conn)
+        pool.checkin(conn)
+        pool.checkin(conn)
+
+        # Other threads get up to size connections and wait for more.
+        checked_out = []
+        # Threads are daemons, so that a checkout left waiting by a failure
+        # does not keep the tests from exiting.
+        threads = [threading.Thread(
+            target=lambda: checked_out.append(pool.checkout("ldap://a")),
+            daemon=True)
+            for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(0.2)
+        self.assertEqual(len(bound), 2)
+        self.assertEqual(len(checked_out), 2)
+        pool.checkin(checked_out[0])
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(len(checked_out), 3)
+        self.assertEqual(len(bound), 2)
+
     def test_filter_handling(self):
         test_dn = "DC=ldap,DC=thoughtspot,DC=com"
         ldap_handle = LDAPApiWrapper()
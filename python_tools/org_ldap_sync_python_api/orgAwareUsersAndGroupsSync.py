@@ -12,6 +12,7 @@ from entityClasses import EntityType
 from globalClasses import Constants
 import orgAwareUsersAndGroupsSyncUtil
 import syncTree
+import tsApi
 ######################### Core Classes/Functions ##############################
 
 # pylint: disable=R0903, R0902, R0912, R0915, R1702, C0302, W0108
@@ -19,6 +20,8 @@ class OrgAwareSyncTree(syncTree.SyncTree):
     """Class which encapsulates the logic for fetching entities from LDAP
        system and syncing them with ThoughtSpot system.
     """
+    JOURNALED = False
+
     def __init__(self, user_args):
         """@param arguments: Arguments provided by user."""
         self.orgs_to_create = set()
@@ -31,6 +34,10 @@ class OrgAwareSyncTree(syncTree.SyncTree):
         self.remove_group_orgs = user_args["remove_group_orgs"]
         self.org_map = defaultdict(lambda: set())
         self.unmapped_org_obj = []
+        self.org_switches_saved = 0
+        self.ts_org_workers = int(user_args["ts_org_workers"] or 1)
+        self.ts_login_args = user_args
+        self.org_sessions = None
         self.util = orgAwareUsersAndGroupsSyncUtil
         super().__init__(user_args)
 
@@ -131,8 +138,17 @@ class OrgAwareSyncTree(syncTree.SyncTree):
     def sync_nodes(self):
         """Synchronize the nodes between LDAP and TS System."""
         logging.info("Creating flat list of users and groups for syncing.")
-        result = self.ldap_handle.list_member_dns(
-            self.basedn, self.scope, self.filter_str
+        result = self.ldap_handle.harvest_subtree(
+            self.basedn,
+            self.ldap_type,
+            self.user_identifier,
+            self.email_identifier,
+            self.user_display_name_identifier,
+            self.group_display_name_identifier,
+            self.scope,
+            self.filter_str,
+            self.authdomain_identifier,
+            self.member_str
         )
 
         if result.status != Constants.OPERATION_SUCCESS or result.data is None:
@@ -147,17 +163,13 @@ class OrgAwareSyncTree(syncTree.SyncTree):
             self.file_handle.write(msg)
             logging.debug(msg)
             return
+        self.prefetch_members(result.data)
+
         group_dns, user_dns = [], []
-        for member_dn in result.data:
-            dn_type = self.ldap_handle.isOfType(
-                member_dn,
-                self.ldap_type,
-                self.user_identifier,
-                self.email_identifier,
-                self.user_display_name_identifier,
-                self.group_display_name_identifier,
-                self.member_str,
-                self.authdomain_identifier).data
+        # Entities come classified from the harvest, hence no isOfType call
+        # is needed for them.
+        for member in result.data:
+            member_dn, dn_type = member.dn, member.type
             logging.debug("member_dn entity type (%s) (%s)", dn_type,
                           member_dn)
             if dn_type == EntityType.USER:
@@ -299,12 +311,54 @@ class OrgAwareSyncTree(syncTree.SyncTree):
             self.file_handle.write(msg)
             sys.exit(1)
 
-    def switch_org(self, org_id):
+    def login_ts_session(self):
+        """
+        Method to log in another session to ThoughtSpot system, for working
+        on orgs in parallel.
+        @return: Logged in TSApiWrapper object or None if login failed.
+        """
+        ts_handle = tsApi.TSApiWrapper(
+            self.ts_login_args["disable_ssl"],
+            int(self.ts_login_args["ts_batchsize"] or 0),
+            int(self.ts_login_args["ts_page_concurrency"] or 0)
+        )
+        self.profiler.instrument_ts(ts_handle)
+        result = ts_handle.login(
+            self.ts_login_args["ts_hostport"],
+            self.ts_login_args["ts_uname"],
+            self.ts_login_args["ts_pass"],
+        )
+        if result.status != Constants.OPERATION_SUCCESS:
+            reason = (
+                str(result.data)
+                if result.data is not None
+                else self.NORSN
+            )
+            logging.error("Failed to log in another session to ThoughtSpot "
+                          "system. %s", reason)
+            return None
+        return ts_handle
+
+    def ts_handles(self):
+        """@return: List of the TSApiWrapper sessions used by the sync."""
+        if self.org_sessions is None:
+            return [self.ts_handle]
+        return [session for session in self.org_sessions.sessions
+                if session is not None]
+
+    def switch_org(self, org_id, ts_handle=None):
         """
         Method to switch context to given org
         @param org_id: orgId to switch
+        @param ts_handle: TSApiWrapper session to switch, defaults to the
+        main session.
+        @return: 1 if the session was switched, 0 if it already was in the
+        given org.
         """
-        result = self.ts_handle.switch_org(int(org_id))
+        ts_handle = ts_handle or self.ts_handle
+        if ts_handle.org_id == int(org_id):
+            return 0
+        result = ts_handle.switch_org(int(org_id))
         if result.status != Constants.OPERATION_SUCCESS:
             reason = (
                 str(result.data)
@@ -317,9 +371,21 @@ class OrgAwareSyncTree(syncTree.SyncTree):
             self.error_file.write(msg)
             self.file_handle.write(msg)
             sys.exit(1)
+        return 1
 
     def update_thoughtspot(self):
-        """Update users and groups to ThoughtSpot."""
+        """Update users and groups to ThoughtSpot, logging out the sessions
+           opened to work on orgs in parallel once done.
+        """
+        self.org_sessions = self.util.OrgSessionPool(self,
+                                                     self.ts_org_workers)
+        try:
+            self._update_thoughtspot()
+        finally:
+            self.org_sessions.close()
+
+    def _update_thoughtspot(self):
+        """Update users and groups to ThoughtSpot with the org sessions."""
 
         # Maps to maintain.
         org_name_to_org_id = defaultdict(lambda: None)
@@ -342,6 +408,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
         self.file_handle.write("\n===== Addition Phase =====\n\n")
 
         # Sync orgs to TS
+        self.profiler.start_phase("sync_orgs")
         org_created, org_already_exist = [0], [0]
         self.util.sync_orgs(
             self,
@@ -359,6 +426,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
         )
 
         # Create/Sync all users to TS and populates:
+        self.profiler.start_phase("sync_users")
         # 1. ldap_user_names
         # 2. orgId list for ldap users
         users_created, users_synced = [0], [0]
@@ -372,6 +440,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
             users_synced)
 
         # Create/Sync all groups to TS and populates:
+        self.profiler.start_phase("sync_groups")
         # 1. ldap_group_names
         # 2. ldap_group_name_to_org - orgId list for ldap groups
         # 3. No. of groups created/synced in each org
@@ -389,6 +458,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
         )
 
         # Fetch user info from TS and populates:
+        self.profiler.start_phase("list_ts_principals")
         # 1. user_name_to_id_ts_map
         # 2. user_id_to_name_ts_map
         # 3. ts_user_names
@@ -472,6 +542,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
         )
 
         # Create member user relationship in ThoughtSpot system.
+        self.profiler.start_phase("member_users")
         self.util.create_member_user_rltn(
             self,
             parent_id_to_member_user_id_ts_map,
@@ -480,6 +551,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
         )
 
         # Create member group relationship in ThoughtSpot system.
+        self.profiler.start_phase("member_groups")
         self.util.create_member_group_rltn(
             self,
             parent_id_to_member_group_id_ts_map,
@@ -488,6 +560,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
         )
 
         # Delete others
+        self.profiler.start_phase("purge")
         users_deleted, groups_deleted = [0], [0]
         users_org_removed, groups_org_removed = \
             defaultdict(lambda: set()), defaultdict(lambda: set())
@@ -545,6 +618,7 @@ class OrgAwareSyncTree(syncTree.SyncTree):
             )
 
         # Summary Reporting.
+        self.profiler.start_phase("report")
         self.file_handle.write("\n========= Summary ========\n\n")
         self.file_handle.write("Orgs created: {}\n".format(
             org_created[0]))
@@ -583,6 +657,9 @@ class OrgAwareSyncTree(syncTree.SyncTree):
                 if len(groups_org_removed[group]) > 0:
                     self.file_handle.write("Removed {} Group from {} Orgs\n"
                     .format(group, len(groups_org_removed[group])))
+        self.file_handle.write("Org switches saved by batching: {}\n".format(
+            self.org_switches_saved))
+        self.write_membership_stats(self.ts_handles())
         self.file_handle.close()
         self.error_file.close()
 
@@ -612,6 +689,8 @@ class OrgAwareSyncTree(syncTree.SyncTree):
             for group in list(groups_org_removed.keys()):
                 logging.debug("Removed %s group from %s Orgs\n",
                               group, len(groups_org_removed[group]))
+        logging.info("Org switches saved by batching: %d",
+                     self.org_switches_saved)
 
         print("Refer to {} for ldap report and {} for error logs.".format(
             self.file_handle.name, self.error_file.name))
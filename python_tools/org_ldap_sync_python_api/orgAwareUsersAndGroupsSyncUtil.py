@@ -4,7 +4,11 @@
 """Utilities function for orgAwareUsersAndGroupSync"""
 
 # pylint: disable=R0912
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import logging
+import threading
 
 import tsApi
 from entityClasses import EntityType
@@ -12,6 +16,162 @@ from globalClasses import Constants
 
 
 # pylint: disable=R0903, R0902, R0912, R0915, R1702, C0302, W0108
+class OrgSessionPool():
+    """Logged in TSApiWrapper sessions of an org-aware sync. Each session is
+       pinned to the org it was last switched to, and preferred for work in
+       that org, so that orgs can be worked on in parallel without sessions
+       flipping orgs.
+    """
+
+    def __init__(self, org_sync_tree, size):
+        """@param org_sync_tree: OrgAwareSyncTree whose ts_handle is the
+           first session. Further sessions are logged in on demand with
+           its login_ts_session method.
+           @param size: Maximum number of sessions.
+        """
+        self.org_sync_tree = org_sync_tree
+        self.size = max(size, 1)
+        self.sessions = [org_sync_tree.ts_handle]
+        self._idle = [org_sync_tree.ts_handle]
+        self._available = threading.Condition()
+
+    def checkout(self, org_id):
+        """Takes a session for working in an org, waiting for one to be
+           returned if all are in use.
+           @param org_id: Id of the org the session will be switched to.
+           @return: TSApiWrapper object.
+        """
+        with self._available:
+            while True:
+                for session in self._idle:
+                    if session.org_id == int(org_id):
+                        self._idle.remove(session)
+                        return session
+                if len(self.sessions) < self.size:
+                    break
+                if self._idle:
+                    return self._idle.pop()
+                self._available.wait()
+            # Reserve the slot while logging in without the lock held.
+            self.sessions.append(None)
+
+        session = self.org_sync_tree.login_ts_session()
+        with self._available:
+            self.sessions.remove(None)
+            if session is not None:
+                self.sessions.append(session)
+                return session
+            # Do with the sessions already logged in.
+            self.size = len(self.sessions)
+            while not self._idle:
+                self._available.wait()
+            return self._idle.pop()
+
+    def checkin(self, session):
+        """Returns a session taken with checkout.
+           @param session: TSApiWrapper object.
+        """
+        with self._available:
+            self._idle.append(session)
+            self._available.notify()
+
+    def close(self):
+        """Logs out the sessions logged in by the pool. The first session,
+           the ts_handle of the sync, is left logged in.
+        """
+        with self._available:
+            sessions = [session for session in self.sessions
+                        if session is not None
+                        and session is not self.org_sync_tree.ts_handle]
+        for session in sessions:
+            result = session.logout()
+            if result.status != Constants.OPERATION_SUCCESS:
+                logging.warning("Failed to log out a ThoughtSpot session.")
+
+    def invalidate_principal_indexes(self):
+        """Drops the principal snapshots of all the sessions. To be used after
+           sessions made changes in orgs other sessions may have indexed.
+        """
+        for session in self.sessions:
+            if session is not None:
+                session.invalidate_principal_index()
+
+
+class OrgBatchPlanner():
+    """Collects pending TS calls tagged with the org they have to run in
+       and runs them grouped by org, so that a session is switched to each
+       org once instead of before every call. With more than one session in
+       the OrgSessionPool of the sync, the orgs are worked on in parallel.
+    """
+
+    def __init__(self, org_sync_tree):
+        """@param org_sync_tree: OrgAwareSyncTree the calls belong to."""
+        self.org_sync_tree = org_sync_tree
+        # Org id to the calls to make in it, in the order added.
+        self.operations = defaultdict(list)
+
+    def add(self, org_id, handler, method_name, *args):
+        """Adds a call to the plan.
+           @param org_id: Id of the org the call has to be made in.
+           @param handler: Function called with the Result of the call,
+           returning False if the call failed. The handlers are called one at
+           a time by the thread running the plan, in the order the calls were
+           added.
+           @param method_name: Name of the TSApiWrapper method to call.
+           @param args: Arguments to call the method with.
+        """
+        self.operations[org_id].append((handler, method_name, args))
+
+    def run(self):
+        """Makes the planned calls org by org and empties the plan. The
+           switch_org calls saved compared to switching before every call are
+           added to org_switches_saved of the sync.
+           @return: Number of calls whose handler returned False.
+        """
+        sessions = self.org_sync_tree.org_sessions
+        operation_cnt = sum(len(ops) for ops in self.operations.values())
+        if sessions.size > 1 and len(self.operations) > 1:
+            with ThreadPoolExecutor(sessions.size) as executor:
+                futures = [executor.submit(self._run_org, org_id, ops)
+                           for org_id, ops in self.operations.items()]
+                org_results = [future.result() for future in futures]
+            sessions.invalidate_principal_indexes()
+        else:
+            org_results = [self._run_org(org_id, ops)
+                           for org_id, ops in self.operations.items()]
+
+        switch_cnt, failed_cnt = 0, 0
+        for ops, (switched, results) in zip(self.operations.values(),
+                                            org_results):
+            switch_cnt += switched
+            for (handler, _, _), result in zip(ops, results):
+                if handler(result) is False:
+                    failed_cnt += 1
+        self.operations.clear()
+        saved = operation_cnt - switch_cnt
+        self.org_sync_tree.org_switches_saved += saved
+        logging.debug("Ran %d operations in %d orgs with %d org switches.",
+                      operation_cnt, len(org_results), switch_cnt)
+        return failed_cnt
+
+    def _run_org(self, org_id, ops):
+        """Makes the calls of an org on a session switched to it.
+           @param org_id: Id of the org.
+           @param ops: Planned calls of the org.
+           @return: Tuple of 1 if a session was switched else 0, and the
+           Results of the calls.
+        """
+        sessions = self.org_sync_tree.org_sessions
+        session = sessions.checkout(org_id)
+        try:
+            switched = self.org_sync_tree.switch_org(org_id, session)
+            results = [getattr(session, method_name)(*args)
+                       for _, method_name, args in ops]
+        finally:
+            sessions.checkin(session)
+        return switched, results
+
+
 def sync_orgs(
         org_sync_tree,
         org_created,
@@ -86,6 +246,7 @@ def sync_users(
     orgId list for ldap users.
     """
     logging.info("Syncing users to ThoughtSpot system.")
+    pending_users, desired_users = [], []
     for user_dn in org_sync_tree.users_to_create:
         # Get details from LDAP
         result = org_sync_tree.ldap_handle.dn_to_obj(
@@ -117,16 +278,28 @@ def sync_users(
             org_sync_tree.file_handle.write(msg)
             continue
 
-        # Sync orgs and properties to TS
-        result = org_sync_tree.ts_handle.sync_user(name=user.name,
-                                                   display_name=user.display_name,
-                                                   usertype=tsApi.TSApiWrapper.LDAP_USER,
-                                                   password=None,
-                                                   email=user.email,
-                                                   groups=None,
-                                                   upsert_user=org_sync_tree.upsert_user,
-                                                   org_ids=user_org_ids,
-                                                   all_org_scope=True)
+        pending_users.append((user_dn, user))
+        desired_users.append({
+            "name": user.name,
+            "display_name": user.display_name,
+            "usertype": tsApi.TSApiWrapper.LDAP_USER,
+            "email": user.email,
+            "org_ids": user_org_ids
+        })
+
+    if not desired_users:
+        return
+
+    # Sync orgs and properties to TS in one batch, only users which differ
+    # from TS system result in create/update calls.
+    result = org_sync_tree.sync_ts_users(desired_users, all_org_scope=True)
+    if result.status == Constants.OPERATION_SUCCESS:
+        user_results = result.data
+    else:
+        user_results = {user.name: result for _, user in pending_users}
+
+    for user_dn, user in pending_users:
+        result = user_results[user.name]
 
         # Log details
         if result.status == Constants.OPERATION_SUCCESS:
@@ -146,7 +319,7 @@ def sync_users(
             reason = (
                 str(result.data)
                 if result.data is not None
-                else super().NORSN
+                else org_sync_tree.NORSN
             )
             msg = (
                 f"\nFailed to sync user {user.name} to "
@@ -174,6 +347,10 @@ def sync_groups(
     No. of groups created/synced in each org
     """
     logging.info("Syncing groups to ThoughtSpot system.")
+    planner = OrgBatchPlanner(org_sync_tree)
+    planned_groups = []
+    group_created_orgs = defaultdict(list)
+    group_exists_orgs = defaultdict(list)
     for group_dn in org_sync_tree.groups_to_create:
         # Get group details from LDAP
         result = org_sync_tree.ldap_handle.dn_to_obj(
@@ -211,51 +388,73 @@ def sync_groups(
             org_sync_tree.error_file.write(msg)
             org_sync_tree.file_handle.write(msg)
             continue
-        group_created_orgs, group_exists_orgs = [], []
+        planned_groups.append(group)
 
         # Perform org wise sync of groups with TS
         for org_id in group_org_id:
-            org_sync_tree.switch_org(org_id)
-            result = org_sync_tree.ts_handle.sync_group(
+            planner.add(
+                org_id,
+                functools.partial(_record_group_sync, org_sync_tree, group,
+                                  org_id, org_id_to_org_name,
+                                  group_created_orgs, group_exists_orgs,
+                                  groups_created, groups_synced),
+                "sync_group",
                 group.name, group.display_name,
                 tsApi.TSApiWrapper.LDAP_GROUP,
                 None,  # description
                 None,  # privileges
                 org_sync_tree.upsert_group
             )
+    planner.run()
 
-            if result.status == Constants.OPERATION_SUCCESS:
-                group_created_orgs \
-                    .append(org_id_to_org_name[org_id])
-                groups_created[org_id_to_org_name[org_id]] += 1
-            elif result.status == Constants.GROUP_ALREADY_EXISTS:
-                group_exists_orgs \
-                    .append(org_id_to_org_name[org_id])
-                groups_synced[org_id_to_org_name[org_id]] += 1
-            else:
-                reason = (
-                    str(result.data)
-                    if result.data is not None
-                    else super().NORSN
-                )
-                msg = "\nFailed to create group {} in {} Org. {}\n"\
-                    .format(
-                    group.name, org_id_to_org_name[org_id], reason
-                )
-                logging.debug(msg)
-                org_sync_tree.file_handle.write(msg)
-
-        if len(group_created_orgs) > 0:
+    for group in planned_groups:
+        if len(group_created_orgs[group.name]) > 0:
             msg = "\n{} Group Created in {} orgs\n".format(
-                group.name, group_created_orgs)
+                group.name, group_created_orgs[group.name])
             logging.debug(msg)
             org_sync_tree.file_handle.write(msg)
-        if len(group_exists_orgs) > 0:
+        if len(group_exists_orgs[group.name]) > 0:
             msg = "\n{} Group already exists in {} orgs\n".format(
-                group.name, group_exists_orgs)
+                group.name, group_exists_orgs[group.name])
             logging.debug(msg)
             org_sync_tree.file_handle.write(msg)
 
+
+def _record_group_sync(
+        org_sync_tree,
+        group,
+        org_id,
+        org_id_to_org_name,
+        group_created_orgs,
+        group_exists_orgs,
+        groups_created,
+        groups_synced,
+        result):
+    """
+    Records the result of creating/syncing a group in an org.
+    """
+    if result.status == Constants.OPERATION_SUCCESS:
+        group_created_orgs[group.name] \
+            .append(org_id_to_org_name[org_id])
+        groups_created[org_id_to_org_name[org_id]] += 1
+    elif result.status == Constants.GROUP_ALREADY_EXISTS:
+        group_exists_orgs[group.name] \
+            .append(org_id_to_org_name[org_id])
+        groups_synced[org_id_to_org_name[org_id]] += 1
+    else:
+        reason = (
+            str(result.data)
+            if result.data is not None
+            else org_sync_tree.NORSN
+        )
+        msg = "\nFailed to create group {} in {} Org. {}\n"\
+            .format(
+            group.name, org_id_to_org_name[org_id], reason
+        )
+        logging.debug(msg)
+        org_sync_tree.file_handle.write(msg)
+
+
 def fetch_ts_user_list(
         org_sync_tree,
         domain_name,
@@ -409,35 +608,29 @@ def create_member_user_rltn(
     """
     Create member user relationship in ThoughtSpot system.
     """
-    failed_relationships = 0
     logging.info("Creating member user to group relationships.")
     if not parent_id_to_member_user_id_ts_map:
         msg = "\nNo member user to group relationship to create.\n"
         logging.debug(msg)
         org_sync_tree.file_handle.write(msg)
     else:
+        planner = OrgBatchPlanner(org_sync_tree)
         for parent_id in list(parent_id_to_member_user_id_ts_map.keys()):
             orgId = parent_id_to_org_map[parent_id]
             if orgId is None:
                 continue # parent doesn't have any orgId
-            org_sync_tree.switch_org(orgId)
-            result = org_sync_tree.ts_handle.update_users_to_group(
+            planner.add(
+                orgId,
+                functools.partial(_record_member_users_update,
+                                  org_sync_tree, parent_id,
+                                  group_id_to_name_ts_map),
+                "update_users_to_group",
                 list(parent_id_to_member_user_id_ts_map[parent_id]),
                 parent_id,
                 org_sync_tree.keep_local_membership
             )
-            if result.status != Constants.OPERATION_SUCCESS:
-                name = group_id_to_name_ts_map[parent_id]
-                reason = (
-                    str(result.data)
-                    if result.data is not None
-                    else super().NORSN
-                )
-                msg = "Failed to update member users to group {} {}\n"
-                msg = msg.format(name, reason)
-                org_sync_tree.error_file.write(msg)
-                logging.error(msg)
-                failed_relationships += 1
+        failed_relationships = planner.run()
+
         if failed_relationships == 0:
             msg = "\nDone creating member users to group relationships.\n"
             logging.debug(msg)
@@ -456,36 +649,28 @@ def create_member_group_rltn(
     """
     Create member group relationship in ThoughtSpot system.
     """
-    failed_relationships = 0
     logging.info("Creating member group to group relationships.")
     if not parent_id_to_member_group_id_ts_map:
         msg = "\nNo member group to group relationship to create.\n"
         logging.debug(msg)
         org_sync_tree.file_handle.write(msg)
     else:
+        planner = OrgBatchPlanner(org_sync_tree)
         for parent_id in list(parent_id_to_member_group_id_ts_map.keys()):
             orgId = parent_id_to_org_map[parent_id]
             if orgId is None:
                 continue # parent doesn't have a orgId
-            org_sync_tree.switch_org(orgId)
-            result = org_sync_tree.ts_handle.update_groups_to_group(
+            planner.add(
+                orgId,
+                functools.partial(_record_member_groups_update,
+                                  org_sync_tree, parent_id,
+                                  group_id_to_name_ts_map),
+                "update_groups_to_group",
                 list(parent_id_to_member_group_id_ts_map[parent_id]),
                 parent_id,
                 org_sync_tree.keep_local_membership
             )
-            if result.status != Constants.OPERATION_SUCCESS:
-                name = group_id_to_name_ts_map[parent_id]
-                reason = (
-                    str(result.data)
-                    if result.data is not None
-                    else super().NORSN
-                )
-                msg = "Failed to update member groups to group {} {}\n"
-                msg = msg.format(name, reason)
-                org_sync_tree.file_handle.write(msg)
-                org_sync_tree.error_file.write(msg)
-                logging.error(msg)
-                failed_relationships += 1
+        failed_relationships = planner.run()
 
         if failed_relationships == 0:
             msg = "\nDone creating member groups to group relationships.\n"
@@ -497,6 +682,55 @@ def create_member_group_rltn(
         org_sync_tree.file_handle.write(msg)
 
 
+def _record_member_users_update(
+        org_sync_tree,
+        parent_id,
+        group_id_to_name_ts_map,
+        result):
+    """
+    Records the result of updating member users of a group.
+    Returns whether the update succeeded.
+    """
+    if result.status != Constants.OPERATION_SUCCESS:
+        name = group_id_to_name_ts_map[parent_id]
+        reason = (
+            str(result.data)
+            if result.data is not None
+            else org_sync_tree.NORSN
+        )
+        msg = "Failed to update member users to group {} {}\n"
+        msg = msg.format(name, reason)
+        org_sync_tree.error_file.write(msg)
+        logging.error(msg)
+        return False
+    return True
+
+
+def _record_member_groups_update(
+        org_sync_tree,
+        parent_id,
+        group_id_to_name_ts_map,
+        result):
+    """
+    Records the result of updating member groups of a group.
+    Returns whether the update succeeded.
+    """
+    if result.status != Constants.OPERATION_SUCCESS:
+        name = group_id_to_name_ts_map[parent_id]
+        reason = (
+            str(result.data)
+            if result.data is not None
+            else org_sync_tree.NORSN
+        )
+        msg = "Failed to update member groups to group {} {}\n"
+        msg = msg.format(name, reason)
+        org_sync_tree.file_handle.write(msg)
+        org_sync_tree.error_file.write(msg)
+        logging.error(msg)
+        return False
+    return True
+
+
 def delete_groups(
         org_sync_tree,
         ts_group_names,
@@ -512,32 +746,29 @@ def delete_groups(
     """
     org_sync_tree.file_handle.write("\n===== Group Deletion Phase =====\n\n")
     logging.info("Deleting groups not in current sync path.")
+    planner = OrgBatchPlanner(org_sync_tree)
+    planned_groups, failed_groups = [], set()
     for group_name in ts_group_names:
         ldap_group_orgs = ldap_group_name_to_org[group_name]
         ts_group_orgs = ts_group_name_to_org[group_name]
         if len(ldap_group_orgs) >= 1:
             continue
-        group_deleted = 1
+        planned_groups.append(group_name)
         for org_id in ts_group_orgs:
             group_id = group_name_to_id_ts_map[(group_name, org_id)]
-            org_sync_tree.switch_org(org_id)
-            result = org_sync_tree.ts_handle.delete_groups([group_id])
-            if result.status != Constants.OPERATION_SUCCESS:
-                reason = (
-                    str(result.data)
-                    if result.data is not None
-                    else super().NORSN
-                )
-                msg = "Failed to delete {} group from {} " \
-                      "org. {}\n".format(group_name,
-                                         org_id_to_org_name[org_id], reason)
-                group_deleted = 0
-                org_sync_tree.error_file.write(msg)
-                org_sync_tree.file_handle.write(msg)
-                logging.debug(msg)
-            else:
-                logging.debug("Group Deleted: %s",
-                              group_id_to_name_ts_map[group_id])
+            planner.add(
+                org_id,
+                functools.partial(_record_group_deletion, org_sync_tree,
+                                  group_name, group_id, org_id,
+                                  org_id_to_org_name, group_id_to_name_ts_map,
+                                  failed_groups),
+                "delete_groups",
+                [group_id]
+            )
+    planner.run()
+
+    for group_name in planned_groups:
+        group_deleted = 0 if group_name in failed_groups else 1
         groups_deleted[0] += group_deleted
         if group_deleted == 1:
             msg = "\n{} Group deleted\n" \
@@ -550,6 +781,36 @@ def delete_groups(
         org_sync_tree.file_handle.write("No groups deleted\n")
 
 
+def _record_group_deletion(
+        org_sync_tree,
+        group_name,
+        group_id,
+        org_id,
+        org_id_to_org_name,
+        group_id_to_name_ts_map,
+        failed_groups,
+        result):
+    """
+    Records the result of deleting a group from an org.
+    """
+    if result.status != Constants.OPERATION_SUCCESS:
+        reason = (
+            str(result.data)
+            if result.data is not None
+            else org_sync_tree.NORSN
+        )
+        msg = "Failed to delete {} group from {} " \
+              "org. {}\n".format(group_name,
+                                 org_id_to_org_name[org_id], reason)
+        failed_groups.add(group_name)
+        org_sync_tree.error_file.write(msg)
+        org_sync_tree.file_handle.write(msg)
+        logging.debug(msg)
+    else:
+        logging.debug("Group Deleted: %s",
+                      group_id_to_name_ts_map[group_id])
+
+
 def remove_groups_from_orgs(
         org_sync_tree,
         ts_group_names,
@@ -565,36 +826,29 @@ def remove_groups_from_orgs(
     group_org_removal = 0
     org_sync_tree.file_handle.write("\n===== Group Org Removal Phase =====\n")
     logging.info("Removing groups from Orgs not in current sync path.")
+    planner = OrgBatchPlanner(org_sync_tree)
+    planned_groups = []
     for group_name in ts_group_names:
         ldap_group_orgs = ldap_group_name_to_org[group_name]
         ts_group_orgs = ts_group_name_to_org[group_name]
         if len(ldap_group_orgs) < 1:
             continue # this will come under purge flag
+        planned_groups.append(group_name)
         for org_id in ts_group_orgs:
             if org_id in ldap_group_orgs:
                 continue
             group_org_removal = 1
-            group_id = group_name_to_id_ts_map[(group_name, org_id)]
-            org_sync_tree.switch_org(org_id)
-            result = org_sync_tree.ts_handle.delete_groups([group_id])
-            if result.status != Constants.OPERATION_SUCCESS:
-                reason = (
-                    str(result.data)
-                    if result.data is not None
-                    else super().NORSN
-                )
-                msg = "Failed to Remove {} group from {} org\n. {}\n" \
-                    .format(
-                    group_name, org_id_to_org_name[org_id], reason
-                )
-                org_sync_tree.error_file.write(msg)
-                org_sync_tree.file_handle.write(msg)
-                logging.debug(msg)
-            else:
-                logging.debug("Removed %s Group from %s org\n",
-                              group_name, org_id_to_org_name[org_id])
-                groups_org_removed[group_name] \
-                    .add(org_id_to_org_name[org_id])
+            planner.add(
+                org_id,
+                functools.partial(_record_group_org_removal, org_sync_tree,
+                                  group_name, org_id, org_id_to_org_name,
+                                  groups_org_removed),
+                "delete_groups",
+                [group_name_to_id_ts_map[(group_name, org_id)]]
+            )
+    planner.run()
+
+    for group_name in planned_groups:
         if len(groups_org_removed[group_name]) > 0:
             msg = "\n{} Group Removed from {} orgs\n" \
                 .format(group_name,
@@ -605,6 +859,37 @@ def remove_groups_from_orgs(
         org_sync_tree.file_handle.write("\nNo Groups to be removed "
                                "from any orgs\n")
 
+
+def _record_group_org_removal(
+        org_sync_tree,
+        group_name,
+        org_id,
+        org_id_to_org_name,
+        groups_org_removed,
+        result):
+    """
+    Records the result of removing a group from an org.
+    """
+    if result.status != Constants.OPERATION_SUCCESS:
+        reason = (
+            str(result.data)
+            if result.data is not None
+            else org_sync_tree.NORSN
+        )
+        msg = "Failed to Remove {} group from {} org\n. {}\n" \
+            .format(
+            group_name, org_id_to_org_name[org_id], reason
+        )
+        org_sync_tree.error_file.write(msg)
+        org_sync_tree.file_handle.write(msg)
+        logging.debug(msg)
+    else:
+        logging.debug("Removed %s Group from %s org\n",
+                      group_name, org_id_to_org_name[org_id])
+        groups_org_removed[group_name] \
+            .add(org_id_to_org_name[org_id])
+
+
 def delete_users(
         org_sync_tree,
         ts_user_names,
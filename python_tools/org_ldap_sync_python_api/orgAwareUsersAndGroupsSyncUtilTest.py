@@ -0,0 +1,189 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Unit tests for the OrgSessionPool and OrgBatchPlanner of
+orgAwareUsersAndGroupsSyncUtil.py, run with stub sessions.
+
+Example command:
+
+>>> python orgAwareUsersAndGroupsSyncUtilTest.py
+"""
+
+import logging
+import threading
+import unittest
+
+from globalClasses import Constants, Result
+from orgAwareUsersAndGroupsSyncUtil import OrgBatchPlanner, OrgSessionPool
+
+
+class StubSession():
+    """Stands in for a logged in TSApiWrapper."""
+
+    def __init__(self, name):
+        self.name = name
+        self.org_id = None
+        self.calls = []
+        self.logged_out = False
+
+    def echo(self, value, succeed=True):
+        """Records the call and returns a Result holding the value."""
+        self.calls.append((self.org_id, value))
+        return Result(Constants.OPERATION_SUCCESS if succeed
+                      else Constants.OPERATION_FAILURE, value)
+
+    def wait(self, barrier):
+        """Waits for the other parties of the barrier."""
+        barrier.wait(timeout=5)
+        return Result(Constants.OPERATION_SUCCESS, self.org_id)
+
+    def invalidate_principal_index(self):
+        pass
+
+    def logout(self):
+        self.logged_out = True
+        return Result(Constants.OPERATION_SUCCESS)
+
+
+class StubSyncTree():
+    """Stands in for the OrgAwareSyncTree of the sessions."""
+
+    def __init__(self, pool_size=1, logins=None):
+        """@param pool_size: Size of the OrgSessionPool.
+           @param logins: List of sessions returned by the logins, None for a
+           failed login. Sessions are made up once it is exhausted.
+        """
+        self.ts_handle = StubSession("primary")
+        self.logins = list(logins or [])
+        self.login_cnt = 0
+        self.org_switches_saved = 0
+        self.org_sessions = OrgSessionPool(self, pool_size)
+
+    def login_ts_session(self):
+        self.login_cnt += 1
+        if self.logins:
+            return self.logins.pop(0)
+        return StubSession("session{}".format(self.login_cnt))
+
+    def switch_org(self, org_id, ts_handle=None):
+        if ts_handle.org_id == org_id:
+            return 0
+        ts_handle.org_id = org_id
+        return 1
+
+
+class TestOrgSessionPool(unittest.TestCase):
+
+    def test_org_pinning(self):
+        """Tests a session last switched to an org is preferred for it, and
+           sessions are logged in on demand up to the size of the pool.
+        """
+        tree = StubSyncTree(pool_size=2)
+        pool = tree.org_sessions
+        session = pool.checkout(1)
+        self.assertEqual(session.name, "session1")
+        tree.switch_org(1, session)
+        pool.checkin(session)
+        self.assertIs(pool.checkout(1), session)
+        # No session left to log in, the idle one is switched.
+        self.assertIs(pool.checkout(2), tree.ts_handle)
+        self.assertEqual(tree.login_cnt, 1)
+
+    def test_login_failure(self):
+        """Tests a failed login while all sessions are busy shrinks the pool
+           to the sessions logged in, and waits for one of them.
+        """
+        tree = StubSyncTree(pool_size=3, logins=[StubSession("session1"),
+                                                 None])
+        pool = tree.org_sessions
+        tree.ts_handle.org_id = 1
+        self.assertIs(pool.checkout(1), tree.ts_handle)
+        busy = pool.checkout(2)
+        self.assertEqual(busy.name, "session1")
+
+        checked_out = []
+        thread = threading.Thread(
+            target=lambda: checked_out.append(pool.checkout(3)), daemon=True)
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(pool.size, 2)
+        self.assertEqual(pool.sessions, [tree.ts_handle, busy])
+
+        pool.checkin(busy)
+        thread.join(5)
+        self.assertEqual(checked_out, [busy])
+        self.assertEqual(tree.login_cnt, 2)
+
+    def test_close(self):
+        """Tests the sessions logged in by the pool are logged out, but not
+           the ts_handle of the sync.
+        """
+        tree = StubSyncTree(pool_size=2)
+        pool = tree.org_sessions
+        session = pool.checkout(1)
+        pool.checkin(session)
+        pool.close()
+        self.assertTrue(session.logged_out)
+        self.assertFalse(tree.ts_handle.logged_out)
+
+
+class TestOrgBatchPlanner(unittest.TestCase):
+
+    def test_run(self):
+        """Tests calls are made org by org, switching once per org, and the
+           failures reported by the handlers are counted.
+        """
+        tree = StubSyncTree()
+        planner = OrgBatchPlanner(tree)
+        handled = []
+
+        def handler(result):
+            handled.append(result.data)
+            return result.status == Constants.OPERATION_SUCCESS
+
+        planner.add(1, handler, "echo", "a")
+        planner.add(2, handler, "echo", "b", False)
+        planner.add(1, handler, "echo", "c")
+        planner.add(2, lambda result: None, "echo", "d", False)
+        self.assertEqual(planner.run(), 1)
+        self.assertEqual(handled, ["a", "c", "b"])
+        self.assertEqual(tree.ts_handle.calls,
+                         [(1, "a"), (1, "c"), (2, "b"), (2, "d")])
+        self.assertEqual(tree.org_switches_saved, 2)
+        self.assertEqual(planner.operations, {})
+        self.assertEqual(planner.run(), 0)
+
+    def test_parallel_run(self):
+        """Tests orgs are worked on in parallel, each on a session of its
+           own, while the handlers are called by the running thread in the
+           order the calls were added.
+        """
+        tree = StubSyncTree(pool_size=3)
+        planner = OrgBatchPlanner(tree)
+        barrier = threading.Barrier(3)
+        handled = []
+
+        def handler(label, result):
+            handled.append((label, result.data,
+                            threading.current_thread()))
+
+        for org_id in (1, 2, 3):
+            planner.add(org_id, lambda result: handler("wait", result),
+                        "wait", barrier)
+        for org_id in (3, 1):
+            planner.add(org_id, lambda result: handler("echo", result),
+                        "echo", "x{}".format(org_id))
+        self.assertEqual(planner.run(), 0)
+        self.assertEqual([(label, data) for label, data, _ in handled],
+                         [("wait", 1), ("echo", "x1"), ("wait", 2),
+                          ("wait", 3), ("echo", "x3")])
+        self.assertEqual({thread for _, _, thread in handled},
+                         {threading.current_thread()})
+        self.assertEqual(len(tree.org_sessions.sessions), 3)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    unittest.main()
@@ -0,0 +1,691 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+End to end benchmarks of syncTree.py and orgAwareUsersAndGroupsSync.py.
+
+Both systems are emulated in-process so that runs are reproducible:
+
+1. ThoughtSpot by a local HTTP server keeping users, groups, orgs and
+   memberships in memory. It answers the endpoints TSApiWrapper uses and each
+   request takes a configurable latency.
+2. LDAP by an ldap3 MOCK_SYNC server (see ldapApiBenchmark.py) holding a
+   synthetic tree of users spread over nested groups.
+
+For every tree size SyncTree and OrgAwareSyncTree are run twice against an
+empty ThoughtSpot system. The first run creates all the principals, the second
+one finds them in sync. Runtime, requests made to ThoughtSpot, requests per
+principal and LDAP searches are reported for every run. With --memory the
+peak memory allocated during each run is reported too, traced with
+tracemalloc which slows the runs down. As both systems run in-process, the
+peak includes the allocations made by the stand-ins while serving the run.
+
+Help command:
+
+>>> python syncBenchmark.py --help
+
+Example commands:
+
+>>> python syncBenchmark.py
+
+>>> python syncBenchmark.py --sizes 100000 --trees sync --latency 0.005
+
+>>> python syncBenchmark.py --trees org_aware --orgs 8 --ts_org_workers 4
+
+>>> python syncBenchmark.py --sizes 50000 --trees sync --memory
+
+>>> python syncBenchmark.py --sizes 1000 --upsert
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import chain
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from globalClasses import Constants
+from ldapApiBenchmark import (MOCK_BASEDN, MOCK_HOSTPORT, MOCK_PASSWORD,
+                              MOCK_USERNAME, MockADServer, MockLDAPApiWrapper)
+from orgAwareUsersAndGroupsSync import OrgAwareSyncTree
+from syncTree import SyncTree
+from syncUsersAndGroups import ScriptArguments
+
+MOCK_TS_USERNAME = "tsadmin"
+MOCK_TS_PASSWORD = "admin"
+SESSION_COOKIE = "JSESSIONID"
+# Number of child groups of a group in the synthetic tree, also the number of
+# top level groups.
+GROUP_FANOUT = 10
+# Number of users per group in the synthetic tree.
+GROUP_USERS = 50
+
+TREES = {"sync": SyncTree, "org_aware": OrgAwareSyncTree}
+
+
+class MockTSServer():
+    """HTTP server emulating the ThoughtSpot endpoints used by TSApiWrapper.
+       Users belong to a set of orgs while groups belong to a single org, the
+       same group name in two orgs being two groups. Each login starts a
+       session in the primary org which switch_org moves to another org.
+    """
+
+    PREFIX = "/callosum/v1"
+
+    def __init__(self, latency=0.0):
+        """:param latency: Seconds each request takes in addition."""
+        self.latency = latency
+        self.users = {}
+        self.groups = {}
+        # Lower case user name to ID, (org ID, lower case group name) to ID.
+        self._user_ids = {}
+        self._group_ids = {}
+        self.orgs = {Constants.DEFAULT_ORG_ID: "Primary"}
+        # Session token to the org the session is in.
+        self.sessions = {}
+        self.request_cnt = 0
+        self._lock = threading.Lock()
+        self._routes = [
+            ("GET", r"/session/info", self.info),
+            ("PUT", r"/session/orgs", self.switch_org),
+            ("GET", r"/metadata/list", self.list_metadata),
+            ("POST", r"/session/user/create", self.create_user),
+            ("POST", r"/session/user/deleteusers", self.delete_users),
+            ("POST", r"/v2/users/search", self.search_user),
+            ("PUT", r"/v2/users/(?P<identifier>[^/]+)", self.update_principal),
+            ("POST", r"/session/group/create", self.create_group),
+            ("POST", r"/session/group/deletegroups", self.delete_groups),
+            ("POST", r"/session/group/updateusersingroup",
+             self.update_users_in_group),
+            ("POST", r"/session/group/updategroupsingroup",
+             self.update_groups_in_group),
+            ("GET", r"/session/group/listuser/(?P<gid>[^/]+)",
+             self.list_users_in_group),
+            ("GET", r"/session/group/listgroup/(?P<gid>[^/]+)",
+             self.list_groups_in_group),
+            ("POST", r"/v2/groups/search", self.search_group),
+            ("POST", r"/tspublic/v1/org", self.create_org),
+            ("POST", r"/tspublic/v1/org/search", self.list_orgs),
+        ]
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _MockTSHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.hostport = "http://127.0.0.1:{}".format(self.httpd.server_port)
+        self._thread = None
+
+    def start(self):
+        """Starts serving requests in a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving requests."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, method, url, body, cookie):
+        """Serves a request.
+
+        :param method: HTTP method of the request.
+        :param url: Path and query string of the request.
+        :param body: Form encoded body of the request.
+        :param cookie: Value of the Cookie header, if any.
+        :return: Tuple of the status code, JSON serializable response or None
+        and the session token to set or None.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(url)
+        path = parts.path
+        if not path.startswith(MockTSServer.PREFIX):
+            return http.client.NOT_FOUND, None, None
+        path = path[len(MockTSServer.PREFIX):]
+        params = dict(parse_qsl(parts.query))
+        params.update(parse_qsl(body))
+        token = None
+        if cookie:
+            morsel = SimpleCookie(cookie).get(SESSION_COOKIE)
+            token = morsel.value if morsel is not None else None
+
+        with self._lock:
+            self.request_cnt += 1
+            if method == "POST" and path == "/session/login":
+                return self.login(params)
+            if token not in self.sessions:
+                return http.client.UNAUTHORIZED, None, None
+            for route_method, pattern, handler in self._routes:
+                match = re.fullmatch(pattern, path)
+                if route_method == method and match is not None:
+                    path_args = {key: unquote(value) for key, value
+                                 in match.groupdict().items()}
+                    status, response = handler(token, params, **path_args)
+                    return status, response, None
+        return http.client.NOT_FOUND, None, None
+
+    # Principal helpers #
+
+    def _user_header(self, user):
+        return {"id": user["id"], "name": user["name"], "type": user["type"],
+                "orgIds": sorted(user["orgIds"]),
+                "displayName": user["display_name"]}
+
+    def _group_header(self, group):
+        return {"id": group["id"], "name": group["name"],
+                "type": group["type"], "orgIds": [group["org"]],
+                "displayName": group["display_name"]}
+
+    def _find_user(self, identifier):
+        user = self.users.get(identifier)
+        if user is None:
+            user = self.users.get(self._user_ids.get(identifier.lower()))
+        return user
+
+    def _find_group(self, identifier, org_id):
+        group = self.groups.get(identifier)
+        if group is None:
+            group = self.groups.get(
+                self._group_ids.get((org_id, identifier.lower())))
+        return group if group is not None and group["org"] == org_id \
+            else None
+
+    def _rename(self, principal, name):
+        if "org" in principal:
+            del self._group_ids[(principal["org"], principal["name"].lower())]
+            self._group_ids[(principal["org"], name.lower())] = principal["id"]
+        else:
+            del self._user_ids[principal["name"].lower()]
+            self._user_ids[name.lower()] = principal["id"]
+        principal["name"] = name
+
+    @staticmethod
+    def _json_list(params, key):
+        return json.loads(params[key]) if params.get(key) else []
+
+    # Endpoints #
+
+    def login(self, params):
+        """POST /session/login"""
+        if (params.get("username") != MOCK_TS_USERNAME
+                or params.get("password") != MOCK_TS_PASSWORD):
+            return http.client.UNAUTHORIZED, None, None
+        token = uuid.uuid4().hex
+        self.sessions[token] = Constants.DEFAULT_ORG_ID
+        return http.client.OK, {}, token
+
+    def info(self, token, params):
+        """GET /session/info"""
+        return http.client.OK, {
+            "userName": MOCK_TS_USERNAME,
+            "privileges": [Constants.PRIVILEGE_ADMINSTRATION]}
+
+    def switch_org(self, token, params):
+        """PUT /session/orgs"""
+        org_id = int(params["org"])
+        if org_id not in self.orgs:
+            return http.client.NOT_FOUND, None
+        self.sessions[token] = org_id
+        return http.client.NO_CONTENT, None
+
+    def list_metadata(self, token, params):
+        """GET /metadata/list"""
+        all_orgs = params.get("orgId") == str(Constants.ALL_ORG_ID)
+        org_id = self.sessions[token]
+        if params["type"] == "USER":
+            principals = [user for user in self.users.values()
+                          if all_orgs or org_id in user["orgIds"]]
+            to_header = self._user_header
+        elif params["type"] == "USER_GROUP":
+            principals = [group for group in self.groups.values()
+                          if all_orgs or group["org"] == org_id]
+            to_header = self._group_header
+        else:
+            return http.client.BAD_REQUEST, None
+        offset = int(params.get("offset", 0))
+        batchsize = int(params.get("batchsize", len(principals)))
+        return http.client.OK, {
+            "headers": [to_header(principal) for principal
+                        in principals[offset:offset + batchsize]],
+            "isLastBatch": offset + batchsize >= len(principals)}
+
+    def create_user(self, token, params):
+        """POST /session/user/create"""
+        if self._find_user(params["name"]) is not None:
+            return http.client.CONFLICT, {"error": "User already exists."}
+        properties = json.loads(params.get("properties") or "{}")
+        org_ids = set(self._json_list(params, "orgids")
+                      or [self.sessions[token]])
+        user = {"id": str(uuid.uuid4()), "name": params["name"],
+                "display_name": params.get("displayname"),
+                "email": properties.get("mail"),
+                "type": params.get("usertype") or "LOCAL_USER",
+                "orgIds": org_ids}
+        self.users[user["id"]] = user
+        self._user_ids[user["name"].lower()] = user["id"]
+        return http.client.OK, {"header": self._user_header(user)}
+
+    def delete_users(self, token, params):
+        """POST /session/user/deleteusers"""
+        for user_id in self._json_list(params, "ids"):
+            user = self.users.pop(user_id, None)
+            if user is not None:
+                del self._user_ids[user["name"].lower()]
+            for group in self.groups.values():
+                group["users"].discard(user_id)
+        return http.client.NO_CONTENT, None
+
+    def search_user(self, token, params):
+        """POST /v2/users/search, by name or paged over all the users."""
+        if "user_identifier" in params:
+            user = self._find_user(params["user_identifier"])
+            users = [user] if user is not None else []
+        else:
+            users = list(self.users.values())
+            offset = int(params.get("record_offset", 0))
+            users = users[offset:offset
+                          + int(params.get("record_size", len(users)))]
+        return http.client.OK, {"data": [{
+            "id": user["id"], "name": user["name"],
+            "display_name": user["display_name"], "email": user["email"],
+            "orgs": [{"id": org_id, "name": self.orgs[org_id]}
+                     for org_id in sorted(user["orgIds"])]} for user in users]}
+
+    def update_principal(self, token, params, identifier):
+        """PUT /v2/users/{identifier}, used for users and groups."""
+        user = self._find_user(identifier)
+        if user is None:
+            return self._update_group(token, params, identifier)
+        if "name" in params:
+            self._rename(user, params["name"])
+        for key in ("display_name", "email"):
+            if key in params:
+                user[key] = params[key]
+        if "org_identifiers" in params:
+            org_ids = {int(org_id)
+                       for org_id in self._json_list(params,
+                                                     "org_identifiers")}
+            user["orgIds"] = {
+                Constants.Add: user["orgIds"] | org_ids,
+                Constants.Remove: user["orgIds"] - org_ids,
+            }.get(params.get("operation"), org_ids)
+        return http.client.NO_CONTENT, None
+
+    def _update_group(self, token, params, identifier):
+        group = self._find_group(identifier, self.sessions[token])
+        if group is None:
+            return http.client.NOT_FOUND, None
+        if "name" in params:
+            self._rename(group, params["name"])
+        for key in ("display_name", "description", "type"):
+            if key in params:
+                group[key] = params[key]
+        if "privileges" in params:
+            group["privileges"] = json.loads(params["privileges"])
+        return http.client.NO_CONTENT, None
+
+    def create_group(self, token, params):
+        """POST /session/group/create"""
+        org_id = self.sessions[token]
+        if self._find_group(params["name"], org_id) is not None:
+            return http.client.CONFLICT, {"error": "Group already exists."}
+        group = {"id": str(uuid.uuid4()), "name": params["name"],
+                 "display_name": params.get("display_name"),
+                 "description": params.get("description"),
+                 "type": params.get("grouptype") or "LOCAL_GROUP",
+                 "privileges": (json.loads(params["privileges"])
+                                if params.get("privileges") else None),
+                 "org": org_id, "users": set(), "groups": set()}
+        self.groups[group["id"]] = group
+        self._group_ids[(org_id, group["name"].lower())] = group["id"]
+        return http.client.OK, {"header": self._group_header(group)}
+
+    def delete_groups(self, token, params):
+        """POST /session/group/deletegroups"""
+        for group_id in self._json_list(params, "ids"):
+            group = self.groups.pop(group_id, None)
+            if group is not None:
+                del self._group_ids[(group["org"], group["name"].lower())]
+            for group in self.groups.values():
+                group["groups"].discard(group_id)
+        return http.client.NO_CONTENT, None
+
+    def update_users_in_group(self, token, params):
+        """POST /session/group/updateusersingroup"""
+        group = self.groups.get(params["groupid"])
+        if group is None:
+            return http.client.NOT_FOUND, None
+        group["users"] = {user_id
+                          for user_id in self._json_list(params, "userids")
+                          if user_id in self.users}
+        return http.client.NO_CONTENT, None
+
+    def update_groups_in_group(self, token, params):
+        """POST /session/group/updategroupsingroup"""
+        group = self.groups.get(params["groupid"])
+        if group is None:
+            return http.client.NOT_FOUND, None
+        group["groups"] = {group_id for group_id
+                           in self._json_list(params, "principalids")
+                           if group_id in self.groups}
+        return http.client.NO_CONTENT, None
+
+    def list_users_in_group(self, token, params, gid):
+        """GET /session/group/listuser/{gid}"""
+        group = self.groups.get(gid)
+        if group is None:
+            return http.client.NOT_FOUND, None
+        return http.client.OK, [{"header": self._user_header(
+            self.users[user_id])} for user_id in group["users"]]
+
+    def list_groups_in_group(self, token, params, gid):
+        """GET /session/group/listgroup/{gid}"""
+        group = self.groups.get(gid)
+        if group is None:
+            return http.client.NOT_FOUND, None
+        return http.client.OK, [{"header": self._group_header(
+            self.groups[group_id])} for group_id in group["groups"]]
+
+    def search_group(self, token, params):
+        """POST /v2/groups/search, by name or paged over the org."""
+        org_id = self.sessions[token]
+        if "group_identifier" in params:
+            group = self._find_group(params["group_identifier"], org_id)
+            groups = [group] if group is not None else []
+        else:
+            groups = [group for group in self.groups.values()
+                      if group["org"] == org_id]
+            offset = int(params.get("record_offset", 0))
+            groups = groups[offset:offset
+                            + int(params.get("record_size", len(groups)))]
+        return http.client.OK, {"data": [{
+            "id": group["id"], "name": group["name"],
+            "display_name": group["display_name"],
+            "description": group["description"], "type": group["type"],
+            "privileges": group["privileges"],
+            "users": [{"id": user_id} for user_id in group["users"]],
+            "sub_groups": [{"id": group_id} for group_id in group["groups"]],
+        } for group in groups]}
+
+    def create_org(self, token, params):
+        """POST /tspublic/v1/org"""
+        if params["name"] in self.orgs.values():
+            return http.client.CONFLICT, None
+        org_id = max(self.orgs) + 1
+        self.orgs[org_id] = params["name"]
+        return http.client.OK, {"orgId": org_id, "orgName": params["name"]}
+
+    def list_orgs(self, token, params):
+        """POST /tspublic/v1/org/search"""
+        return http.client.OK, [{"orgId": org_id, "orgName": name}
+                                for org_id, name in self.orgs.items()]
+
+
+class _MockTSHandler(BaseHTTPRequestHandler):
+    """Request handler passing the requests on to the MockTSServer."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, do not hold the body back.
+    disable_nagle_algorithm = True
+
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        status, response, token = self.server.mock.handle(
+            self.command, self.path, body, self.headers.get("Cookie"))
+        payload = json.dumps(response).encode() if response is not None \
+            else b""
+        self.send_response(status)
+        if token is not None:
+            self.send_header("Set-Cookie",
+                             "{}={}; Path=/".format(SESSION_COOKIE, token))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = _serve
+
+    def log_message(self, *args):
+        """Requests are not logged."""
+
+
+def build_mock_tree(user_cnt, org_cnt):
+    """Builds a mock server with a tree of nested groups and users. Groups
+    have GROUP_FANOUT child groups each and users are spread evenly over the
+    groups. Each top level group and all groups and users below it map to one
+    of the orgs.
+
+    :param user_cnt: Number of users.
+    :param org_cnt: Number of orgs to map the users and groups to.
+    :return: Tuple of MockADServer, number of groups and list of org mappings
+    in the format of the org_file_input flag.
+    """
+    group_cnt = max(user_cnt // GROUP_USERS, 1)
+    group_dn = "cn=group{},ou=groups," + MOCK_BASEDN
+    user_dn = "cn=user{},ou=users," + MOCK_BASEDN
+    members = [[] for _ in range(group_cnt)]
+    group_orgs = []
+    for group_ind in range(group_cnt):
+        if group_ind < GROUP_FANOUT:
+            group_orgs.append("org{}".format(group_ind % org_cnt))
+            continue
+        parent_ind = (group_ind - GROUP_FANOUT) // GROUP_FANOUT
+        members[parent_ind].append(group_dn.format(group_ind))
+        group_orgs.append(group_orgs[parent_ind])
+    for user_ind in range(user_cnt):
+        members[user_ind % group_cnt].append(user_dn.format(user_ind))
+
+    mock_server = MockADServer({
+        group_dn.format(group_ind): {"member": members[group_ind]}
+        for group_ind in range(group_cnt)})
+    conn = mock_server.connect()
+    org_mapping = []
+    for ou_dn in (MOCK_BASEDN, "ou=groups," + MOCK_BASEDN,
+                  "ou=users," + MOCK_BASEDN):
+        conn.strategy.add_entry(ou_dn,
+                                {"objectClass": ["organizationalUnit"]})
+    for group_ind in range(group_cnt):
+        conn.strategy.add_entry(group_dn.format(group_ind), {
+            "objectClass": ["group"],
+            "cn": "group{}".format(group_ind),
+            "displayName": "Group {}".format(group_ind)})
+        org_mapping.append({"dn": group_dn.format(group_ind),
+                            "orgs": [group_orgs[group_ind]]})
+    for user_ind in range(user_cnt):
+        conn.strategy.add_entry(user_dn.format(user_ind), {
+            "objectClass": ["user"],
+            "cn": "user{}".format(user_ind),
+            "sAMAccountName": "user{}".format(user_ind),
+            "userPrincipalName": "user{}@mock.thoughtspot.com".format(
+                user_ind),
+            "displayName": "User {}".format(user_ind),
+            "mail": "user{}@mock.thoughtspot.com".format(user_ind)})
+        org_mapping.append({
+            "dn": user_dn.format(user_ind),
+            "orgs": [group_orgs[user_ind % group_cnt]]})
+    return mock_server, group_cnt, org_mapping
+
+
+def mock_ldap_tree_class(tree_class, mock_server):
+    """:param tree_class: SyncTree or a subclass of it.
+    :param mock_server: MockADServer to fetch the entities from.
+    :return: Subclass of tree_class fetching from mock_server.
+    """
+
+    class MockLDAPSyncTree(tree_class):
+        """Sync tree fetching from the in-memory LDAP server."""
+
+        def new_ldap_handle(self, cache_size, page_size, pool_size):
+            return MockLDAPApiWrapper(mock_server, cache_size, page_size,
+                                      pool_size)
+
+    return MockLDAPSyncTree
+
+
+def sync_args(ts_hostport, **overrides):
+    """:param ts_hostport: Hostport of the MockTSServer.
+    :param overrides: Flags to set in addition.
+    :return: Dictionary of flags as parsed by syncUsersAndGroups.py.
+    """
+    user_args = {arg.flag: arg.default
+                 for arg in chain(ScriptArguments.non_optional_arguments,
+                                  ScriptArguments.sync_arguments)}
+    user_args.update({
+        "ts_hostport": ts_hostport,
+        "ts_uname": MOCK_TS_USERNAME,
+        "ts_pass": MOCK_TS_PASSWORD,
+        "ldap_hostport": MOCK_HOSTPORT,
+        "ldap_uname": MOCK_USERNAME,
+        "ldap_pass": MOCK_PASSWORD,
+        "sync": True,
+        "basedn": MOCK_BASEDN,
+    })
+    user_args.update(overrides)
+    return user_args
+
+
+def bench_sync(tree_name, run, mock_server, ts_server, principal_cnt,
+               user_args, trace_memory=False):
+    """Times a sync run and prints its statistics.
+
+    :param tree_name: Key of TREES to run.
+    :param run: Label of the run.
+    :param mock_server: MockADServer to sync from.
+    :param ts_server: Running MockTSServer to sync to.
+    :param principal_cnt: Number of users and groups in the LDAP tree.
+    :param user_args: Flags of the run.
+    :param trace_memory: Whether to trace the peak memory of the run.
+    :return: Dictionary of the statistics of the run.
+    """
+    tree_class = mock_ldap_tree_class(TREES[tree_name], mock_server)
+    searches = mock_server.search_cnt
+    requests = ts_server.request_cnt
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    tree_class(user_args)
+    elapsed = time.perf_counter() - start
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    requests = ts_server.request_cnt - requests
+    stats = {
+        "tree": tree_name,
+        "run": run,
+        "principals": principal_cnt,
+        "seconds": round(elapsed, 3),
+        "ts_requests": requests,
+        "requests_per_principal": round(requests / principal_cnt, 3),
+        "ldap_searches": mock_server.search_cnt - searches,
+        "ts_users": len(ts_server.users),
+        "ts_groups": len(ts_server.groups),
+    }
+    msg = ("{tree:>9} {run:>7} {principals:>7} principals: {seconds:8.2f}s, "
+           "{ts_requests:>7} TS requests ({requests_per_principal:.3f} per "
+           "principal), {ldap_searches:>5} LDAP searches, TS has {ts_users} "
+           "users and {ts_groups} groups".format(**stats))
+    if trace_memory:
+        stats["peak_mb"] = round(peak / 2 ** 20, 1)
+        msg += ", peak memory {peak_mb:.1f} MB".format(**stats)
+    print(msg + ".", flush=True)
+    return stats
+
+
+def main():
+    """Runs the benchmarks."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        help="Comma separated numbers of users of the LDAP trees",
+        default="1000,10000",
+    )
+    parser.add_argument(
+        "--trees",
+        help="Comma separated sync trees to run, of {}".format(
+            ", ".join(TREES)),
+        default=",".join(TREES),
+    )
+    parser.add_argument(
+        "--latency",
+        help="Seconds each request to the ThoughtSpot server takes",
+        type=float,
+        default=0.001,
+    )
+    parser.add_argument(
+        "--orgs",
+        help="Number of orgs the org aware sync maps the tree to",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--ts_org_workers",
+        help="Number of sessions the org aware sync works on orgs with",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--upsert",
+        help="Upsert users and groups, comparing their properties",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--memory",
+        help="Trace the peak memory allocated during each run",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--json_file",
+        help="File to write the statistics of all runs to as JSON",
+        default=None,
+    )
+    arguments = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    cwd = os.getcwd()
+    for user_cnt in [int(size) for size in arguments.sizes.split(",")]:
+        mock_server, group_cnt, org_mapping = build_mock_tree(
+            user_cnt, arguments.orgs)
+        for tree_name in arguments.trees.split(","):
+            ts_server = MockTSServer(arguments.latency)
+            ts_server.start()
+            # Sync reports, profiles and journals are left in a scratch
+            # directory.
+            with tempfile.TemporaryDirectory() as work_dir:
+                os.chdir(work_dir)
+                try:
+                    overrides = {"upsert_user": arguments.upsert,
+                                 "upsert_group": arguments.upsert}
+                    if tree_name == "org_aware":
+                        with open("org_mapping.json", "w") as org_file:
+                            json.dump(org_mapping, org_file)
+                        overrides.update({
+                            "org_mapping": True,
+                            "org_file_input": "org_mapping.json",
+                            "ts_org_workers": arguments.ts_org_workers})
+                    user_args = sync_args(ts_server.hostport, **overrides)
+                    for run in ("initial", "steady"):
+                        results.append(bench_sync(
+                            tree_name, run, mock_server, ts_server,
+                            user_cnt + group_cnt, user_args,
+                            arguments.memory))
+                finally:
+                    os.chdir(cwd)
+                    ts_server.stop()
+
+    if arguments.json_file:
+        with open(arguments.json_file, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
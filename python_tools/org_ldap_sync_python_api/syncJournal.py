@@ -0,0 +1,151 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+"""Checkpoint journal of a sync run, used to resume interrupted runs."""
+
+import json
+import logging
+import os
+from collections import defaultdict
+
+
+class SyncJournal():
+    """Append-only record of the work done by a sync run. A line of JSON is
+       appended as soon as a step is done, so that the journal of a run which
+       died halfway tells what is left to do. The journal is removed once
+       the run completes.
+
+       Records are of the forms:
+       {"version": .., "config": ..} as the first line,
+       {"nodes": ..} with the users, groups and relationships fetched from
+       LDAP,
+       {"done": kind, "keys": [..]} for the users/groups processed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, file_name, config):
+        """@param file_name: Path of the journal file, None to keep the
+           journal in memory only, e.g. for dry runs.
+           @param config: Dictionary of sync settings the journal is valid
+           for.
+        """
+        self.file_name = file_name
+        self.config = config
+        self.resumed = False
+        # Contents of the nodes record, None if not recorded yet.
+        self.nodes = None
+        # Kind of work to the keys done.
+        self.done = defaultdict(set)
+        self._file = None
+        # Whether the file ends with a line cut short by an interruption.
+        self._cut_short = False
+
+    @staticmethod
+    def open(file_name, config, resume):
+        """Opens the journal of a run.
+           @param file_name: Path of the journal file, None for no file.
+           @param config: Dictionary of the current sync settings.
+           @param resume: Continue the journal left by an interrupted run if
+           there is one, else start a new one.
+           @return: SyncJournal object.
+        """
+        journal = SyncJournal(file_name, config)
+        if file_name is None:
+            return journal
+        if resume and journal._load():
+            journal.resumed = True
+            logging.info("Resuming the run journaled in %s.", file_name)
+            journal._file = open(file_name, "a")
+            if journal._cut_short:
+                # Terminate the line cut short so the next record starts on
+                # its own line.
+                journal._file.write("\n")
+        else:
+            journal._file = open(file_name, "w")
+            journal._append({"version": SyncJournal.VERSION,
+                             "config": config})
+        return journal
+
+    def _load(self):
+        """Reads the journal file left by an interrupted run.
+           @return: True if the journal can be resumed.
+        """
+        try:
+            with open(self.file_name) as journal_file:
+                lines = journal_file.readlines()
+        except FileNotFoundError:
+            logging.info("No journal found at %s, starting a new run.",
+                         self.file_name)
+            return False
+        except OSError as e:
+            logging.error("Failed to read journal %s. %s", self.file_name, e)
+            return False
+
+        self._cut_short = bool(lines) and not lines[-1].endswith("\n")
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Line cut short by an interruption.
+                continue
+        if not records or records[0].get("version") != SyncJournal.VERSION:
+            logging.info("Journal %s is not usable, starting a new run.",
+                         self.file_name)
+            return False
+        if records[0].get("config") != self.config:
+            logging.info("Journal %s was written with different sync "
+                         "settings, starting a new run.", self.file_name)
+            return False
+
+        for record in records[1:]:
+            if "nodes" in record:
+                self.nodes = record["nodes"]
+            elif "done" in record:
+                self.done[record["done"]].update(record["keys"])
+        return True
+
+    def _append(self, record):
+        """Appends a record and flushes it to the file.
+           @param record: JSON serializable dictionary.
+        """
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def record_nodes(self, nodes):
+        """Records the users, groups and relationships fetched from LDAP.
+           @param nodes: JSON serializable dictionary of them.
+        """
+        self.nodes = nodes
+        self._append({"nodes": nodes})
+
+    def mark_done(self, kind, keys):
+        """Records users/groups as processed.
+           @param kind: Kind of work done, e.g. "user".
+           @param keys: List of names/IDs processed.
+        """
+        if not keys:
+            return
+        self.done[kind].update(keys)
+        self._append({"done": kind, "keys": list(keys)})
+
+    def is_done(self, kind, key):
+        """@param kind: Kind of work.
+           @param key: Name/ID of the user/group.
+           @return: True if the work was done by the interrupted run.
+        """
+        return key in self.done[kind]
+
+    def close(self, completed):
+        """Closes the journal.
+           @param completed: True if the run completed, in which case the
+           journal is removed.
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if completed:
+            os.remove(self.file_name)
@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Unit tests for syncJournal.py.
+
+Example command:
+
+>>> python syncJournalTest.py
+"""
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from syncJournal import SyncJournal
+
+CONFIG = {"basedn": "dc=example,dc=com", "upsert_user": True}
+
+
+class TestSyncJournal(unittest.TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.file_name = os.path.join(work_dir.name, "journal.jsonl")
+
+    def interrupted_run(self):
+        """Journals part of a run and leaves the last record cut short, as a
+           run killed while writing it would.
+        """
+        journal = SyncJournal.open(self.file_name, CONFIG, resume=True)
+        self.assertFalse(journal.resumed)
+        journal.record_nodes({"users": ["cn=a"], "groups": ["cn=g"]})
+        journal.mark_done("user", ["a", "b"])
+        journal.mark_done("group", ["g"])
+        journal.mark_done("user", ["c"])
+        journal._file.close()
+        with open(self.file_name, "r+") as journal_file:
+            journal_file.truncate(os.path.getsize(self.file_name) - 5)
+
+    def read_records(self):
+        with open(self.file_name) as journal_file:
+            return [json.loads(line) for line in journal_file]
+
+    def test_resume(self):
+        """Tests a resumed journal has the work recorded in the complete
+           records, and terminates the line cut short before appending.
+        """
+        self.interrupted_run()
+        journal = SyncJournal.open(self.file_name, CONFIG, resume=True)
+        self.assertTrue(journal.resumed)
+        self.assertEqual(journal.nodes,
+                         {"users": ["cn=a"], "groups": ["cn=g"]})
+        self.assertTrue(journal.is_done("user", "a"))
+        self.assertTrue(journal.is_done("user", "b"))
+        self.assertTrue(journal.is_done("group", "g"))
+        # Its record was cut short.
+        self.assertFalse(journal.is_done("user", "c"))
+        self.assertFalse(journal.is_done("group", "a"))
+
+        journal.mark_done("user", ["c"])
+        journal.close(completed=False)
+        with open(self.file_name) as journal_file:
+            lines = journal_file.read().split("\n")
+        self.assertEqual(json.loads(lines[-2]), {"done": "user",
+                                                 "keys": ["c"]})
+        self.assertEqual(lines[-1], "")
+        # The cut short line stays on a line of its own.
+        self.assertRaises(ValueError, json.loads, lines[-3])
+
+        journal = SyncJournal.open(self.file_name, CONFIG, resume=True)
+        self.assertTrue(journal.is_done("user", "c"))
+        journal.close(completed=True)
+        self.assertFalse(os.path.exists(self.file_name))
+
+    def test_no_resume(self):
+        """Tests a journal left is started over without resume."""
+        self.interrupted_run()
+        journal = SyncJournal.open(self.file_name, CONFIG, resume=False)
+        self.assertFalse(journal.resumed)
+        self.assertFalse(journal.is_done("user", "a"))
+        journal.close(completed=False)
+        self.assertEqual(self.read_records(),
+                         [{"version": SyncJournal.VERSION, "config": CONFIG}])
+
+    def test_config_mismatch(self):
+        """Tests a journal written with other settings is not resumed."""
+        self.interrupted_run()
+        journal = SyncJournal.open(self.file_name,
+                                   dict(CONFIG, upsert_user=False),
+                                   resume=True)
+        self.assertFalse(journal.resumed)
+        self.assertIsNone(journal.nodes)
+        self.assertFalse(journal.is_done("user", "a"))
+        journal.close(completed=False)
+
+    def test_version_mismatch(self):
+        """Tests a journal of another version is not resumed."""
+        with open(self.file_name, "w") as journal_file:
+            journal_file.write(json.dumps({"version": SyncJournal.VERSION + 1,
+                                           "config": CONFIG}) + "\n")
+            journal_file.write(json.dumps({"done": "user",
+                                           "keys": ["a"]}) + "\n")
+        journal = SyncJournal.open(self.file_name, CONFIG, resume=True)
+        self.assertFalse(journal.resumed)
+        self.assertFalse(journal.is_done("user", "a"))
+        journal.close(completed=False)
+
+    def test_in_memory(self):
+        """Tests a journal without file records the work in memory only."""
+        journal = SyncJournal.open(None, CONFIG, resume=True)
+        journal.mark_done("user", ["a"])
+        self.assertTrue(journal.is_done("user", "a"))
+        journal.close(completed=True)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    unittest.main()
@@ -0,0 +1,139 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+"""Timing and request statistics of a sync run."""
+
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlsplit
+
+# Path segments which identify an object rather than an endpoint.
+ID_SEGMENT_RE = re.compile(
+    r"/([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-"
+    r"[0-9a-fA-F]{12}|\d+)(?=/|$)")
+
+
+class SyncProfiler():
+    """Collects the wall time of the phases of a sync run, the number and
+       latency of the requests made to TS system per endpoint, and any other
+       statistics of the run, and writes them as a JSON summary.
+
+       Phases are sequential, starting a phase ends the current one. Time
+       spent in a phase started more than once is summed up.
+    """
+
+    # Latency percentiles reported per endpoint.
+    PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        # Phase name to seconds spent in it, in the order first started.
+        self.phases = OrderedDict()
+        self._phase = None
+        self._phase_start = None
+        # "METHOD endpoint" to request latencies in seconds.
+        self.requests = defaultdict(list)
+        self.failed_requests = defaultdict(int)
+        # Name to dictionary of statistics, e.g. of caches.
+        self.stats = OrderedDict()
+
+    def start_phase(self, name):
+        """Ends the current phase, if any, and starts a new one.
+           @param name: Name of the phase.
+        """
+        self.end_phase()
+        logging.debug("Starting phase %s.", name)
+        self._phase = name
+        self._phase_start = time.perf_counter()
+
+    def end_phase(self):
+        """Ends the current phase, if any."""
+        if self._phase is None:
+            return
+        elapsed = time.perf_counter() - self._phase_start
+        self.phases[self._phase] = self.phases.get(self._phase, 0.0) + elapsed
+        self._phase = None
+
+    def instrument_ts(self, ts_handle):
+        """Records the requests made by a TSApiWrapper session.
+           @param ts_handle: TSApiWrapper object.
+        """
+        ts_handle.session.hooks["response"].append(self._on_response)
+
+    def _on_response(self, response, *args, **kwargs):
+        """Response hook of the requests sessions, see instrument_ts."""
+        # pylint: disable=unused-argument
+        path = ID_SEGMENT_RE.sub("/{id}", urlsplit(response.request.url).path)
+        self.record_request("{} {}".format(response.request.method, path),
+                            response.elapsed.total_seconds(),
+                            response.status_code < 400)
+
+    def record_request(self, endpoint, seconds, succeeded=True):
+        """Records a request.
+           @param endpoint: Name of the endpoint.
+           @param seconds: Latency of the request.
+           @param succeeded: False if the request failed.
+        """
+        with self._lock:
+            self.requests[endpoint].append(seconds)
+            if not succeeded:
+                self.failed_requests[endpoint] += 1
+
+    def add_stats(self, name, stats):
+        """Adds statistics to the summary.
+           @param name: Name of the statistics.
+           @param stats: JSON serializable dictionary.
+        """
+        self.stats[name] = stats
+
+    @staticmethod
+    def percentile(sorted_values, fraction):
+        """@param sorted_values: Non empty sorted list.
+           @param fraction: Percentile as a fraction, e.g. 0.95.
+           @return: Nearest-rank percentile of the values.
+        """
+        # Rounded first so that e.g. 0.07 * 100 is not taken as above 7.
+        rank = math.ceil(round(fraction * len(sorted_values), 9)) - 1
+        return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+    def summary(self):
+        """@return: Dictionary of the statistics collected so far."""
+        requests = OrderedDict()
+        with self._lock:
+            endpoints = {endpoint: sorted(latencies) for endpoint, latencies
+                         in self.requests.items()}
+            failed_requests = dict(self.failed_requests)
+        for endpoint in sorted(endpoints):
+            latencies = endpoints[endpoint]
+            endpoint_stats = OrderedDict([
+                ("count", len(latencies)),
+                ("failed", failed_requests.get(endpoint, 0)),
+                ("total_seconds", round(sum(latencies), 6))])
+            for name, fraction in SyncProfiler.PERCENTILES:
+                endpoint_stats[name] = round(
+                    SyncProfiler.percentile(latencies, fraction), 6)
+            endpoint_stats["max"] = round(latencies[-1], 6)
+            requests[endpoint] = endpoint_stats
+
+        return OrderedDict([
+            ("total_seconds", round(time.perf_counter() - self._start, 6)),
+            ("phases", OrderedDict((name, round(seconds, 6))
+                                   for name, seconds in self.phases.items())),
+            ("request_count", sum(len(latencies)
+                                  for latencies in endpoints.values())),
+            ("requests", requests),
+        ] + list(self.stats.items()))
+
+    def write(self, file_name):
+        """Ends the current phase and writes the summary.
+           @param file_name: Path of the JSON file to write.
+        """
+        self.end_phase()
+        with open(file_name, "w") as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+        logging.info("Wrote sync profile to %s.", file_name)
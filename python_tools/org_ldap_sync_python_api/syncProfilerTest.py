@@ -0,0 +1,38 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Unit tests for syncProfiler.py.
+
+Example command:
+
+>>> python syncProfilerTest.py
+"""
+
+import unittest
+
+from syncProfiler import SyncProfiler
+
+
+class TestSyncProfiler(unittest.TestCase):
+
+    def test_percentile(self):
+        """Tests the nearest-rank percentile, i.e. the smallest value with at
+           least the fraction of the values at or below it.
+        """
+        percentile = SyncProfiler.percentile
+        self.assertEqual(percentile([1, 2], 0.5), 1)
+        self.assertEqual(percentile([1, 2, 3, 4, 5, 6], 0.5), 3)
+        self.assertEqual(percentile([1, 2, 3], 0.5), 2)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertEqual(percentile([1, 2], 0.0), 1)
+        self.assertEqual(percentile([1, 2], 1.0), 2)
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.07), 7)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(list(range(1, 21)), 0.95), 19)
+
+
+if __name__ == "__main__":
+    unittest.main()
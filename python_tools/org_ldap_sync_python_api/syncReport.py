@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+"""Writer of the sync and error reports."""
+
+import json
+import re
+import threading
+import time
+import weakref
+
+
+class ReportWriter():
+    """Drop-in replacement for the report file objects of SyncTree.
+
+       As text, the report is written as is. As JSON Lines, every write
+       becomes a record of the form
+       {"time": .., "section": .., "message": ..}
+       where section is the title of the last "===== Title =====" banner
+       written, e.g. "Addition Phase". Banners and blank writes only change
+       the section.
+
+       Writes are thread safe, as org aware syncs report from several
+       sessions at once, and go through the buffer of the report file. The
+       file is closed, flushing what is buffered, on close, or when the
+       writer is garbage collected or the interpreter exits without it being
+       closed, e.g. when a sync stops early. Writing to a closed report
+       raises ValueError like a closed file does.
+    """
+
+    TEXT = "text"
+    JSON_LINES = "jsonl"
+    FORMATS = (TEXT, JSON_LINES)
+    BANNER_RE = re.compile(r"^=+ *([^=]*?) *=+$")
+
+    def __init__(self, file_name, report_format=TEXT):
+        """@param file_name: Path of the report, the extension is replaced
+           with .jsonl for JSON Lines.
+           @param report_format: One of FORMATS.
+        """
+        if report_format not in ReportWriter.FORMATS:
+            raise ValueError("Unknown report format: {}".format(report_format))
+        self.json_lines = report_format == ReportWriter.JSON_LINES
+        if self.json_lines:
+            file_name = file_name.rsplit(".", 1)[0] + ".jsonl"
+        self.section = None
+        self._file = open(file_name, "w")
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, self._file.close)
+
+    @property
+    def name(self):
+        """@return: Path of the report."""
+        return self._file.name
+
+    @property
+    def closed(self):
+        """@return: Whether the report is closed."""
+        return self._file.closed
+
+    def _record(self, msg):
+        """@param msg: String written to the report.
+           @return: JSON line of the message, None if there is nothing to
+           record.
+        """
+        text = msg.strip()
+        if not text:
+            return None
+        banner = ReportWriter.BANNER_RE.match(text)
+        if banner:
+            if banner.group(1):
+                self.section = banner.group(1)
+            return None
+        return json.dumps({"time": round(time.time(), 3),
+                           "section": self.section,
+                           "message": text}) + "\n"
+
+    def write(self, msg):
+        """Writes a message to the report.
+           @param msg: String to write.
+        """
+        with self._lock:
+            if self._file.closed:
+                raise ValueError("I/O operation on closed report.")
+            if self.json_lines:
+                msg = self._record(msg)
+                if msg is None:
+                    return
+            self._file.write(msg)
+
+    def writelines(self, msgs):
+        """Writes messages to the report.
+           @param msgs: Iterable of strings to write.
+        """
+        for msg in msgs:
+            self.write(msg)
+
+    def flush(self):
+        """Flushes the buffer of the report file."""
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """Closes the report file. Closing a closed report does nothing."""
+        with self._lock:
+            self._finalizer()
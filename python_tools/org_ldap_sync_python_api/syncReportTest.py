@@ -0,0 +1,95 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Unit tests for the ReportWriter of syncReport.py.
+
+Example command:
+
+>>> python syncReportTest.py
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from syncReport import ReportWriter
+
+MESSAGES = ["===== Addition Phase =====\n",
+            "Created user a.\n",
+            "\n",
+            "==========\n",
+            "Created group g.\n",
+            "===== Deletion Phase =====\n",
+            "Deleted user b.\n"]
+
+
+class TestReportWriter(unittest.TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.file_name = os.path.join(work_dir.name, "sync_report.txt")
+
+    def test_text(self):
+        """Tests text reports are written as is."""
+        report = ReportWriter(self.file_name)
+        report.write(MESSAGES[0])
+        report.writelines(MESSAGES[1:])
+        report.close()
+        self.assertEqual(report.name, self.file_name)
+        with open(self.file_name) as report_file:
+            self.assertEqual(report_file.read(), "".join(MESSAGES))
+
+    def test_json_lines(self):
+        """Tests JSON Lines reports get a record per message with the section
+           of the last titled banner, in a file with the .jsonl extension.
+        """
+        report = ReportWriter(self.file_name, ReportWriter.JSON_LINES)
+        report.writelines(MESSAGES)
+        report.close()
+        self.assertEqual(report.name, self.file_name[:-4] + ".jsonl")
+        self.assertFalse(os.path.exists(self.file_name))
+        with open(report.name) as report_file:
+            records = [json.loads(line) for line in report_file]
+        self.assertEqual(
+            [(record["section"], record["message"]) for record in records],
+            [("Addition Phase", "Created user a."),
+             ("Addition Phase", "Created group g."),
+             ("Deletion Phase", "Deleted user b.")])
+        self.assertTrue(all(isinstance(record["time"], float)
+                            for record in records))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ReportWriter(self.file_name, "xml")
+
+    def test_closed(self):
+        """Tests writing to a closed report raises ValueError, while closing
+           it again does nothing.
+        """
+        report = ReportWriter(self.file_name)
+        report.write("Created user a.\n")
+        self.assertFalse(report.closed)
+        report.close()
+        report.close()
+        self.assertTrue(report.closed)
+        with self.assertRaises(ValueError):
+            report.write("Created user b.\n")
+        with open(self.file_name) as report_file:
+            self.assertEqual(report_file.read(), "Created user a.\n")
+
+    def test_collected(self):
+        """Tests what is buffered is flushed when an unclosed report is
+           garbage collected.
+        """
+        report = ReportWriter(self.file_name)
+        report.write("Created user a.\n")
+        del report
+        with open(self.file_name) as report_file:
+            self.assertEqual(report_file.read(), "Created user a.\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+"""Snapshot of the LDAP state synced to TS system, used for incremental sync."""
+
+import json
+import logging
+import os
+
+import ldapApi
+from entityClasses import EntityType
+
+
+class SyncSnapshot():
+    """Compact record of the LDAP users and groups synced by the last run
+       along with the LDAP high-water mark read before that run. Incremental
+       runs only look at LDAP entries changed since the high-water mark and
+       use the snapshot for everything else.
+    """
+
+    VERSION = 1
+
+    def __init__(self, config, watermark):
+        """@param config: Dictionary of sync settings the snapshot is valid
+           for, e.g. base DN and identifiers.
+           @param watermark: LDAP high-water mark as returned by
+           LDAPApiWrapper.get_watermark.
+        """
+        self.config = config
+        self.watermark = watermark
+        # DN to [name, display name, email].
+        self.users = {}
+        # DN to [name, display name, member DNs].
+        self.groups = {}
+
+    @staticmethod
+    def load(file_name, config):
+        """Loads the snapshot saved by the last run.
+           @param file_name: Path of the snapshot file.
+           @param config: Dictionary of the current sync settings.
+           @return: SyncSnapshot or None if there is no usable snapshot.
+        """
+        try:
+            with open(file_name) as snapshot_file:
+                data = json.load(snapshot_file)
+        except FileNotFoundError:
+            logging.info("No snapshot found at %s.", file_name)
+            return None
+        except (OSError, ValueError) as e:
+            logging.error("Failed to read snapshot %s. %s", file_name, e)
+            return None
+        if data.get("version") != SyncSnapshot.VERSION:
+            logging.info("Snapshot %s has an unsupported version.", file_name)
+            return None
+        if data.get("config") != config:
+            logging.info("Snapshot %s was taken with different sync "
+                         "settings.", file_name)
+            return None
+        snapshot = SyncSnapshot(config, data["watermark"])
+        snapshot.users = data["users"]
+        snapshot.groups = data["groups"]
+        return snapshot
+
+    def save(self, file_name):
+        """Saves the snapshot. The file is replaced atomically so that an
+           interrupted save leaves the previous snapshot in place.
+           @param file_name: Path of the snapshot file.
+        """
+        tmp_file_name = file_name + ".tmp"
+        with open(tmp_file_name, "w") as snapshot_file:
+            json.dump({"version": SyncSnapshot.VERSION,
+                       "config": self.config,
+                       "watermark": self.watermark,
+                       "users": self.users,
+                       "groups": self.groups},
+                      snapshot_file, separators=(",", ":"))
+        os.replace(tmp_file_name, file_name)
+        logging.info("Saved snapshot of %d users and %d groups to %s.",
+                     len(self.users), len(self.groups), file_name)
+
+    def is_continuation_of(self, watermark):
+        """Tells if changes can be searched for from the snapshot's
+           high-water mark given the current one. USNs are specific to a
+           domain controller, hence both have to come from the same one.
+           @param watermark: Current LDAP high-water mark.
+           @return: True if an incremental sync is possible.
+        """
+        return (self.watermark.get("type") == watermark.get("type")
+                and self.watermark.get("server") == watermark.get("server"))
+
+    def add(self, entity):
+        """Records the current state of a LDAP user/group.
+           @param entity: LDAPApiWrapper.User/Group object.
+        """
+        if entity.type == EntityType.USER:
+            self.users[entity.dn] = [entity.name, entity.display_name,
+                                     entity.email]
+        elif entity.type == EntityType.GROUP:
+            self.groups[entity.dn] = [entity.name, entity.display_name,
+                                      list(entity.members)]
+
+    def differs(self, entity):
+        """Tells if a LDAP user/group differs from its recorded state.
+           @param entity: LDAPApiWrapper.User/Group object.
+           @return: True if the entity is new or changed.
+        """
+        if entity.type == EntityType.USER:
+            return self.users.get(entity.dn) != [
+                entity.name, entity.display_name, entity.email]
+        recorded = self.groups.get(entity.dn)
+        return (recorded is None
+                or recorded[:2] != [entity.name, entity.display_name]
+                or set(recorded[2]) != set(entity.members))
+
+    def entities(self):
+        """@return: Generator of LDAPApiWrapper.User/Group objects of the
+           recorded state.
+        """
+        for dn, (name, display_name, email) in self.users.items():
+            yield ldapApi.LDAPApiWrapper.User(dn, name, display_name, email)
+        for dn, (name, display_name, members) in self.groups.items():
+            yield ldapApi.LDAPApiWrapper.Group(dn, name, display_name,
+                                               list(members))
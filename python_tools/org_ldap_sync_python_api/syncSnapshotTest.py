@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Unit tests for syncSnapshot.py, and for the OpenLDAP high-water mark read
+from an in-memory LDAP server (ldap3 MOCK_SYNC).
+
+Example command:
+
+>>> python syncSnapshotTest.py
+"""
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+import ldap3
+
+from globalClasses import Constants
+from ldapApi import LDAPApiWrapper
+from ldapApiBenchmark import (
+    MOCK_BASEDN, MOCK_HOSTPORT, MOCK_PASSWORD, MOCK_USERNAME, MockADServer,
+    MockLDAPApiWrapper)
+from syncSnapshot import SyncSnapshot
+
+CONFIG = {"basedn": "dc=example,dc=com", "user_identifier": "uid"}
+USN_MARK = {"type": "uSNChanged", "value": 100, "server": "dc1"}
+
+User = LDAPApiWrapper.User
+Group = LDAPApiWrapper.Group
+
+
+class TestSyncSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.file_name = os.path.join(work_dir.name, "snapshot.json")
+        self.snapshot = SyncSnapshot(CONFIG, USN_MARK)
+        self.snapshot.add(User("cn=a", "a", "A", "a@example.com"))
+        self.snapshot.add(Group("cn=g", "g", "G", ["cn=a", "cn=b"]))
+
+    def test_differs(self):
+        """Tests new and changed entities differ from the snapshot, while the
+           order of the members of a group does not matter.
+        """
+        self.assertFalse(self.snapshot.differs(
+            User("cn=a", "a", "A", "a@example.com")))
+        self.assertTrue(self.snapshot.differs(
+            User("cn=a", "a", "A", "changed@example.com")))
+        self.assertTrue(self.snapshot.differs(User("cn=b", "b", "B")))
+        self.assertFalse(self.snapshot.differs(
+            Group("cn=g", "g", "G", ["cn=b", "cn=a"])))
+        self.assertTrue(self.snapshot.differs(
+            Group("cn=g", "g", "Changed", ["cn=a", "cn=b"])))
+        self.assertTrue(self.snapshot.differs(
+            Group("cn=g", "g", "G", ["cn=a"])))
+        self.assertTrue(self.snapshot.differs(Group("cn=h", "h", "H", [])))
+
+    def test_is_continuation_of(self):
+        """Tests changes are only searched for with a mark of the same type
+           from the same server.
+        """
+        self.assertTrue(self.snapshot.is_continuation_of(
+            {"type": "uSNChanged", "value": 200, "server": "dc1"}))
+        self.assertFalse(self.snapshot.is_continuation_of(
+            {"type": "uSNChanged", "value": 200, "server": "dc2"}))
+        self.assertFalse(self.snapshot.is_continuation_of(
+            {"type": "modifyTimestamp", "value": "20240101000000Z",
+             "server": None}))
+
+    def test_save_load(self):
+        """Tests a saved snapshot loads with the same state and entities."""
+        self.snapshot.save(self.file_name)
+        self.assertFalse(os.path.exists(self.file_name + ".tmp"))
+        snapshot = SyncSnapshot.load(self.file_name, dict(CONFIG))
+        self.assertEqual(snapshot.watermark, USN_MARK)
+        self.assertEqual(snapshot.users, self.snapshot.users)
+        self.assertEqual(snapshot.groups, self.snapshot.groups)
+        entities = {entity.dn: entity for entity in snapshot.entities()}
+        self.assertEqual(entities["cn=a"].email, "a@example.com")
+        self.assertEqual(list(entities["cn=g"].members), ["cn=a", "cn=b"])
+        for entity in entities.values():
+            self.assertFalse(snapshot.differs(entity))
+
+    def test_load_unusable(self):
+        """Tests no snapshot is loaded when missing, unreadable, of another
+           version, or taken with other settings.
+        """
+        self.assertIsNone(SyncSnapshot.load(self.file_name, CONFIG))
+        self.snapshot.save(self.file_name)
+        self.assertIsNone(SyncSnapshot.load(
+            self.file_name, dict(CONFIG, basedn="dc=other,dc=com")))
+
+        with open(self.file_name) as snapshot_file:
+            data = json.load(snapshot_file)
+        data["version"] = SyncSnapshot.VERSION + 1
+        with open(self.file_name, "w") as snapshot_file:
+            json.dump(data, snapshot_file)
+        self.assertIsNone(SyncSnapshot.load(self.file_name, CONFIG))
+
+        with open(self.file_name, "w") as snapshot_file:
+            snapshot_file.write("{")
+        self.assertIsNone(SyncSnapshot.load(self.file_name, CONFIG))
+
+
+class MockOpenLDAPServer(MockADServer):
+    """MockADServer without the AD schema, so that it holds OpenLDAP
+       operational attributes, and with a root DSE listing naming contexts.
+    """
+
+    def __init__(self, naming_contexts):
+        """@param naming_contexts: Naming contexts of the root DSE."""
+        super().__init__({})
+        self.server = ldap3.Server("mock")
+        self.naming_contexts = naming_contexts
+        self.add_entry(MOCK_USERNAME,
+                       {"userPassword": MOCK_PASSWORD, "sn": "admin"})
+
+    def search(self, conn, conn_search, search_base, *args, **kwargs):
+        """Search of a connection with the root DSE served."""
+        if search_base == "":
+            conn.response = [{"type": "searchResEntry", "dn": "",
+                              "attributes": {
+                                  "namingContexts": self.naming_contexts}}]
+            return True
+        return super().search(conn, conn_search, search_base, *args,
+                              **kwargs)
+
+
+class TestOpenLDAPWatermark(unittest.TestCase):
+
+    def login(self, mock_server, context_csn=None):
+        """Adds entries under MOCK_BASEDN and logs in to the server.
+           @param mock_server: MockOpenLDAPServer to connect to.
+           @param context_csn: contextCSN values of MOCK_BASEDN, if any.
+           @return: LDAPApiWrapper logged in to the mock server.
+        """
+        base_attrs = {"objectClass": ["organizationalUnit"],
+                      "modifyTimestamp": "20240101000000Z"}
+        if context_csn:
+            base_attrs["contextCSN"] = context_csn
+        mock_server.add_entry(MOCK_BASEDN, base_attrs)
+        mock_server.add_entry("cn=a," + MOCK_BASEDN, {
+            "objectClass": ["inetOrgPerson"], "cn": "a",
+            "modifyTimestamp": "20240301101010.5Z"})
+        mock_server.add_entry("cn=b," + MOCK_BASEDN, {
+            "objectClass": ["inetOrgPerson"], "cn": "b",
+            "modifyTimestamp": "20240201000000Z"})
+        ldap_handle = MockLDAPApiWrapper(mock_server)
+        result = ldap_handle.login(MOCK_HOSTPORT, MOCK_USERNAME,
+                                   MOCK_PASSWORD)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        return ldap_handle
+
+    def watermark(self, ldap_handle, since=None):
+        result = ldap_handle.get_watermark(
+            MOCK_BASEDN, LDAPApiWrapper.OPEN_LDAP, since=since)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        self.assertEqual(result.data["type"],
+                         LDAPApiWrapper.ATTR_MODIFY_TIMESTAMP)
+        return result.data["value"]
+
+    def test_context_csn(self):
+        """Tests the mark is the latest contextCSN of the naming context
+           holding the base DN.
+        """
+        mock_server = MockOpenLDAPServer(["dc=other,dc=com",
+                                          MOCK_BASEDN.upper()])
+        ldap_handle = self.login(mock_server, context_csn=[
+            "20240401010101.123456Z#000000#000#000000",
+            "20240402010101.123456Z#000000#001#000000"])
+        self.assertEqual(self.watermark(ldap_handle), "20240402010101Z")
+
+    def test_latest_modify_timestamp(self):
+        """Tests the mark is the latest modifyTimestamp under the base DN
+           without contextCSN, searched from the previous mark on if any.
+        """
+        ldap_handle = self.login(MockOpenLDAPServer([]))
+        self.assertEqual(self.watermark(ldap_handle), "20240301101010Z")
+        since = {"type": LDAPApiWrapper.ATTR_MODIFY_TIMESTAMP,
+                 "value": "20240215000000Z", "server": None}
+        self.assertEqual(self.watermark(ldap_handle, since), "20240301101010Z")
+        since["value"] = "20250101000000Z"
+        self.assertEqual(self.watermark(ldap_handle, since), "20250101000000Z")
+        # A mark of another type is not a starting point.
+        self.assertEqual(self.watermark(ldap_handle, USN_MARK),
+                         "20240301101010Z")
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    unittest.main()
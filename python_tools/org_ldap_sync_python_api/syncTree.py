@@ -1,11 +1,18 @@
+import asyncio
 import datetime
 import logging
 import time
 from collections import defaultdict
 
+import asyncTsApi
 import ldapApi
+import syncJournal
+import syncProfiler
+import syncReport
+import syncSnapshot
 import tsApi
-from entityClasses import EntityType
+from entityClasses import (EntityType, MembershipGraph, PrincipalIndex,
+                           intern_str)
 from globalClasses import Constants
 
 # pylint: disable= R0902, R0912, R0915, W0108
@@ -15,6 +22,10 @@ class SyncTree():
     """
 
     NORSN = "Reason not given."
+    DEFAULT_SNAPSHOT_FILE = "ldap_sync_snapshot.json"
+    DEFAULT_JOURNAL_FILE = "ldap_sync_journal.jsonl"
+    # Whether update_thoughtspot checkpoints its progress in the journal.
+    JOURNALED = True
 
     def __init__(self, user_args):
         """@param arguments: Arguments provided by user."""
@@ -28,12 +39,21 @@ class SyncTree():
         error_file_name = (
                 "error_log_report" + timestamp.strftime("%Y_%m_%d_%H_%M") + ".txt"
         )
+        profile_file_name = (
+                "sync_profile_" + timestamp.strftime("%Y_%m_%d_%H_%M") + ".json"
+        )
         if self.dry_run:
             file_name = ("dry_run_" + file_name)
             error_file_name = ("dry_run_" + error_file_name)
-
-        self.error_file = open(error_file_name, "w")
-        self.file_handle = open(file_name, "w")
+            profile_file_name = ("dry_run_" + profile_file_name)
+        self.profile_file_name = profile_file_name
+        self.profiler = syncProfiler.SyncProfiler()
+
+        report_format = (user_args["report_format"]
+                         or syncReport.ReportWriter.TEXT)
+        self.error_file = syncReport.ReportWriter(error_file_name,
+                                                  report_format)
+        self.file_handle = syncReport.ReportWriter(file_name, report_format)
         self.file_handle.write(
             "============================================\n"
         )
@@ -53,8 +73,14 @@ class SyncTree():
         )
 
         # LDAP Login.
+        self.profiler.start_phase("ldap_login")
         logging.info("Attempting login to LDAP system")
-        self.ldap_handle = ldapApi.LDAPApiWrapper()
+        ldap_page_size = user_args["ldap_page_size"]
+        self.ldap_pool_size = int(user_args["ldap_pool_size"] or 1)
+        self.ldap_handle = self.new_ldap_handle(
+            int(user_args["ldap_cache_size"] or 0),
+            int(ldap_page_size) if ldap_page_size else None,
+            self.ldap_pool_size)
         result = self.ldap_handle.login(
             user_args["ldap_hostport"],
             user_args["ldap_uname"],
@@ -72,8 +98,14 @@ class SyncTree():
         logging.info("Successfully logged in to LDAP system.\n")
 
         # ThoughtSpot Login.
+        self.profiler.start_phase("ts_login")
         logging.info("Attempting login to ThoughtSpot system.")
-        self.ts_handle = tsApi.TSApiWrapper(user_args["disable_ssl"])
+        self.ts_handle = tsApi.TSApiWrapper(
+            user_args["disable_ssl"],
+            int(user_args["ts_batchsize"] or 0),
+            int(user_args["ts_page_concurrency"] or 0)
+        )
+        self.profiler.instrument_ts(self.ts_handle)
         result = self.ts_handle.login(
             user_args["ts_hostport"],
             user_args["ts_uname"],
@@ -136,21 +168,279 @@ class SyncTree():
         self.keep_local_membership = user_args["keep_local_membership"]
         self.upsert_group = user_args["upsert_group"]
         self.upsert_user = user_args["upsert_user"]
+        self.ts_max_in_flight = int(user_args["ts_max_in_flight"] or 1)
+        self.incremental = user_args["incremental"]
+        self.full_reconcile = user_args["full_reconcile"]
+        self.snapshot_file = (user_args["snapshot_file"]
+                              or SyncTree.DEFAULT_SNAPSHOT_FILE)
+        self.resume = user_args["resume"]
+        self.journal_file = (user_args["journal_file"]
+                             or SyncTree.DEFAULT_JOURNAL_FILE)
         self.users_to_create = set()
         self.groups_to_create = set()
-        self.relationship = set()
+        self.relationship = MembershipGraph()
+
+        # Only runs started with resume keep a journal, so that they can be
+        # resumed if interrupted.
+        journaled = (self.JOURNALED and self.resume and not self.dry_run
+                     and not self.incremental)
+        self.journal = syncJournal.SyncJournal.open(
+            self.journal_file if journaled else None,
+            self.snapshot_config(), self.resume)
+
+        self.profiler.start_phase("ldap_walk")
+        if self.incremental and not self.dry_run:
+            self.sync_incrementally()
+        else:
+            # Create flat list of users and groups to create along with their
+            # relationships.
+            if not self.resume_nodes():
+                self.sync_nodes()
+                self.journal_nodes()
+
+            # Update the fetched users, groups and their relationships to
+            # ThoughtSpot.
+            if self.dry_run:
+                self.profiler.start_phase("dry_run")
+                self.dryRun()
+            else:
+                self.update_thoughtspot()
+        self.journal.close(completed=True)
+
+        cache_stats = self.ldap_handle.entry_cache.stats()
+        logging.info("LDAP entry cache: %d hits, %d misses, %d entries.",
+                     cache_stats["hits"], cache_stats["misses"],
+                     cache_stats["size"])
+        self.write_profile()
+
+
+    def new_ldap_handle(self, cache_size, page_size, pool_size):
+        """Creates the handle to fetch entities from LDAP system with.
+           @param cache_size: Maximum number of entries to cache.
+           @param page_size: Page size for the LDAP searches.
+           @param pool_size: Number of connections per domain.
+           @return: LDAPApiWrapper object, not logged in yet.
+        """
+        return ldapApi.LDAPApiWrapper(cache_size, page_size, pool_size)
 
-        # Create flat list of users and groups to create along with their
-        # relationships.
-        self.sync_nodes()
+    def ts_handles(self):
+        """@return: List of the TSApiWrapper sessions used by the sync."""
+        return [self.ts_handle]
 
-        # Update the fetched users, groups and their relationships to
-        # ThoughtSpot.
-        if self.dry_run:
-            self.dryRun()
-        else:
+    def write_profile(self):
+        """Writes the timing and request statistics of the run next to the
+           sync report.
+        """
+        cache_stats = self.ldap_handle.entry_cache.stats()
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        cache_stats["hit_rate"] = (round(cache_stats["hits"] / lookups, 4)
+                                   if lookups else None)
+        self.profiler.add_stats("ldap", self.ldap_handle.usage_stats())
+        self.profiler.add_stats("ldap_entry_cache", cache_stats)
+        membership_stats = defaultdict(int)
+        for ts_handle in self.ts_handles():
+            for key, value in ts_handle.membership_stats.items():
+                membership_stats[key] += value
+        self.profiler.add_stats("ts_memberships", dict(membership_stats))
+        try:
+            self.profiler.write(self.profile_file_name)
+        except OSError as e:
+            logging.error("Failed to write sync profile %s. %s",
+                          self.profile_file_name, e)
+
+    def ldap_entry_config(self):
+        """@return: Tuple of the identifiers LDAP objects are built with, in
+           the order of the LDAPApiWrapper.dn_to_obj arguments.
+        """
+        return (self.ldap_type, self.user_identifier, self.email_identifier,
+                self.user_display_name_identifier,
+                self.group_display_name_identifier,
+                self.authdomain_identifier, self.member_str)
+
+    def snapshot_config(self):
+        """@return: Dictionary of the settings a snapshot is valid for."""
+        return {
+            "basedn": self.basedn,
+            "scope": self.scope,
+            "filter_str": self.filter_str,
+            "ldap_type": self.ldap_type,
+            "user_identifier": self.user_identifier,
+            "authdomain_identifier": self.authdomain_identifier,
+            "email_identifier": self.email_identifier,
+            "user_display_name_identifier": self.user_display_name_identifier,
+            "group_display_name_identifier":
+                self.group_display_name_identifier,
+            "member_str": self.member_str,
+            "include_nontree_members": self.include_nontree_members
+        }
+
+    def journal_nodes(self):
+        """Records the flat lists of users and groups to create, their
+           relationships and LDAP entries in the journal, so that a resumed
+           run does not need to walk the LDAP tree again.
+        """
+        if self.journal.file_name is None:
+            return
+        entries = syncSnapshot.SyncSnapshot(None, None)
+        for dn in self.users_to_create | self.groups_to_create:
+            result = self.ldap_handle.dn_to_obj(dn, *self.ldap_entry_config())
+            if (result.status == Constants.OPERATION_SUCCESS
+                    and result.data is not None):
+                entries.add(result.data)
+        self.journal.record_nodes({
+            "users_to_create": list(self.users_to_create),
+            "groups_to_create": list(self.groups_to_create),
+            "relationship": [list(pair) for pair in self.relationship],
+            "users": entries.users,
+            "groups": entries.groups
+        })
+
+    def resume_nodes(self):
+        """Restores the flat lists of users and groups to create along with
+           their relationships from the journal of an interrupted run.
+           @return: True if restored.
+        """
+        nodes = self.journal.nodes
+        if not self.journal.resumed or nodes is None:
+            return False
+        entries = syncSnapshot.SyncSnapshot(None, None)
+        entries.users = nodes["users"]
+        entries.groups = nodes["groups"]
+        self.ldap_handle.cache_entries(entries.entities(),
+                                       self.ldap_entry_config())
+        self.users_to_create = set(nodes["users_to_create"])
+        self.groups_to_create = set(nodes["groups_to_create"])
+        self.relationship = MembershipGraph(
+            tuple(pair) for pair in nodes["relationship"])
+        logging.info("Restored %d users and %d groups from the journal.",
+                     len(self.users_to_create), len(self.groups_to_create))
+        return True
+
+    def sync_incrementally(self):
+        """Syncs only the LDAP entries changed since the last incremental
+           sync, based on the snapshot it saved. A full sync is run instead,
+           and the snapshot rebuilt, if there is no usable snapshot or
+           full_reconcile is set.
+        """
+        config = self.snapshot_config()
+        snapshot = None
+        if not self.full_reconcile:
+            snapshot = syncSnapshot.SyncSnapshot.load(self.snapshot_file,
+                                                      config)
+
+        # The mark is read before searching so that changes made during the
+        # sync are picked up by the next one.
+        result = self.ldap_handle.get_watermark(
+            self.basedn, self.ldap_type,
+            since=snapshot.watermark if snapshot is not None else None)
+        if result.status != Constants.OPERATION_SUCCESS:
+            logging.error("Failed to read the LDAP high-water mark. Running "
+                          "a full sync without saving a snapshot.")
+            self.sync_nodes()
             self.update_thoughtspot()
-
+            return
+        watermark = result.data
+
+        if snapshot is not None and not snapshot.is_continuation_of(watermark):
+            logging.info("LDAP server differs from the one of the snapshot.")
+            snapshot = None
+        if snapshot is None:
+            logging.info("Running a full sync to build the snapshot.")
+            self.sync_nodes()
+            self.update_thoughtspot()
+            if not (self.users_to_create or self.groups_to_create):
+                # Nothing to take a snapshot of, e.g. LDAP search failed.
+                return
+            snapshot = syncSnapshot.SyncSnapshot(config, watermark)
+        else:
+            if not self.sync_changes(snapshot):
+                return
+            snapshot.watermark = watermark
+
+        self.profiler.start_phase("snapshot")
+        for dn in self.users_to_create | self.groups_to_create:
+            result = self.ldap_handle.dn_to_obj(dn, *self.ldap_entry_config())
+            if (result.status == Constants.OPERATION_SUCCESS
+                    and result.data is not None):
+                snapshot.add(result.data)
+        snapshot.save(self.snapshot_file)
+
+    def sync_changes(self, snapshot):
+        """Syncs the LDAP users and groups changed since the snapshot was
+           taken. Changed groups get their membership replaced, hence their
+           members are synced too, resolved from the snapshot rather than
+           LDAP if unchanged. Entries deleted from LDAP are not seen, so purge
+           only happens on full syncs.
+           @param snapshot: SyncSnapshot saved by the last sync.
+           @return: True if the changes were fetched and synced.
+        """
+        logging.info("Fetching LDAP entries changed since the last sync.")
+        self.ldap_handle.cache_entries(snapshot.entities(),
+                                       self.ldap_entry_config())
+        result = self.ldap_handle.harvest_subtree(
+            self.basedn,
+            self.ldap_type,
+            self.user_identifier,
+            self.email_identifier,
+            self.user_display_name_identifier,
+            self.group_display_name_identifier,
+            self.scope,
+            self.filter_str,
+            self.authdomain_identifier,
+            self.member_str,
+            changed_since=snapshot.watermark
+        )
+        if result.status != Constants.OPERATION_SUCCESS:
+            msg = "Failed to retrieve changed user/group list.\n"
+            self.file_handle.write(msg)
+            self.file_handle.close()
+            logging.error(msg)
+            return False
+
+        # AD also bumps the USN for changes not synced, e.g. logon times.
+        changed = [entity for entity in result.data
+                   if snapshot.differs(entity)]
+        logging.info("%d LDAP entries changed since the last sync, %d of "
+                     "them differ from the snapshot.", len(result.data),
+                     len(changed))
+
+        for entity in changed:
+            if entity.type == EntityType.USER:
+                self.add_user_to_create(entity.dn)
+        self.add_groups_to_create([entity.dn for entity in changed
+                                   if entity.type == EntityType.GROUP])
+        for (child, _) in list(self.relationship):
+            if child in snapshot.users:
+                self.users_to_create.add(child)
+            elif child in snapshot.groups:
+                self.groups_to_create.add(child)
+
+        if self.purge or self.purge_users or self.purge_groups:
+            logging.info("Purge is skipped by incremental syncs, run with "
+                         "full_reconcile to purge.")
+            self.purge = self.purge_users = self.purge_groups = False
+        self.update_thoughtspot()
+        return True
+
+    def sync_ts_users(self, users, all_org_scope=False):
+        """Sync a batch of users to ThoughtSpot, making the create/update
+           calls in parallel if ts_max_in_flight allows for it.
+           @param users: List of desired user states, see
+           TSApiWrapper.sync_users.
+           @param all_org_scope: if the sync call is in all org scope.
+           @return: Result object with operation status and data. Here data is
+           a dictionary of user name to the Result object of its sync.
+        """
+        if self.ts_max_in_flight <= 1:
+            return self.ts_handle.sync_users(users, self.upsert_user,
+                                             all_org_scope)
+        async_handle = asyncTsApi.AsyncTSApiWrapper(self.ts_handle,
+                                                    self.ts_max_in_flight)
+        try:
+            return asyncio.run(async_handle.sync_users(
+                users, self.upsert_user, all_org_scope))
+        finally:
+            async_handle.close()
 
     def add_user_to_create(self, user_dn):
         """Add user with distinguished name to user creation list.
@@ -165,85 +455,132 @@ class SyncTree():
         """Add group with distinguished name to group creation list.
            @param group_dn: Group's distinguished name.
         """
+        self.add_groups_to_create([group_dn])
+
+    def add_groups_to_create(self, group_dns):
+        """Add groups with distinguished names to group creation list along
+           with the relationships to their members. With non-tree members
+           included, the groups nested in them are added too.
+           Groups are walked breadth first in waves: the members of a wave
+           not in the LDAP entry cache yet are fetched in bulk with
+           dns_to_objs, and the member groups not added yet make up the next
+           wave. Hence the number of searches grows with the nesting depth
+           rather than the number of members, deep nesting needs no recursion
+           and cyclic memberships end the walk.
+           @param group_dns: Groups' distinguished names.
+        """
+        config = (self.ldap_type,
+                  self.user_identifier,
+                  self.email_identifier,
+                  self.user_display_name_identifier,
+                  self.group_display_name_identifier,
+                  self.authdomain_identifier,
+                  self.member_str)
+        wave = []
+        for group_dn in dict.fromkeys(group_dns):
+            if group_dn in self.groups_to_create:
+                logging.debug(
+                    "Group already exists in the creation list. Group DN: %s",
+                    group_dn
+                )
+                continue
+            wave.append(group_dn)
+
+        depth = 0
+        while wave:
+            depth += 1
+            self.groups_to_create.update(wave)
+            logging.debug("Adding %d groups at depth %d.", len(wave), depth)
+            groups = self.ldap_handle.dns_to_objs(wave, *config).data
+            member_dns = [member_dn
+                          for group_dn in wave if groups.get(group_dn)
+                          for member_dn in groups[group_dn].members]
+            members = self.ldap_handle.dns_to_objs(member_dns, *config).data
+
+            next_wave = {}
+            for group_dn in wave:
+                group = groups.get(group_dn)
+                if group is None:
+                    logging.debug(
+                        "Failed to obtain group object for group DN (%s)",
+                        group_dn
+                    )
+                    continue
+                if not group.members:
+                    logging.debug("Empty group (%s).\n", group_dn)
+                    self.relationship.add((None, group_dn))
+                    continue
 
-        if group_dn in self.groups_to_create:
-            logging.debug(
-                "Group already exists in the creation list. Group DN: %s",
-                group_dn
-            )
-            return
-
-        self.groups_to_create.add(group_dn)
-        logging.debug(
-            "Group added to the creation list. Group DN: %s",
-            group_dn
-        )
-
-        result = self.ldap_handle.dn_to_obj(
-            group_dn,
-            self.ldap_type,
-            self.user_identifier,
-            self.email_identifier,
-            self.user_display_name_identifier,
-            self.group_display_name_identifier,
-            self.authdomain_identifier,
-            self.member_str,
-            log_entities=True)
-        if result.status != Constants.OPERATION_SUCCESS or result.data is None:
-            logging.debug(
-                "Failed to obtain group object for group DN (%s)", group_dn
-            )
-            return
-        group = result.data
-
-        if not group.members:
-            logging.debug("Empty group (%s).\n", group_dn)
-            self.relationship.add((None, group_dn))
-        else:
-            logging.debug("Adding members of the group (%s).", group_dn)
-            for member_dn in group.members:
-                my_type = self.ldap_handle.isOfType(
-                    member_dn,
-                    self.ldap_type,
-                    self.user_identifier,
-                    self.email_identifier,
-                    self.user_display_name_identifier,
-                    self.group_display_name_identifier,
-                    self.member_str,
-                    self.authdomain_identifier).data
-
-                if my_type == EntityType.USER:
+                logging.debug("Adding members of the group (%s).", group_dn)
+                for member_dn in group.members:
+                    member = members.get(member_dn)
+                    if member is None:
+                        continue
                     logging.debug(
-                        "Adding relationship User(%s) to Group(%s)",
-                        member_dn,
-                        group_dn,
+                        "Adding relationship %s(%s) to Group(%s)",
+                        member.type, member_dn, group_dn,
                     )
                     self.relationship.add((member_dn, group_dn))
-                    if self.include_nontree_members:
+                    if not self.include_nontree_members:
+                        continue
+                    if member.type == EntityType.USER:
                         logging.debug(
                             "Including non-tree member user (%s)", member_dn
                         )
                         self.add_user_to_create(member_dn)
-                elif my_type == EntityType.GROUP:
-                    logging.debug(
-                        "Adding relationship Group(%s) to Group(%s)",
-                        member_dn,
-                        group_dn,
-                    )
-                    self.relationship.add((member_dn, group_dn))
-                    if self.include_nontree_members:
+                    elif (member.type == EntityType.GROUP
+                          and member_dn not in self.groups_to_create):
                         logging.debug(
                             "Including non-tree member group (%s)", member_dn
                         )
-                        self.add_group_to_create(member_dn)
-                else:
-                    continue
+                        next_wave[member_dn] = None
+            wave = list(next_wave)
+
+    def prefetch_members(self, entities):
+        """Resolves the members of the given groups which are outside of the
+           harvested tree in bulk, so that walking the groups afterwards
+           finds them in the LDAP entry cache. Members of the member groups
+           are resolved in further rounds if non-tree members are included.
+           @param entities: User/Group objects harvested from LDAP system.
+        """
+        groups = [entity for entity in entities
+                  if entity.type == EntityType.GROUP]
+        seen = set(entity.dn for entity in entities)
+        while groups:
+            member_dns = [member_dn for group in groups
+                          for member_dn in group.members
+                          if member_dn not in seen]
+            seen.update(member_dns)
+            result = self.ldap_handle.prefetch_dns(
+                member_dns,
+                self.ldap_type,
+                self.user_identifier,
+                self.email_identifier,
+                self.user_display_name_identifier,
+                self.group_display_name_identifier,
+                self.authdomain_identifier,
+                self.member_str)
+            logging.debug("Prefetched %d non-tree members.", len(result.data))
+            if not self.include_nontree_members:
+                break
+            groups = [entity for entity in result.data.values()
+                      if entity is not None
+                      and entity.type == EntityType.GROUP]
 
     def sync_nodes(self):
         """Synchronize the nodes between LDAP and TS System."""
         logging.info("Creating flat list of users and groups for syncing.")
-        result = self.ldap_handle.list_member_dns(
-            self.basedn, self.scope, self.filter_str
+        result = self.ldap_handle.harvest_subtree(
+            self.basedn,
+            self.ldap_type,
+            self.user_identifier,
+            self.email_identifier,
+            self.user_display_name_identifier,
+            self.group_display_name_identifier,
+            self.scope,
+            self.filter_str,
+            self.authdomain_identifier,
+            self.member_str
         )
 
         if result.status != Constants.OPERATION_SUCCESS or result.data is None:
@@ -259,7 +596,12 @@ class SyncTree():
             logging.debug(msg)
             return
 
-        for member_dn in result.data:
+        # Entities come classified from the harvest, hence no isOfType call
+        # is needed for them. Groups are added together once all are known,
+        # so that their members are fetched in bulk.
+        group_dns = []
+        for member in result.data:
+            member_dn = member.dn
 
             if (member_dn in self.groups_to_create) \
                     or (member_dn in self.users_to_create):
@@ -268,41 +610,34 @@ class SyncTree():
                     member_dn
                 )
                 continue
-            my_type = self.ldap_handle.isOfType(
-                member_dn,
-                self.ldap_type,
-                self.user_identifier,
-                self.email_identifier,
-                self.user_display_name_identifier,
-                self.group_display_name_identifier,
-                self.member_str,
-                self.authdomain_identifier).data
+            my_type = member.type
             logging.debug("member_dn entity type (%s) (%s)", my_type, member_dn)
             if my_type == EntityType.USER:
                 self.add_user_to_create(member_dn)
             elif my_type == EntityType.GROUP:
-                self.add_group_to_create(member_dn)
+                group_dns.append(member_dn)
             else:
                 logging.debug("Unknown entity type (%s)", my_type)
                 continue
+        self.add_groups_to_create(group_dns)
         logging.info("Successfully created flat list of users and groups.\n")
 
     def update_thoughtspot(self):
         """Update users and groups to ThoughtSpot."""
 
-        # Maps to maintain.
-        dn_to_obj_ldap_map = defaultdict(lambda: None)
-        name_to_id_ts_map = defaultdict(lambda: None)
-        id_to_name_ts_map = defaultdict(lambda: None)
-
-        ldap_user_names, ldap_group_names = [], []
-        ts_user_names, ts_group_names = [], []
+        # LDAP objects of the principals to sync and their lower cased names.
+        # Principals in ThoughtSpot system are looked up in the principal
+        # indexes of the TS session, which are case insensitive.
+        dn_to_obj_ldap_map = {}
+        ldap_user_names, ldap_group_names = set(), set()
 
         self.file_handle.write("\n===== Addition Phase =====\n\n")
 
         # Create/Sync all users to ThoughtSpot system.
+        self.profiler.start_phase("sync_users")
         users_created, users_synced = 0, 0
         logging.info("Syncing users to ThoughtSpot system.")
+        ldap_users = []
         for userdn in self.users_to_create:
             result = self.ldap_handle.dn_to_obj(
                 userdn,
@@ -322,17 +657,36 @@ class SyncTree():
                 continue
             user = result.data
             dn_to_obj_ldap_map[user.dn] = user
-            ldap_user_names.append(user.name)
-
-            result = self.ts_handle.sync_user(
-                user.name,
-                user.display_name,
-                tsApi.TSApiWrapper.LDAP_USER,
-                None,  # password
-                user.email,
-                None,  # groups
-                self.upsert_user
+            ldap_user_names.add(intern_str(user.name.lower()))
+            ldap_users.append(user)
+
+        # Users are synced as one batch so that only users which differ from
+        # ThoughtSpot system result in create/update calls.
+        user_results = {}
+        pending_users = [user for user in ldap_users
+                         if not self.journal.is_done("user", user.name)]
+        if pending_users:
+            result = self.sync_ts_users(
+                [{"name": user.name,
+                  "display_name": user.display_name,
+                  "usertype": tsApi.TSApiWrapper.LDAP_USER,
+                  "email": user.email} for user in pending_users]
             )
+            if result.status == Constants.OPERATION_SUCCESS:
+                user_results = result.data
+            else:
+                user_results = {user.name: result for user in pending_users}
+        self.journal.mark_done("user", [
+            name for name, result in user_results.items()
+            if result.status in (Constants.OPERATION_SUCCESS,
+                                 Constants.USER_ALREADY_EXISTS)])
+        for user in ldap_users:
+            if user.name not in user_results:
+                msg = "User synced before resume: {}\n".format(user.name)
+                users_synced += 1
+                self.file_handle.write(msg)
+                continue
+            result = user_results[user.name]
             if result.status == Constants.OPERATION_SUCCESS:
                 msg = "User created: {}\n".format(user.name)
                 users_created += 1
@@ -356,6 +710,7 @@ class SyncTree():
             logging.debug("Users synced [%d]\n", users_synced)
 
         # Create/Sync all groups to ThoughtSpot system.
+        self.profiler.start_phase("sync_groups")
         groups_created, groups_synced = 0, 0
         logging.info("Syncing groups to ThoughtSpot system.")
         for groupdn in self.groups_to_create:
@@ -376,8 +731,13 @@ class SyncTree():
                 continue
             group = result.data
             dn_to_obj_ldap_map[group.dn] = group
-            ldap_group_names.append(group.name)
+            ldap_group_names.add(intern_str(group.name.lower()))
 
+            if self.journal.is_done("group", group.name):
+                msg = "Group synced before resume: {}\n".format(group.name)
+                groups_synced += 1
+                self.file_handle.write(msg)
+                continue
             result = self.ts_handle.sync_group(
                 group.name, group.display_name, tsApi.TSApiWrapper.LDAP_GROUP,
                 None,  # description
@@ -387,9 +747,11 @@ class SyncTree():
             if result.status == Constants.OPERATION_SUCCESS:
                 msg = "Group created: {}\n".format(group.name)
                 groups_created += 1
+                self.journal.mark_done("group", [group.name])
             elif result.status == Constants.GROUP_ALREADY_EXISTS:
                 msg = "Group exists: {}\n".format(group.name)
                 groups_synced += 1
+                self.journal.mark_done("group", [group.name])
             else:
                 reason = (
                     str(result.data)
@@ -406,113 +768,76 @@ class SyncTree():
             logging.debug("Groups created [%d]", groups_created)
             logging.debug("Groups synced [%d]\n", groups_synced)
 
+        self.profiler.start_phase("list_ts_principals")
         domain_name = self.ldap_handle.fetch_domain_name_from_dn(self.basedn)
 
         # Fetch user info from ThoughtSpot system.
         logging.debug("Fetching current users from ThoughtSpot system in "
                       "domain (%s) including recently created.", domain_name)
-        result = self.ts_handle.list_users(allOrgs=False)
-        if result.status == Constants.OPERATION_SUCCESS:
-            for user in result.data:
-                name_to_id_ts_map[user.name] = user.id
-                id_to_name_ts_map[user.id] = user.name
-                if user.name.endswith(domain_name):
-                    ts_user_names.append(user.name)
-            if not ts_user_names:
-                logging.debug(
-                    "No users fetched from domain (%s).\n", domain_name
-                )
-            else:
-                logging.debug(
-                    "Users fetched [%s]: \n%s\n",
-                    len(ts_user_names),
-                    ",\n".join(ts_user_names),
-                )
-        else:
-            logging.error("Failed to fetch users from ThoughtSpot system.\n")
+        ts_users, ts_user_names = self.ts_principals(EntityType.USER,
+                                                     domain_name)
 
         # Fetch group info from ThoughtSpot system.
         logging.debug("Fetching current groups from ThoughtSpot system in "
                       "domain (%s) including recently created.", domain_name)
-        result = self.ts_handle.list_groups(allOrgs=False)
-        if result.status == Constants.OPERATION_SUCCESS:
-            for group in result.data:
-                name_to_id_ts_map[group.name] = group.id
-                id_to_name_ts_map[group.id] = group.name
-                if group.name.endswith(domain_name):
-                    ts_group_names.append(group.name)
-            if not ts_group_names:
-                logging.debug(
-                    "No groups fetched from domain (%s).\n", domain_name
-                )
-            else:
-                logging.debug(
-                    "Groups fetched [%s]: \n%s\n",
-                    len(ts_group_names),
-                    ",\n".join(ts_group_names),
-                )
-        else:
-            logging.error("Failed to fetch groups from ThoughtSpot system.\n")
+        ts_groups, ts_group_names = self.ts_principals(EntityType.GROUP,
+                                                       domain_name)
+        ts_indexes = {EntityType.USER: ts_users, EntityType.GROUP: ts_groups}
 
-        # Lowercase all the name keys before creating relationships to ensure
-        # casing doesn't come into picture during assignment of relations.
-        # 1. name_to_id_ts_map
-        # 2. ldap_user_names, ldap_group_names
-        # 3. ts_user_names, ts_group_names
-        name_to_id_ts_map = defaultdict(
-            lambda: None,
-            [(k.lower(), v) for k, v in name_to_id_ts_map.items()],
-        )
-        ldap_user_names = [x.lower() for x in ldap_user_names]
-        ldap_group_names = [x.lower() for x in ldap_group_names]
-        ts_user_names = [x.lower() for x in ts_user_names]
-        ts_group_names = [x.lower() for x in ts_group_names]
+        def ts_id(obj):
+            """@return: ID of the LDAP user/group object in TS system."""
+            entity = ts_indexes[obj.type].get_by_name(obj.name)
+            return entity.id if entity is not None else None
+
+        def ts_name(group_id):
+            """@return: Name of the group in TS system."""
+            group = ts_groups.get_by_id(group_id)
+            return group.name if group is not None else group_id
 
         # Create relationship map to populate membership.
-        parent_id_to_member_user_id_ts_map = defaultdict(lambda: set())
-        parent_id_to_member_group_id_ts_map = defaultdict(lambda: set())
+        parent_id_to_member_user_id_ts_map = {}
+        parent_id_to_member_group_id_ts_map = {}
         for (child, parent) in self.relationship:
-            if child is not None and parent is not None:
-                childObj = dn_to_obj_ldap_map[child]
-                parentObj = dn_to_obj_ldap_map[parent]
-                if childObj is not None and parentObj is not None:
-                    childId = name_to_id_ts_map[childObj.name.lower()]
-                    parentId = name_to_id_ts_map[parentObj.name.lower()]
-
-                    if not parent_id_to_member_user_id_ts_map[parentId]:
-                        parent_id_to_member_user_id_ts_map[parentId] = set()
-                    if not parent_id_to_member_group_id_ts_map[parentId]:
-                        parent_id_to_member_group_id_ts_map[parentId] = set()
-
-                    if childObj.type == EntityType.USER:
-                        parent_id_to_member_user_id_ts_map[parentId].add(
-                            childId
-                        )
-                    elif childObj.type == EntityType.GROUP:
-                        parent_id_to_member_group_id_ts_map[parentId].add(
-                            childId
-                        )
-            elif child is None and parent is not None:
-                parentObj = dn_to_obj_ldap_map[parent]
-                if parentObj is not None:
-                    parentId = name_to_id_ts_map[parentObj.name.lower()]
-                    parent_id_to_member_user_id_ts_map[parentId] = set()
-                    parent_id_to_member_group_id_ts_map[parentId] = set()
+            parentObj = dn_to_obj_ldap_map.get(parent)
+            if parentObj is None:
+                continue
+            if child is None:
+                parentId = ts_id(parentObj)
+                parent_id_to_member_user_id_ts_map[parentId] = set()
+                parent_id_to_member_group_id_ts_map[parentId] = set()
+                continue
+            childObj = dn_to_obj_ldap_map.get(child)
+            if childObj is None:
+                continue
+            parentId = ts_id(parentObj)
+            parent_id_to_member_user_id_ts_map.setdefault(parentId, set())
+            parent_id_to_member_group_id_ts_map.setdefault(parentId, set())
+            if childObj.type == EntityType.USER:
+                parent_id_to_member_user_id_ts_map[parentId].add(
+                    ts_id(childObj))
+            elif childObj.type == EntityType.GROUP:
+                parent_id_to_member_group_id_ts_map[parentId].add(
+                    ts_id(childObj))
 
         # Create member user relationship in ThoughtSpot system.
+        self.profiler.start_phase("member_users")
         failed_relationships = 0
         logging.info("Creating member user to group relationships.")
         if not parent_id_to_member_user_id_ts_map:
             logging.debug("No member user to group relationship to create.\n")
         else:
             for parent_id in list(parent_id_to_member_user_id_ts_map.keys()):
+                if self.journal.is_done("member_users", parent_id):
+                    continue
                 result = self.ts_handle.update_users_to_group(
                     list(parent_id_to_member_user_id_ts_map[parent_id]),
                     parent_id,
                     self.keep_local_membership
                 )
-                if result.status != Constants.OPERATION_SUCCESS:
-                    name = id_to_name_ts_map[parent_id]
+                if result.status == Constants.OPERATION_SUCCESS:
+                    self.journal.mark_done("member_users", [parent_id])
+                else:
+                    name = ts_name(parent_id)
                     reason = (
                         str(result.data)
                         if result.data is not None
@@ -533,19 +858,24 @@ class SyncTree():
                     " could not be created.\n")
 
         # Create member group relationship in ThoughtSpot system.
+        self.profiler.start_phase("member_groups")
         failed_relationships = 0
         logging.debug("Creating member group to group relationships.")
         if not parent_id_to_member_group_id_ts_map:
             logging.debug("No member group to group relationship to create.\n")
         else:
             for parent_id in list(parent_id_to_member_group_id_ts_map.keys()):
-                self.ts_handle.update_groups_to_group(
+                if self.journal.is_done("member_groups", parent_id):
+                    continue
+                result = self.ts_handle.update_groups_to_group(
                     list(parent_id_to_member_group_id_ts_map[parent_id]),
                     parent_id,
                     self.keep_local_membership
                 )
-                if result.status != Constants.OPERATION_SUCCESS:
-                    name = id_to_name_ts_map[parent_id]
+                if result.status == Constants.OPERATION_SUCCESS:
+                    self.journal.mark_done("member_groups", [parent_id])
+                else:
+                    name = ts_name(parent_id)
                     reason = (
                         str(result.data)
                         if result.data is not None
@@ -567,13 +897,16 @@ class SyncTree():
                     " could not be created.\n")
 
         # Delete others
+        self.profiler.start_phase("purge")
         if self.purge or self.purge_users:
             self.file_handle.write("\n===== User Deletion Phase =====\n\n")
             logging.info("Deleting users not in current sync path.")
-            users_to_delete = []
-            for user_name in set(ts_user_names) - set(ldap_user_names):
-                if name_to_id_ts_map[user_name]:
-                    users_to_delete.append(name_to_id_ts_map[user_name])
+            users_to_delete, user_names_to_delete = [], []
+            for user_name in set(ts_user_names) - ldap_user_names:
+                user = ts_users.get_by_name(user_name)
+                if user is not None:
+                    users_to_delete.append(user.id)
+                    user_names_to_delete.append(user.name)
                     msg = "Deleting user: {}\n".format(user_name)
                     self.file_handle.write(msg)
             result = self.ts_handle.delete_users(users_to_delete)
@@ -596,18 +929,18 @@ class SyncTree():
                 logging.debug(
                     "Users deleted [%s]:\n%s\n",
                     len(users_to_delete),
-                    ",\n".join(
-                        id_to_name_ts_map[uid] for uid in users_to_delete
-                    ),
+                    ",\n".join(user_names_to_delete),
                 )
 
         if self.purge or self.purge_groups:
             self.file_handle.write("\n===== Group Deletion Phase =====\n\n")
             logging.info("Deleting groups not in current sync path.")
-            groups_to_delete = []
-            for group_name in set(ts_group_names) - set(ldap_group_names):
-                if name_to_id_ts_map[group_name]:
-                    groups_to_delete.append(name_to_id_ts_map[group_name])
+            groups_to_delete, group_names_to_delete = [], []
+            for group_name in set(ts_group_names) - ldap_group_names:
+                group = ts_groups.get_by_name(group_name)
+                if group is not None:
+                    groups_to_delete.append(group.id)
+                    group_names_to_delete.append(group.name)
                     msg = "Deleting group: {}\n".format(group_name)
                     self.file_handle.write(msg)
             result = self.ts_handle.delete_groups(groups_to_delete)
@@ -630,12 +963,11 @@ class SyncTree():
                 logging.debug(
                     "Groups deleted [%s]:\n%s\n",
                     len(groups_to_delete),
-                    ",\n".join(
-                        id_to_name_ts_map[gid] for gid in groups_to_delete
-                    ),
+                    ",\n".join(group_names_to_delete),
                 )
 
         # Summary Reporting.
+        self.profiler.start_phase("report")
         self.file_handle.write("\n========= Summary ========\n\n")
         self.file_handle.write("Users created: {}\n".format(users_created))
         self.file_handle.write("Groups created: {}\n".format(groups_created))
@@ -647,7 +979,9 @@ class SyncTree():
             self.file_handle.write(
                 "Groups deleted: {}\n".format(groups_deleted)
             )
+        self.write_membership_stats(self.ts_handles())
         self.file_handle.close()
+        self.error_file.close()
 
         # Summary to debug log
         logging.debug("Users created: %s", users_created)
@@ -662,6 +996,49 @@ class SyncTree():
         print("Refer to {} for details.".format(self.file_handle.name))
 
 
+    def ts_principals(self, entity, domain_name):
+        """Returns the users/groups in ThoughtSpot system, including the ones
+           created by this session.
+           @param entity: EntityType user/group.
+           @param domain_name: Domain the principals to purge belong to.
+           @return: Tuple of the PrincipalIndex of the principals and the
+           lower cased names of the ones in the domain.
+        """
+        result = self.ts_handle.get_principal_index(entity)
+        if result.status != Constants.OPERATION_SUCCESS:
+            logging.error("Failed to fetch %ss from ThoughtSpot system.\n",
+                          entity.lower())
+            return PrincipalIndex(), []
+        names = [intern_str(principal.name.lower()) for principal in result.data
+                 if principal.name.endswith(domain_name)]
+        if not names:
+            logging.debug("No %ss fetched from domain (%s).\n",
+                          entity.lower(), domain_name)
+        else:
+            logging.debug("%ss fetched [%s]: \n%s\n", entity, len(names),
+                          ",\n".join(names))
+        return result.data, names
+
+    def write_membership_stats(self, ts_handles):
+        """Writes the group membership changes made to the report summary
+           and log.
+           @param ts_handles: TSApiWrapper sessions which made the changes.
+        """
+        stats = defaultdict(int)
+        for ts_handle in ts_handles:
+            for key, value in ts_handle.membership_stats.items():
+                stats[key] += value
+        self.file_handle.write(
+            "Group memberships updated: {}, unchanged: {}\n".format(
+                stats["groups_updated"], stats["groups_unchanged"]))
+        self.file_handle.write(
+            "Group members added: {}, removed: {}\n".format(
+                stats["members_added"], stats["members_removed"]))
+        logging.info("Group memberships updated: %d, unchanged: %d, members "
+                     "added: %d, removed: %d", stats["groups_updated"],
+                     stats["groups_unchanged"], stats["members_added"],
+                     stats["members_removed"])
+
     def dryRun(self):
         """Perform dry run and report the users/groups
         that will be added/synced/deleted to/from TS
@@ -791,5 +1168,7 @@ class SyncTree():
 
             self.file_handle.write("\n\nGroup Deleted: \n\n\n {}\n"
                                    .format(groups_to_delete))
+        self.file_handle.close()
+        self.error_file.close()
 
         print("Refer to {} for details.".format(self.file_handle.name))
@@ -10,6 +10,7 @@ import sys
 from itertools import chain
 
 import orgAwareUsersAndGroupsSync
+import syncReport
 import syncTree
 
 
@@ -215,6 +216,86 @@ class ScriptArguments():
                      "objects as that of parent",
             action="store_true",
             default=False,
+        ),
+        Argument(
+            flag="ts_batchsize",
+            help_str="Number of users/groups fetched per page when listing "
+                     "them from TS system",
+            default=200,
+        ),
+        Argument(
+            flag="ts_page_concurrency",
+            help_str="Number of pages fetched in parallel when listing "
+                     "users/groups from TS system",
+            default=1,
+        ),
+        Argument(
+            flag="ts_max_in_flight",
+            help_str="Maximum number of user create/update calls made to TS "
+                     "system in parallel",
+            default=1,
+        ),
+        Argument(
+            flag="ldap_cache_size",
+            help_str="Maximum number of LDAP entries cached by DN during sync",
+            default=200000,
+        ),
+        Argument(
+            flag="ldap_page_size",
+            help_str="Number of LDAP entries fetched per page of a search, "
+                     "0 to disable paged searches",
+            default=1000,
+        ),
+        Argument(
+            flag="ldap_pool_size",
+            help_str="Number of connections per LDAP domain used to run "
+                     "searches in parallel",
+            default=1,
+        ),
+        Argument(
+            flag="incremental",
+            help_str="Sync only LDAP entries changed since the last "
+                     "incremental sync, as recorded in the snapshot file",
+            action="store_true",
+            default=False,
+        ),
+        Argument(
+            flag="full_reconcile",
+            help_str="With incremental, sync the whole LDAP tree and rebuild "
+                     "the snapshot file",
+            action="store_true",
+            default=False,
+        ),
+        Argument(
+            flag="snapshot_file",
+            help_str="Path of the snapshot file of incremental syncs",
+            default="ldap_sync_snapshot.json",
+        ),
+        Argument(
+            flag="ts_org_workers",
+            help_str="Number of ThoughtSpot sessions working on different "
+                     "orgs in parallel in org aware sync",
+            default=1,
+        ),
+        Argument(
+            flag="resume",
+            help_str="Record the progress of the sync run in the journal "
+                     "file, and resume the run which was interrupted if the "
+                     "journal file is left, skipping the work recorded in it",
+            action="store_true",
+            default=False,
+        ),
+        Argument(
+            flag="journal_file",
+            help_str="Path of the journal file recording the progress of a "
+                     "sync run",
+            default="ldap_sync_journal.jsonl",
+        ),
+        Argument(
+            flag="report_format",
+            help_str="Format of the sync and error reports, text or jsonl "
+                     "for one JSON record per line",
+            default="text",
         )
     ]
 
@@ -293,6 +374,26 @@ def main(non_optional_args):
             logging.error(error)
             sys.exit(1)
 
+        if non_optional_args["org_mapping"] and \
+                non_optional_args["incremental"]:
+            error = "incremental sync is not supported with org_mapping"
+            logging.error(error)
+            sys.exit(1)
+
+        if non_optional_args["resume"] and (
+                non_optional_args["org_mapping"]
+                or non_optional_args["incremental"]):
+            error = "resume is not supported with org_mapping or incremental"
+            logging.error(error)
+            sys.exit(1)
+
+        if non_optional_args["report_format"] not in (
+                None,) + syncReport.ReportWriter.FORMATS:
+            error = "report_format must be one of {}".format(
+                ", ".join(syncReport.ReportWriter.FORMATS))
+            logging.error(error)
+            sys.exit(1)
+
         if non_optional_args["org_mapping"]:
             orgAwareUsersAndGroupsSync.OrgAwareSyncTree(non_optional_args)
         else:
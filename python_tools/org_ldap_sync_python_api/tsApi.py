@@ -6,6 +6,8 @@ import http.client
 import json
 import logging
 import string
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from functools import wraps
 from random import choice
 from uuid import UUID
@@ -13,7 +15,7 @@ from uuid import UUID
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
-from entityClasses import EntityProperty, EntityType
+from entityClasses import EntityProperty, EntityType, PrincipalIndex
 from globalClasses import Constants, Result
 
 
@@ -257,6 +259,21 @@ def _get_params_for_update_group(description, display_name, group_identifier, gr
     return params
 
 
+def _get_header_from_response(response):
+    """Reads the header of the entity returned by a create call.
+       @param response: Response object of the create call.
+       @return: Header dictionary of the created entity or None if the
+       response does not carry one.
+    """
+    try:
+        header = json.loads(response.text)["header"]
+        if "id" in header and "name" in header:
+            return header
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
 class TSApiWrapper():
     """Wrapper class to log in and execute commands in TS system."""
 
@@ -273,6 +290,7 @@ class TSApiWrapper():
     UPDATE_USER = SERVER_URL + "/v2/users/{user_identifier}?operation={op}"
 
     LOGIN = SERVER_URL + "/session/login"
+    LOGOUT = SERVER_URL + "/session/logout"
     INFO = SERVER_URL + "/session/info"
     UPSERT_GROUP = SERVER_URL + "/session/ldap/groups"
     CREATE_GROUP = SERVER_URL + "/session/group/create"
@@ -300,10 +318,23 @@ class TSApiWrapper():
     LOCAL_GROUP = "LOCAL_GROUP"
     LDAP_GROUP = "LDAP_GROUP"
 
-    def __init__(self, disable_ssl=False):
-        """@param disable_ssl: Flag to disable SSL verification."""
+    # Listing defaults
+    DEFAULT_BATCHSIZE = 200
+    DEFAULT_PAGE_CONCURRENCY = 1
+
+    def __init__(self, disable_ssl=False, batchsize=None,
+                 page_concurrency=None):
+        """@param disable_ssl: Flag to disable SSL verification.
+           @param batchsize: Default batch size for paginated listing calls.
+           @param page_concurrency: Default number of listing pages fetched
+           in parallel.
+        """
         self.hostport = None
+        self.batchsize = batchsize or TSApiWrapper.DEFAULT_BATCHSIZE
+        self.page_concurrency = (page_concurrency
+                                 or TSApiWrapper.DEFAULT_PAGE_CONCURRENCY)
         self.session = requests.Session()
+        self._pool_size = requests.adapters.DEFAULT_POOLSIZE
         if disable_ssl:
             requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
             self.session.verify = False
@@ -312,6 +343,20 @@ class TSApiWrapper():
             "User-Agent": "python/requests"
         }
         self.authenticated = False
+        # Org the session is currently switched to, None till switched.
+        self.org_id = None
+        # Principal snapshots keyed by (EntityType, org_id). The lock guards
+        # the dict and the snapshots, which are updated by concurrent calls.
+        self._principal_indexes = {}
+        self._index_lock = threading.Lock()
+        # Membership update calls made and skipped by the session. Members
+        # added/removed are counted for groups whose members were known.
+        self.membership_stats = {
+            "groups_updated": 0,
+            "groups_unchanged": 0,
+            "members_added": 0,
+            "members_removed": 0
+        }
 
     # Authentication Functions #
 
@@ -348,8 +393,32 @@ class TSApiWrapper():
             logging.error("Timeout error.")
             return Result(Constants.OPERATION_FAILURE, e)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
+            return Result(Constants.OPERATION_FAILURE, e)
+
+    def logout(self):
+        """Logs the user out of the system and closes the connections of the
+           session.
+           @return: Result object with operation status and data. Here data is
+           set to None.
+        """
+        try:
+            if not self.authenticated:
+                return Result(Constants.OPERATION_SUCCESS)
+            response = self.session.post(
+                TSApiWrapper.LOGOUT.format(hostport=self.hostport))
+            self.authenticated = False
+            if response.status_code in (http.client.OK,
+                                        http.client.NO_CONTENT):
+                logging.debug("User logged out.")
+                return Result(Constants.OPERATION_SUCCESS)
+            logging.error("Logout failure.")
+            return Result(Constants.OPERATION_FAILURE, response)
+        except Exception as e:
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
+        finally:
+            self.session.close()
 
     def _is_authenticated(self):
         """Tells us if the user is authenticated or not.
@@ -357,6 +426,19 @@ class TSApiWrapper():
         """
         return self.authenticated
 
+    def _ensure_pool_size(self, size):
+        """Grows the connection pool of the session so that the given number
+           of requests can be in flight at once without opening throw away
+           connections.
+           @param size: Number of concurrent requests to support.
+        """
+        if size <= self._pool_size:
+            return
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool_size = size
+
     # Create Functions #
 
     @pre_check
@@ -376,7 +458,7 @@ class TSApiWrapper():
             logging.error("Unable to obtain Info object.")
             return Result(Constants.OPERATION_FAILURE)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     def is_admin(self):
@@ -416,7 +498,7 @@ class TSApiWrapper():
                           group_identifier)
             return Result(Constants.OPERATION_SUCCESS, response_obj)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     @pre_check
@@ -453,7 +535,7 @@ class TSApiWrapper():
                 result = self.sync_existing_group(description, display_name, grouptype, name,
                                                   privileges, ts_group, upsert_group)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             result = Result(Constants.OPERATION_FAILURE, e)
 
         return result
@@ -482,6 +564,7 @@ class TSApiWrapper():
 
             if response.status_code == http.client.OK:
                 logging.debug("New group %s added.", name)
+                self._record_created_principal(EntityType.GROUP, response)
                 return Result(Constants.OPERATION_SUCCESS)
 
             logging.error("New group %s not added. Response: %s", name, response.text)
@@ -570,7 +653,7 @@ class TSApiWrapper():
                 result = Result(Constants.OPERATION_FAILURE, response)
 
         except Exception as e:
-            logging.error("Exception %s occurred with message: %s", type(e).__name__, e.message)
+            logging.error("Exception %s occurred with message: %s", type(e).__name__, str(e))
             result = Result(Constants.OPERATION_FAILURE, e)
 
         return result
@@ -589,12 +672,13 @@ class TSApiWrapper():
                 data=params,
             )
             if response.status_code == http.client.NO_CONTENT:
+                self.org_id = org_id
                 logging.debug(success_msg)
                 return Result(Constants.OPERATION_SUCCESS)
             logging.debug(failure_msg)
             return Result(Constants.OPERATION_FAILURE)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     @pre_check
@@ -625,7 +709,7 @@ class TSApiWrapper():
                           user_identifier)
             return Result(Constants.OPERATION_SUCCESS, response_obj)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     @pre_check
@@ -714,6 +798,139 @@ class TSApiWrapper():
         logging.debug("User %s already exists. Skipping update.", name)
         return Result(Constants.USER_ALREADY_EXISTS)
 
+    @pre_check
+    def sync_users(self, users, upsert_user=False, all_org_scope=False):
+        """Sync a batch of users with TS. Unlike calling sync_user for every
+           user, the existing users are read with a single paginated listing
+           and create/update calls are only made for the users which differ
+           from their desired state, so users already in sync cost no request.
+           Users are listed across all orgs, like search_user looks them up
+           in sync_user, so that a user of another org is not created again.
+           See list_users_to_sync.
+           @param users: List of desired user states. Each is a dictionary
+           with keys name, display_name and optionally usertype, password,
+           email, groups and org_ids, same as the arguments of sync_user.
+           @param upsert_user: Upsert the users if true else only create.
+           @param all_org_scope: if the sync call is in all org scope.
+           @return: Result object with operation status and data. Here data is
+           a dictionary of user name to the Result object of its sync which
+           has the same status as sync_user would return.
+        """
+        result = self.list_users_to_sync(users, upsert_user)
+        if result.status != Constants.OPERATION_SUCCESS:
+            return result
+        ts_users = result.data
+
+        user_results = {}
+        for user in users:
+            user_results[user["name"]] = self.sync_listed_user(
+                user, ts_users.get(user["name"].lower()), upsert_user,
+                all_org_scope)
+        return Result(Constants.OPERATION_SUCCESS, user_results)
+
+    def list_users_to_sync(self, users, upsert_user=False):
+        """Lists the users of all orgs to diff the users to sync against.
+           The listing of list_users does not carry the email of the users,
+           hence when upserting users with an email the emails of all the
+           users are fetched too, with paged user searches.
+           @param users: List of desired user states, see sync_users.
+           @param upsert_user: Whether the users are upserted.
+           @return: Result object with operation status and data. Here data is
+           a dictionary of lower case user name to EntityProperty object.
+        """
+        result = self.list_users(allOrgs=True)
+        if result.status != Constants.OPERATION_SUCCESS:
+            return result
+        ts_users = {user.name.lower(): user for user in result.data}
+        if upsert_user and any(user.get("email") is not None
+                               for user in users):
+            result = self.list_user_emails()
+            if result.status != Constants.OPERATION_SUCCESS:
+                return result
+            for name, email in result.data.items():
+                if name in ts_users:
+                    ts_users[name].email = email
+        return Result(Constants.OPERATION_SUCCESS, ts_users)
+
+    @pre_check
+    def list_user_emails(self):
+        """Lists the emails of the users of all orgs with paged user searches.
+           @return: Result object with operation status and data. Here data is
+           a dictionary of lower case user name to email, None for users
+           without one.
+        """
+        emails = {}
+        offset = 0
+        try:
+            while True:
+                response = self.session.post(
+                    TSApiWrapper.SEARCH_USER.format(hostport=self.hostport),
+                    data={"record_offset": offset,
+                          "record_size": self.batchsize,
+                          "org_scope": "ALL"},
+                )
+                if response.status_code != http.client.OK:
+                    logging.error("Failed to fetch user emails.")
+                    return Result(Constants.OPERATION_FAILURE, response)
+                users = json.loads(response.text)["data"]
+                for user in users:
+                    emails[user["name"].lower()] = user.get("email")
+                if len(users) < self.batchsize:
+                    break
+                offset += self.batchsize
+        except Exception as e:
+            logging.error("Failed to fetch user emails. %s", e)
+            return Result(Constants.OPERATION_FAILURE, e)
+        logging.debug("Fetched emails of %d users.", len(emails))
+        return Result(Constants.OPERATION_SUCCESS, emails)
+
+    def sync_listed_user(self, user, ts_user, upsert_user=False,
+                         all_org_scope=False):
+        """Sync a user with TS given its listing entry from TS system. Makes
+           a create/update call only if the user differs from its desired
+           state.
+           @param user: Desired user state, see sync_users.
+           @param ts_user: EntityProperty of the user as listed by
+           list_users_to_sync, None if the user does not exist.
+           @param upsert_user: Upsert the user if true else only create.
+           @param all_org_scope: if the sync call is in all org scope.
+           @return: Result object with the same status as sync_user.
+        """
+        name = user["name"]
+        display_name = user.get("display_name")
+        email = user.get("email")
+        usertype = user.get("usertype")
+        org_ids = user.get("org_ids")
+        if ts_user is None:
+            return self.create_user(
+                name, display_name, usertype, user.get("password"), email,
+                user.get("groups"), org_ids, all_org_scope)
+
+        # Orgs are only ever added here, removal from orgs is done by
+        # update_user_org with a replace operation.
+        missing_orgs = (set(org_ids or []) - set(ts_user.orgIds)
+                        if ts_user.orgIds is not None else set())
+        properties_changed = (
+            ts_user.name != name
+            or (ts_user.display_name is not None
+                and ts_user.display_name != display_name)
+            or (email is not None and ts_user.email != email))
+        if upsert_user and properties_changed:
+            update_result = self.update_user_properties(
+                name, display_name, usertype, email, org_ids, all_org_scope)
+        elif missing_orgs:
+            update_result = self.update_user_org(
+                user_identifier=name, operation=Constants.Add,
+                org_identifiers=org_ids)
+        else:
+            logging.debug("User %s already in sync. Skipping update.", name)
+            update_result = Result(Constants.USER_ALREADY_EXISTS)
+
+        if update_result.status in [Constants.OPERATION_SUCCESS,
+                                    Constants.USER_ALREADY_EXISTS]:
+            return Result(Constants.USER_ALREADY_EXISTS)
+        return Result(Constants.OPERATION_FAILURE, update_result.data)
+
     @pre_check
     def update_user_properties(self, name, display_name, usertype, email, org_ids, all_org_scope):
         """
@@ -774,12 +991,14 @@ class TSApiWrapper():
             )
             if response.status_code == http.client.OK:
                 logging.debug("New user %s added.", name)
+                self._record_created_principal(EntityType.USER, response,
+                                               orgids)
                 return Result(Constants.OPERATION_SUCCESS)
             logging.error("New user %s not added. Response %s", name,
                           response.text)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     @pre_check
@@ -826,6 +1045,10 @@ class TSApiWrapper():
             if response.status_code == http.client.NO_CONTENT:
                 logging.debug("Updated existing user %s.\n"
                               "Updated attributes: %s", name, params)
+                if org_identifiers is not None:
+                    # Org assignment changed, the per org snapshots of users
+                    # are rebuilt on next lookup.
+                    self.invalidate_principal_index(EntityType.USER)
                 return Result(Constants.OPERATION_SUCCESS)
 
             logging.error("Unable to update user %s.\n"
@@ -834,7 +1057,7 @@ class TSApiWrapper():
             return Result(Constants.OPERATION_FAILURE, response)
 
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     @pre_check
@@ -866,7 +1089,7 @@ class TSApiWrapper():
                           response.text)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     # Delete Functions #
@@ -903,11 +1126,17 @@ class TSApiWrapper():
             )
             if response.status_code == http.client.NO_CONTENT:
                 logging.debug(success_msg)
+                with self._index_lock:
+                    for (index_entity, _), index in \
+                            self._principal_indexes.items():
+                        if index_entity == entity:
+                            for entity_id in entity_list:
+                                index.remove(entity_id)
                 return Result(Constants.OPERATION_SUCCESS)
             logging.error(failure_msg)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     def delete_groups(self, gid_list):
@@ -967,15 +1196,10 @@ class TSApiWrapper():
                                             .format(
                                                 item["id"], item["name"]
                                             ))
-                    if "orgIds" in item:
-                        ent_property_obj = EntityProperty(
-                            item["id"], item["name"], item["type"],
-                            item["orgIds"]
-                        )
-                    else:
-                        ent_property_obj = EntityProperty(
-                            item["id"], item["name"], item["type"]
-                        )
+                    ent_property_obj = EntityProperty(
+                        item["id"], item["name"], item["type"],
+                        item.get("orgIds"), item.get("displayName")
+                    )
                     entity_list.append(ent_property_obj)
                 logging.debug(success_msg)
                 is_last_batch = responseDict["isLastBatch"]
@@ -984,22 +1208,27 @@ class TSApiWrapper():
             logging.error(failure_msg)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     @pre_check
-    def _list_entities(self, entity, batchsize, allOrgs):
+    def _list_entities(self, entity, batchsize, allOrgs, page_concurrency=1):
         """Lists (user/group)s in TS system.
            @param entity: Entity to fetch User/Group.
            @param batchsize: Batch size for pagination.
+           @param page_concurrency: Number of pages to fetch in parallel.
            @return: Result object with operation status and data. Here data is
            a list of (user/group)s in the TS system as EntityProperty objects.
         """
+        if batchsize == 0 or batchsize is None:
+            batchsize = TSApiWrapper.DEFAULT_BATCHSIZE
+        if page_concurrency is not None and page_concurrency > 1:
+            return self._list_entities_concurrently(entity, batchsize,
+                                                    allOrgs, page_concurrency)
+
         entity_list = []
         success_msg = "Successfully returning {} list.".format(entity)
         failure_msg = "Failed to procure {} list.".format(entity)
-        if batchsize == 0 or batchsize is None:
-            batchsize = 200
 
         is_last_batch = False
         batch_count = 0
@@ -1021,19 +1250,94 @@ class TSApiWrapper():
         logging.debug(success_msg)
         return Result(Constants.OPERATION_SUCCESS, entity_list)
 
-    def list_groups(self, allOrgs, batchsize=200):
+    def _list_entities_concurrently(self, entity, batchsize, allOrgs,
+                                    page_concurrency):
+        """Lists (user/group)s in TS system keeping page_concurrency pages in
+           flight at a time. Pages are requested in offset order and no new
+           page is requested once a page reports being the last batch.
+           @param entity: Entity to fetch User/Group.
+           @param batchsize: Batch size for pagination.
+           @param page_concurrency: Number of pages to fetch in parallel.
+           @return: Result object with operation status and data. Here data is
+           a list of (user/group)s in the TS system as EntityProperty objects,
+           in the same order as a sequential listing.
+        """
+        success_msg = "Successfully returning {} list.".format(entity)
+        failure_msg = "Failed to procure {} list.".format(entity)
+        self._ensure_pool_size(page_concurrency)
+
+        pages = {}
+        failed_batches = {}
+        last_batch = None
+        next_batch = 0
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=page_concurrency) as executor:
+            while True:
+                while (len(in_flight) < page_concurrency
+                       and last_batch is None and not failed_batches):
+                    future = executor.submit(
+                        self._get_batched_entities, entity,
+                        batchsize * next_batch, batchsize, allOrgs)
+                    in_flight[future] = next_batch
+                    next_batch += 1
+                if not in_flight:
+                    break
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_count = in_flight.pop(future)
+                    result_obj = future.result()
+                    if result_obj.status != Constants.OPERATION_SUCCESS:
+                        failed_batches[batch_count] = result_obj
+                        continue
+                    ent_property_obj, is_last_batch = result_obj.data
+                    pages[batch_count] = ent_property_obj
+                    if is_last_batch and (last_batch is None
+                                          or batch_count < last_batch):
+                        last_batch = batch_count
+
+        # Failures of pages past the last batch do not matter.
+        for batch_count in sorted(failed_batches):
+            if last_batch is None or batch_count <= last_batch:
+                batch_fail_msg = " Failed at batch number: {}".format(
+                    batch_count
+                    )
+                #pylint:disable=logging-not-lazy
+                logging.error(failure_msg + batch_fail_msg)
+                return failed_batches[batch_count]
+
+        entity_list = []
+        for batch_count in range(last_batch + 1):
+            entity_list.extend(pages[batch_count])
+        logging.debug(success_msg)
+        return Result(Constants.OPERATION_SUCCESS, entity_list)
+
+    def list_groups(self, allOrgs, batchsize=None, page_concurrency=None):
         """Lists groups in TS system.
+           @param allOrgs: List groups of all orgs if True.
+           @param batchsize: Batch size for pagination, defaults to the batch
+           size of the wrapper.
+           @param page_concurrency: Number of pages to fetch in parallel,
+           defaults to the page concurrency of the wrapper.
            @return: Result object with operation status and data. Here data is
            a list of (user/group)s in the TS system as EntityProperty objects.
         """
-        return self._list_entities(EntityType.GROUP, batchsize, allOrgs)
+        return self._list_entities(
+            EntityType.GROUP, batchsize or self.batchsize, allOrgs,
+            page_concurrency or self.page_concurrency)
 
-    def list_users(self, allOrgs, batchsize=200):
+    def list_users(self, allOrgs, batchsize=None, page_concurrency=None):
         """Lists users in TS system.
+           @param allOrgs: List users of all orgs if True.
+           @param batchsize: Batch size for pagination, defaults to the batch
+           size of the wrapper.
+           @param page_concurrency: Number of pages to fetch in parallel,
+           defaults to the page concurrency of the wrapper.
            @return: Result object with operation status and data. Here data is
            a list of (user/group)s in the TS system as EntityProperty objects.
         """
-        return self._list_entities(EntityType.USER, batchsize, allOrgs)
+        return self._list_entities(
+            EntityType.USER, batchsize or self.batchsize, allOrgs,
+            page_concurrency or self.page_concurrency)
 
     def list_orgs(self):
         """Lists orgs in TS system.
@@ -1062,7 +1366,7 @@ class TSApiWrapper():
             logging.debug(failure_msg)
             return Result(Constants.OPERATION_FAILURE)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     # Add entities to group functions #
@@ -1092,7 +1396,7 @@ class TSApiWrapper():
             logging.error(failure_msg)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     @pre_check
@@ -1129,7 +1433,7 @@ class TSApiWrapper():
             logging.error(failure_msg)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     # Group update Functions #
@@ -1142,6 +1446,9 @@ class TSApiWrapper():
            groups are being updated current member group list is deleted and
            udpated with the new memeber group list being provided. Similar
            steps are taken for member user list update too.
+           The new member list is first compared with the current one, as
+           fetched in bulk by index_group_memberships, and no call is made if
+           the two are the same.
            @param entity: EntityType user/group.
            @param entity_list: Entity ID list to be updated as members of
            the group.
@@ -1149,36 +1456,35 @@ class TSApiWrapper():
            @return: Result object with operation status and data. Here data is
            set to None.
         """
+        if entity not in (EntityType.GROUP, EntityType.USER):
+            logging.error(TSApiWrapper.UNKNOWN_ENTITY_TYPE)
+            return Result(Constants.OPERATION_FAILURE)
+
+        index = self._get_membership_index()
+        current_ids = (index.get_members(gid, entity)
+                       if index is not None else None)
+
         # Append local object IDs to keep local memberships
         if keep_local_membership:
-            if entity == EntityType.GROUP:
-                result = self.list_groups_in_group(gid)
-                if result.status != Constants.OPERATION_SUCCESS:
-                    return Result(result.status)
-                current_groups = result.data
-                for group in current_groups:
-                    if group.type == "LOCAL_GROUP":
-                        entity_list.append(group.id)
-            else:
-                result = self.list_users_in_group(gid)
-                if result.status != Constants.OPERATION_SUCCESS:
-                    return Result(result.status)
-                current_users = result.data
-                for user in current_users:
-                    if user.type == "LOCAL_USER":
-                        entity_list.append(user.id)
+            result = self._get_local_member_ids(entity, gid, current_ids)
+            if result.status != Constants.OPERATION_SUCCESS:
+                return Result(result.status)
+            entity_list = list(entity_list) + result.data
         # Filter irregular input objects from entity_list
         entity_list = list(filter(is_valid_uuid, entity_list))
 
+        new_ids = set(entity_list)
+        if current_ids is not None and new_ids == current_ids:
+            logging.debug("%ss of group %s are unchanged.", entity, gid)
+            self.membership_stats["groups_unchanged"] += 1
+            return Result(Constants.OPERATION_SUCCESS)
+
         if entity == EntityType.GROUP:
             id_list_key = "principalids"
             end_point = TSApiWrapper.UPDATE_GROUPS_IN_GROUPS
-        elif entity == EntityType.USER:
+        else:
             id_list_key = "userids"
             end_point = TSApiWrapper.UPDATE_USERS_IN_GROUPS
-        else:
-            logging.error(TSApiWrapper.UNKNOWN_ENTITY_TYPE)
-            return Result(Constants.OPERATION_FAILURE)
 
         success_msg = "Successfully updated the group with {}s.".format(entity)
         failure_msg = "Failed to update {}s the group.".format(entity)
@@ -1190,12 +1496,111 @@ class TSApiWrapper():
             )
             if response.status_code == http.client.NO_CONTENT:
                 logging.debug(success_msg)
+                self.membership_stats["groups_updated"] += 1
+                if current_ids is not None:
+                    self.membership_stats["members_added"] += len(
+                        new_ids - current_ids)
+                    self.membership_stats["members_removed"] += len(
+                        current_ids - new_ids)
+                if index is not None:
+                    index.set_members(gid, entity, entity_list)
                 return Result(Constants.OPERATION_SUCCESS)
             logging.error(failure_msg)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
+            return Result(Constants.OPERATION_FAILURE, e)
+
+    def _get_local_member_ids(self, entity, gid, current_ids):
+        """Returns the IDs of the local users/groups which are members of a
+           group. The member types are looked up in the principal snapshot
+           when the current members are known, else the members are listed.
+           @param entity: EntityType user/group.
+           @param gid: Group ID.
+           @param current_ids: Set of the current member IDs, None if not
+           known.
+           @return: Result object with operation status and data. Here data is
+           a list of IDs.
+        """
+        local_type = ("LOCAL_GROUP" if entity == EntityType.GROUP
+                      else "LOCAL_USER")
+        if current_ids is not None:
+            result = self.get_principal_index(entity)
+            if result.status == Constants.OPERATION_SUCCESS:
+                members = [result.data.get_by_id(member_id)
+                           for member_id in current_ids]
+                if None not in members:
+                    return Result(Constants.OPERATION_SUCCESS,
+                                  [member.id for member in members
+                                   if member.type == local_type])
+
+        result = self._list_entities_in_group(entity, gid)
+        if result.status != Constants.OPERATION_SUCCESS:
+            return result
+        return Result(Constants.OPERATION_SUCCESS,
+                      [member.id for member in result.data
+                       if member.type == local_type])
+
+    def _get_membership_index(self):
+        """Returns the group snapshot of the current org with the memberships
+           of all the groups fetched, fetching them on first use.
+           @return: PrincipalIndex object or None if it could not be built.
+        """
+        result = self.get_principal_index(EntityType.GROUP)
+        if result.status != Constants.OPERATION_SUCCESS:
+            return None
+        index = result.data
+        if not index.memberships_loaded:
+            # Tried once per snapshot, groups not fetched are updated
+            # without comparing.
+            index.memberships_loaded = True
+            self.index_group_memberships(index)
+        return index
+
+    @pre_check
+    def index_group_memberships(self, index):
+        """Fetches the member users and groups of all the groups in the
+           current org with paged group searches and records them in the
+           given group snapshot.
+           @param index: PrincipalIndex object of the groups of the org.
+           @return: Result object with operation status and data. Here data is
+           the number of groups whose members were recorded.
+        """
+        group_cnt = 0
+        offset = 0
+        try:
+            while True:
+                response = self.session.post(
+                    TSApiWrapper.SEARCH_GROUP.format(hostport=self.hostport),
+                    data={"record_offset": offset,
+                          "record_size": self.batchsize},
+                )
+                if response.status_code != http.client.OK:
+                    logging.error("Failed to fetch group memberships.")
+                    return Result(Constants.OPERATION_FAILURE, response)
+                groups = json.loads(response.text)["data"]
+                for group in groups:
+                    # Groups without member details stay unknown rather than
+                    # being taken as empty.
+                    if "users" in group:
+                        index.set_members(
+                            group["id"], EntityType.USER,
+                            [user["id"] for user in group["users"] or []])
+                    if "sub_groups" in group:
+                        index.set_members(
+                            group["id"], EntityType.GROUP,
+                            [sub_group["id"]
+                             for sub_group in group["sub_groups"] or []])
+                    group_cnt += 1
+                if len(groups) < self.batchsize:
+                    break
+                offset += self.batchsize
+        except Exception as e:
+            logging.error("Failed to fetch group memberships. %s", e)
             return Result(Constants.OPERATION_FAILURE, e)
+        logging.debug("Fetched memberships of %d groups of org %s.",
+                      group_cnt, self.org_id)
+        return Result(Constants.OPERATION_SUCCESS, group_cnt)
 
     def update_groups_to_group(self, group_list, gid,
                                keep_local_membership=False):
@@ -1270,7 +1675,7 @@ class TSApiWrapper():
             logging.error(failure_msg)
             return Result(Constants.OPERATION_FAILURE, response)
         except Exception as e:
-            logging.error(e.message)
+            logging.error(str(e))
             return Result(Constants.OPERATION_FAILURE, e)
 
     def list_groups_in_group(self, gid):
@@ -1293,6 +1698,69 @@ class TSApiWrapper():
     # Specialized getter functions #
 
     @pre_check
+    def get_principal_index(self, entity):
+        """Returns the snapshot of users/groups in the current org. The
+           snapshot is built with a listing call the first time it is asked
+           for and then kept up to date by the write calls of this session.
+           @param entity: EntityType user/group.
+           @return: Result object with operation status and data. Here data is
+           a PrincipalIndex object.
+        """
+        if entity not in (EntityType.GROUP, EntityType.USER):
+            logging.error(TSApiWrapper.UNKNOWN_ENTITY_TYPE)
+            return Result(Constants.OPERATION_FAILURE)
+
+        key = (entity, self.org_id)
+        with self._index_lock:
+            index = self._principal_indexes.get(key)
+        if index is None:
+            # Listed without the lock held, if two calls race the first
+            # snapshot stored is kept.
+            result = self._list_entities(entity, self.batchsize, False,
+                                         self.page_concurrency)
+            if result.status != Constants.OPERATION_SUCCESS:
+                return result
+            with self._index_lock:
+                index = self._principal_indexes.setdefault(
+                    key, PrincipalIndex(result.data))
+            logging.debug("Indexed %d %s(s) of org %s.", len(index), entity,
+                          key[1])
+        return Result(Constants.OPERATION_SUCCESS, index)
+
+    def invalidate_principal_index(self, entity=None):
+        """Drops the principal snapshots so that they are rebuilt from TS
+           system on next lookup. To be used when principals are changed
+           outside of this session.
+           @param entity: EntityType user/group to drop, None drops both.
+        """
+        with self._index_lock:
+            for key in list(self._principal_indexes.keys()):
+                if entity is None or key[0] == entity:
+                    self._principal_indexes.pop(key, None)
+
+    def _record_created_principal(self, entity, response, org_ids=None):
+        """Adds a newly created user/group to the principal snapshots.
+           @param entity: EntityType user/group.
+           @param response: Response object of the create call.
+           @param org_ids: Orgs the principal was created in, current org if
+           None.
+        """
+        header = _get_header_from_response(response)
+        if header is None:
+            # Without the ID we cannot keep the snapshots consistent.
+            self.invalidate_principal_index(entity)
+            return
+        org_ids = org_ids or header.get("orgIds")
+        ent_property_obj = EntityProperty(header["id"], header["name"],
+                                          header.get("type"), org_ids)
+        with self._index_lock:
+            for (index_entity, org_id), index in \
+                    self._principal_indexes.items():
+                if index_entity == entity and (
+                        org_id == self.org_id
+                        or (org_ids and org_id in org_ids)):
+                    index.add(ent_property_obj)
+
     def _get_entityid_with_name(self, entity, name):
         """Returns user/group id given the unique name of the user/group.
            @param entity: EntityType user/group.
@@ -1300,17 +1768,13 @@ class TSApiWrapper():
            @return: Result object with operation status and data. Here data is
            ID if user/group is present in the system else None.
         """
-        if entity == EntityType.GROUP:
-            entity_list = self.list_groups(allOrgs=False)
-        elif entity == EntityType.USER:
-            entity_list = self.list_users(allOrgs=False)
-        else:
-            logging.error(TSApiWrapper.UNKNOWN_ENTITY_TYPE)
-            return Result(Constants.OPERATION_FAILURE)
+        result = self.get_principal_index(entity)
+        if result.status != Constants.OPERATION_SUCCESS:
+            return result
 
-        for ent in entity_list.data:
-            if ent.name == name:
-                return Result(Constants.OPERATION_SUCCESS, ent.id)
+        ent = result.data.get_by_name(name)
+        if ent is not None:
+            return Result(Constants.OPERATION_SUCCESS, ent.id)
         logging.debug("Such an entity doesn't exist.")
         return Result(Constants.OPERATION_FAILURE)
 
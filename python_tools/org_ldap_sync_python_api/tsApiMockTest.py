@@ -0,0 +1,216 @@
+#! /usr/bin/env python3
+# Copyright: ThoughtSpot Inc. 2024
+
+"""
+Unit tests for tsApi.py run against the in-process MockTSServer of
+syncBenchmark.py, hence needing no ThoughtSpot system.
+
+Example command:
+
+>>> python tsApiMockTest.py
+"""
+
+import logging
+import threading
+import time
+import unittest
+from urllib.parse import parse_qsl, urlsplit
+
+from entityClasses import EntityType
+from globalClasses import Constants
+from syncBenchmark import MOCK_TS_PASSWORD, MOCK_TS_USERNAME, MockTSServer
+from tsApi import TSApiWrapper
+
+
+class ReversedPagesServer(MockTSServer):
+    """MockTSServer answering the pages of a listing in reverse order, as
+       earlier pages wait longer, and recording the offsets listed.
+    """
+
+    PAGE_DELAY = 0.02
+
+    def __init__(self):
+        super().__init__()
+        self.offsets = []
+        self._offsets_lock = threading.Lock()
+
+    def handle(self, method, url, body, cookie):
+        """Serves a request, delaying pages by how early they are."""
+        parts = urlsplit(url)
+        if parts.path.endswith("/metadata/list"):
+            offset = int(dict(parse_qsl(parts.query)).get("offset", 0))
+            with self._offsets_lock:
+                self.offsets.append(offset)
+            time.sleep(max(0.0, 0.1 - offset * self.PAGE_DELAY))
+        return super().handle(method, url, body, cookie)
+
+
+class MockTSTestCase(unittest.TestCase):
+    """Starts a MockTSServer and logs a TSApiWrapper in to it."""
+
+    BATCHSIZE = 3
+    SERVER = MockTSServer
+
+    def setUp(self):
+        self.server = self.SERVER()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.ts = self.login()
+
+    def login(self, page_concurrency=None):
+        """@param page_concurrency: Pages listed in parallel.
+           @return: TSApiWrapper logged in to the mock server.
+        """
+        ts = TSApiWrapper(batchsize=self.BATCHSIZE,
+                          page_concurrency=page_concurrency)
+        result = ts.login(self.server.hostport, MOCK_TS_USERNAME,
+                          MOCK_TS_PASSWORD)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        return ts
+
+    def requests_made(self, function, *args, **kwargs):
+        """@param function: Function to call.
+           @return: Return value of the function and the number of requests
+           it made.
+        """
+        request_cnt = self.server.request_cnt
+        result = function(*args, **kwargs)
+        return result, self.server.request_cnt - request_cnt
+
+
+class TestSyncUsers(MockTSTestCase):
+
+    @staticmethod
+    def users(count, email="user{}@example.com"):
+        return [{"name": "user{}".format(ind),
+                 "display_name": "User {}".format(ind),
+                 "usertype": TSApiWrapper.LDAP_USER,
+                 "email": email.format(ind) if email else None}
+                for ind in range(count)]
+
+    def test_sync_users_in_sync(self):
+        """Tests users already in sync cost no request besides the listings,
+           also when upserting users with an email.
+        """
+        users = self.users(10)
+        self.ts.sync_users(users, upsert_user=True)
+        result, request_cnt = self.requests_made(
+            self.ts.sync_users, users, upsert_user=True)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        self.assertEqual(
+            {user_result.status for user_result in result.data.values()},
+            {Constants.USER_ALREADY_EXISTS})
+        # Users and emails are listed in pages of BATCHSIZE.
+        self.assertEqual(request_cnt, 4 + 4)
+
+    def test_sync_users_email_changed(self):
+        """Tests the email of a user otherwise in sync is updated."""
+        users = self.users(5)
+        self.ts.sync_users(users)
+        users[2]["email"] = "changed@example.com"
+        result, request_cnt = self.requests_made(
+            self.ts.sync_users, users, upsert_user=True)
+        self.assertEqual(result.data["user2"].status,
+                         Constants.USER_ALREADY_EXISTS)
+        self.assertEqual(request_cnt, 2 + 2 + 1)
+        emails = {user["name"]: user["email"]
+                  for user in self.server.users.values()}
+        self.assertEqual(emails["user2"], "changed@example.com")
+
+    def test_sync_users_without_upsert(self):
+        """Tests emails are not listed when users are not upserted."""
+        users = self.users(5)
+        self.ts.sync_users(users)
+        users[2]["email"] = "changed@example.com"
+        _, request_cnt = self.requests_made(self.ts.sync_users, users)
+        self.assertEqual(request_cnt, 2)
+
+
+class TestListConcurrently(MockTSTestCase):
+
+    SERVER = ReversedPagesServer
+    PAGE_CONCURRENCY = 3
+
+    def test_list_users_concurrently(self):
+        """Tests pages listed in parallel, and answered out of order, are
+           reassembled in offset order, and no page is requested once the
+           last batch is known besides those already in flight.
+        """
+        for ind in range(10):
+            self.ts.create_user("user{}".format(ind), "User {}".format(ind))
+        names = [user["name"] for user in self.server.users.values()]
+        # 10 users do not fill the last page of BATCHSIZE.
+        last_page = (len(names) - 1) // self.BATCHSIZE
+
+        ts = self.login(page_concurrency=self.PAGE_CONCURRENCY)
+        result = ts.list_users(True)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        self.assertEqual([user.name for user in result.data], names)
+
+        pages = sorted(offset // self.BATCHSIZE
+                       for offset in self.server.offsets)
+        self.assertEqual(pages, list(range(len(pages))))
+        self.assertGreater(len(pages), last_page)
+        self.assertLessEqual(len(pages), last_page + self.PAGE_CONCURRENCY)
+
+
+class TestGroupMemberships(MockTSTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for ind in range(4):
+            self.ts.sync_group("group{}".format(ind), "Group {}".format(ind))
+        for ind in range(2):
+            self.ts.create_user("user{}".format(ind), "User {}".format(ind))
+        self.gids = [self.ts.get_groupid_with_name("group{}".format(ind)).data
+                     for ind in range(4)]
+        self.uids = [self.ts.get_userid_with_name("user{}".format(ind)).data
+                     for ind in range(2)]
+
+    def test_index_group_memberships(self):
+        """Tests the members of all the groups are recorded from paged group
+           searches.
+        """
+        self.server.groups[self.gids[0]]["users"] = set(self.uids)
+        self.server.groups[self.gids[3]]["groups"] = {self.gids[1]}
+        index = self.ts.get_principal_index(EntityType.GROUP).data
+        result, request_cnt = self.requests_made(
+            self.ts.index_group_memberships, index)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        self.assertEqual(result.data, 4)
+        # Groups are searched in pages of BATCHSIZE.
+        self.assertEqual(request_cnt, 2)
+        self.assertEqual(index.get_members(self.gids[0], EntityType.USER),
+                         set(self.uids))
+        self.assertEqual(index.get_members(self.gids[3], EntityType.GROUP),
+                         {self.gids[1]})
+        self.assertEqual(index.get_members(self.gids[2], EntityType.USER),
+                         set())
+
+    def test_update_users_to_group_unchanged(self):
+        """Tests membership updates are only sent when the members change."""
+        gid = self.gids[0]
+        stats = self.ts.membership_stats
+        result = self.ts.update_users_to_group([self.uids[0]], gid)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        self.assertEqual(stats["groups_updated"], 1)
+        self.assertEqual(stats["members_added"], 1)
+
+        result, request_cnt = self.requests_made(
+            self.ts.update_users_to_group, [self.uids[0]], gid)
+        self.assertEqual(result.status, Constants.OPERATION_SUCCESS)
+        self.assertEqual(request_cnt, 0)
+        self.assertEqual(stats["groups_unchanged"], 1)
+
+        result, request_cnt = self.requests_made(
+            self.ts.update_users_to_group, [self.uids[1]], gid)
+        self.assertEqual(request_cnt, 1)
+        self.assertEqual(stats["groups_updated"], 2)
+        self.assertEqual(stats["members_added"], 2)
+        self.assertEqual(stats["members_removed"], 1)
+        self.assertEqual(self.server.groups[gid]["users"], {self.uids[1]})
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    unittest.main()
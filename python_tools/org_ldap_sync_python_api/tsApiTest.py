@@ -25,6 +25,7 @@ import sys
 import unittest
 import time
 
+from entityClasses import EntityProperty, PrincipalIndex
 from globalClasses import Constants
 from tsApi import TSApiWrapper, is_valid_uuid
 
@@ -289,6 +290,46 @@ class TestTSApi(unittest.TestCase):
         # Cleanup
         ts.delete_groups([member_gid1, member_gid2, parent_gid])
 
+    def test_update_users_to_group_diff(self):
+        """Tests membership updates are only sent when the members change."""
+        parent_group = "parent_group"
+        member_user1 = "member_user1"
+        member_user2 = "member_user2"
+
+        ts = TSApiWrapper(DISABLE_SSL)
+        ts.login(HOSTPORT, USERNAME, PASSWORD)
+
+        ts.sync_group(parent_group, parent_group)
+        ts.create_user(member_user1, member_user1)
+        ts.create_user(member_user2, member_user2)
+        parent_gid = ts.get_groupid_with_name(parent_group).data
+        member_uid1 = ts.get_userid_with_name(member_user1).data
+        member_uid2 = ts.get_userid_with_name(member_user2).data
+
+        result = ts.update_users_to_group([member_uid1], parent_gid)
+        self.assertTrue(result.status == Constants.OPERATION_SUCCESS)
+        self.assertEqual(ts.membership_stats["groups_updated"], 1)
+        self.assertEqual(ts.membership_stats["members_added"], 1)
+
+        # Same members, no update call.
+        result = ts.update_users_to_group([member_uid1], parent_gid)
+        self.assertTrue(result.status == Constants.OPERATION_SUCCESS)
+        self.assertEqual(ts.membership_stats["groups_updated"], 1)
+        self.assertEqual(ts.membership_stats["groups_unchanged"], 1)
+
+        result = ts.update_users_to_group([member_uid2], parent_gid)
+        self.assertTrue(result.status == Constants.OPERATION_SUCCESS)
+        self.assertEqual(ts.membership_stats["groups_updated"], 2)
+        self.assertEqual(ts.membership_stats["members_added"], 2)
+        self.assertEqual(ts.membership_stats["members_removed"], 1)
+        self.assertEqual(
+            [user.id for user in ts.list_users_in_group(parent_gid).data],
+            [member_uid2])
+
+        # Cleanup
+        ts.delete_groups([parent_gid])
+        ts.delete_users([member_uid1, member_uid2])
+
     def test_update_group(self):
         """Tests creation of following structure.
            Group: parent_group {
@@ -390,6 +431,28 @@ class TestTSApi(unittest.TestCase):
         self.assertEqual(test_output[0], valid_guid_list[0])
         self.assertEqual(test_output[1], valid_guid_list[1])
 
+    def test_principal_index(self):
+        """Tests lookups and in place updates of the principal snapshot."""
+        index = PrincipalIndex([
+            EntityProperty("id1", "User1@ldap.com", "LDAP_USER", [0, 1]),
+            EntityProperty("id2", "user2@ldap.com", "LDAP_USER", [1]),
+        ])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.get_by_name("user1@LDAP.com").id, "id1")
+        self.assertEqual(index.get_by_name("user2@ldap.com", 1).id, "id2")
+        self.assertIsNone(index.get_by_name("user2@ldap.com", 0))
+        self.assertEqual(index.get_by_id("id2").name, "user2@ldap.com")
+
+        index.add(EntityProperty("gid", "group@ldap.com", "LDAP_GROUP"))
+        index.set_members("gid", "User", ["id1", "id2"])
+        self.assertEqual(index.get_members("gid", "User"), {"id1", "id2"})
+
+        index.remove("id1")
+        self.assertNotIn("id1", index)
+        self.assertIsNone(index.get_by_name("user1@ldap.com"))
+        self.assertIsNone(index.get_by_name("user1@ldap.com", 1))
+        self.assertEqual(index.get_members("gid", "User"), {"id2"})
+
     def test_invalid_guids_filtering_before_call(self):
         """Tests invalid guids are filtered before making API calls. As making
            API calls with empty guid list is valid these calls should succeed.
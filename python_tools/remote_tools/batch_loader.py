@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# Copyright: ThoughtSpot Inc 2024
+"""
+This client loads all the data files found under a directory into
+ThoughtSpot through the ETL HTTP Server, the way the load_files script does
+with tsload on the appliance. Files are mapped to tables by their location
+and name, and each table is loaded in a load cycle of its own, several
+tables at the same time. Since it only talks to the ETL HTTP Server, it can
+be run from a remote machine.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from getpass import getpass
+import json
+import os
+import re
+import sys
+import time
+
+import requests
+
+import data_importer_client as dic
+
+# region FILE_MAPPING
+# Following methods map data files to tables using the conventions of the
+# load_files script and load.cfg.
+
+def listDataFiles(data_dir, extension, exclude_pattern=None, ignore_dirs=()):
+    """
+    List the data files to load under a directory and its direct
+    sub-directories, like `find DATA_DIR -maxdepth 2` in load_files.
+    Args:
+        data_dir (str): Root directory of the data files.
+        extension (str): Extension of the data files, matched ignoring case.
+        exclude_pattern (str): Files ending with this pattern are skipped.
+        ignore_dirs (list): Sub-directories whose files are skipped.
+    Returns:
+        list: Paths of the files relative to data_dir, sorted.
+    """
+    extension = extension.lower()
+    exclude_pattern = exclude_pattern.lower() if exclude_pattern else None
+    file_names = []
+    for dir_path, dir_names, names in os.walk(data_dir):
+        rel_dir = os.path.relpath(dir_path, data_dir)
+        if rel_dir != '.':
+            # Only one level of sub-directories holds data.
+            del dir_names[:]
+            if rel_dir in ignore_dirs:
+                continue
+        for name in names:
+            lower_name = name.lower()
+            if not lower_name.endswith(extension):
+                continue
+            if exclude_pattern and lower_name.endswith(exclude_pattern):
+                continue
+            file_names.append(name if rel_dir == '.'
+                              else rel_dir + '/' + name)
+    return sorted(file_names)
+
+def mapFileToTable(file_name, default_schema, extension, strip_patterns=()):
+    """
+    Get the target of a data file like load_a_file of load_files does. The
+    sub-directory of the file is the schema, else the default schema is used.
+    The table name is the file name without the extension, anything after a
+    '-', the _full/_incremental markers and the strip patterns.
+    Args:
+        file_name (str): Path of the file relative to the data directory.
+        default_schema (str): Schema of files not in a sub-directory.
+        extension (str): Extension of the data files.
+        strip_patterns (list): Regular expressions removed from the file name,
+                               like SED_PATTERNS of load.cfg.
+    Returns:
+        tuple: Schema name, table name and whether the file asks for the
+               table to be emptied (True for _full, False for _incremental,
+               None otherwise).
+    """
+    if '/' in file_name:
+        schema_name, file_name = file_name.split('/', 1)
+    else:
+        schema_name = default_schema
+    empty_target = None
+    if '_full' in file_name:
+        empty_target = True
+    elif '_incremental' in file_name:
+        empty_target = False
+    table_name = re.sub(re.escape(extension), '', file_name, count=1,
+                        flags=re.IGNORECASE)
+    table_name = table_name.split('-', 1)[0]
+    table_name = table_name.replace('_full', '', 1)
+    table_name = table_name.replace('_incremental', '', 1)
+    for pattern in strip_patterns:
+        table_name = re.sub(pattern, '', table_name, count=1)
+    return schema_name, table_name, empty_target
+
+def groupFilesByTable(args):
+    """
+    Group the data files to load by their target table.
+    Args:
+        args (dict): Parsed command line arguments.
+    Returns:
+        dict: (schema name, table name) to a dict with the paths of the files
+              and whether the table is emptied before loading.
+    """
+    tables = {}
+    for file_name in listDataFiles(args.data_dir, args.extension,
+                                   args.exclude_pattern, args.ignore_dirs):
+        schema_name, table_name, empty_target = mapFileToTable(
+            file_name, args.target_schema, args.extension,
+            args.strip_patterns)
+        table = tables.setdefault((schema_name, table_name), {
+            'files': [], 'empty_target': args.empty_target})
+        table['files'].append(os.path.join(args.data_dir, file_name))
+        # One file loaded as _full empties the table for the whole cycle.
+        if empty_target is not None and not table['empty_target']:
+            table['empty_target'] = empty_target
+    return tables
+
+# endregion FILE_MAPPING
+
+def sendTable(args, schema_name, table_name, table):
+    """
+    Send the files of a table in a load cycle of its own and commit it,
+    without waiting for the load to finish.
+    Args:
+        args (dict): Parsed command line arguments.
+        schema_name (str): Name of target schema.
+        table_name (str): Name of target table.
+        table (dict): Files of the table and whether to empty it.
+    Returns:
+        dict: Result of the load of the table, along with the session, the
+              host and port of the node the cycle was scheduled on, None if
+              it was not committed, and the time the load started.
+    """
+    load = {'result': {'schema': schema_name, 'table': table_name,
+                       'files': table['files'], 'cycle_id': None,
+                       'status': None, 'error': None},
+            'session': requests.Session(), 'hostport': None,
+            'start_time': time.time()}
+    result = load['result']
+    session = load['session']
+    base_hostport = args.cluster_host + ':' + str(args.service_port)
+    table_args = argparse.Namespace(**vars(args))
+    table_args.target_schema = schema_name
+    table_args.target_table = table_name
+    table_args.empty_target = table['empty_target']
+    try:
+        dic.login(session, base_hostport, args.username, args.password)
+        load_hostport, cycle_id = dic.startLoad(
+            session, base_hostport, dic.makeLoadParams(table_args))
+        result['cycle_id'] = cycle_id
+        if load_hostport != base_hostport:
+            dic.login(session, load_hostport, args.username, args.password)
+        sent = dic.loadFiles(session, load_hostport, cycle_id, table['files'],
+                             args.parallel, **dic.makeLoadArgs(args))
+        failed_files = [file_name for file_name, error in sent.items()
+                        if error is not None]
+        if failed_files:
+            dic.cancelLoad(session, load_hostport, cycle_id)
+            raise Exception('Load cancelled, failed to send data from: '
+                            + ', '.join(failed_files))
+        dic.commitLoad(session, load_hostport, cycle_id)
+        load['hostport'] = load_hostport
+    except Exception as e:  # pylint: disable=broad-except
+        print('Load of', schema_name + '.' + table_name, 'failed:', str(e))
+        result['error'] = str(e)
+        result['seconds'] = round(time.time() - load['start_time'], 2)
+    return load
+
+def finishTable(args, load, status):
+    """
+    Record the final status of the load of a table, and save its bad records.
+    Args:
+        args (dict): Parsed command line arguments.
+        load (dict): Load of the table as returned by sendTable.
+        status (dict): Final status response received from server.
+    """
+    result = load['result']
+    try:
+        if int(status.get('ignored_row_count', 0)) > 0 and args.bad_records_dir:
+            bad_records_file = os.path.join(
+                args.bad_records_dir, '{}.{}.bad_records.txt.gz'.format(
+                    result['schema'], result['table']))
+            result['bad_records'] = dic.downloadBadRecords(
+                load['session'], load['hostport'], result['cycle_id'],
+                bad_records_file)
+        result['status'] = dic.AlterStatus(status)
+    except Exception as e:  # pylint: disable=broad-except
+        print('Load of', result['schema'] + '.' + result['table'], 'failed:',
+              str(e))
+        result['error'] = str(e)
+    result['seconds'] = round(time.time() - load['start_time'], 2)
+
+def waitForTables(args, loads):
+    """
+    Wait for the committed load cycles of the tables from one polling loop,
+    finishing each table as soon as its cycle reaches its final state.
+    Args:
+        args (dict): Parsed command line arguments.
+        loads (list): Loads of the tables as returned by sendTable.
+    """
+    committed = {load['result']['cycle_id']: load for load in loads
+                 if load['hostport'] is not None}
+    session = requests.Session()
+    for hostport in sorted({load['hostport'] for load in committed.values()}):
+        try:
+            dic.login(session, hostport, args.username, args.password)
+        except Exception as e:  # pylint: disable=broad-except
+            for cycle_id, load in list(committed.items()):
+                if load['hostport'] == hostport:
+                    del committed[cycle_id]
+                    load['result']['error'] = str(e)
+                    load['result']['seconds'] = round(
+                        time.time() - load['start_time'], 2)
+    try:
+        for cycle_id, status in dic.iterFinishedCycles(
+                session, None, {cycle_id: load['hostport'] for cycle_id, load
+                                in committed.items()},
+                args.min_poll_interval, args.max_poll_interval,
+                timeout=args.poll_timeout):
+            finishTable(args, committed.pop(cycle_id), status)
+    except TimeoutError as e:
+        print(str(e))
+        for load in committed.values():
+            load['result']['error'] = str(e)
+            load['result']['seconds'] = round(
+                time.time() - load['start_time'], 2)
+
+def isLoadSuccessful(result):
+    """
+    Check whether the load of a table succeeded.
+    Args:
+        result (dict): Result of the load of the table.
+    """
+    status = result['status']
+    return (result['error'] is None and status is not None
+            and status.get('status', {}).get('code', 'OK') == 'OK')
+
+def printSummary(results):
+    """
+    Print one line per table loaded.
+    Args:
+        results (list): Results of the loads of the tables.
+    """
+    print('Load summary:')
+    for result in results:
+        status = result['status'] or {}
+        print('{:<7} {}.{}: {} file(s), {} rows written, {} rows ignored, '
+              '{:.2f} sec{}'.format(
+                  'OK' if isLoadSuccessful(result) else 'FAILED',
+                  result['schema'], result['table'], len(result['files']),
+                  status.get('rows_written', 0),
+                  status.get('ignored_row_count', 0), result['seconds'],
+                  ', ' + result['error'] if result['error'] else ''))
+        if 'bad_records' in result:
+            dic.printBadRecordsSummary(result['bad_records'])
+
+def parseCmd(argv):
+    """
+    Parse command line arguments.
+    Args:
+        argv (list): List of command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Load the data files of a directory into Thoughtspot '
+                    'cluster using data importer REST service, one load cycle '
+                    'per table.')
+    dic.addLoginArguments(parser)
+    parser.add_argument(
+        '--target_database', required=True,
+        help='Name of target database.'
+    )
+    parser.add_argument(
+        '--target_schema', default='falcon_default_schema',
+        help='Name of schema of the files which are not in a sub-directory. '
+             'Files in a sub-directory are loaded into the schema named after '
+             'it.'
+    )
+    parser.add_argument(
+        '--data_dir', required=True,
+        help='Directory holding the files to load, directly or in a '
+             'sub-directory per schema.'
+    )
+    parser.add_argument(
+        '--extension', default='.csv',
+        help='Extension of the files to load. Default is .csv.'
+    )
+    parser.add_argument(
+        '--exclude_pattern',
+        help='Files ending with this pattern are not loaded, e.g. _del.csv.'
+    )
+    parser.add_argument(
+        '--ignore_dirs', nargs='*', default=[],
+        help='Space separated list of sub-directories whose files are not '
+             'loaded.'
+    )
+    parser.add_argument(
+        '--strip_patterns', nargs='*', default=[],
+        help='Space separated list of regular expressions removed from the '
+             'file names to get the table names, e.g. "_0.*".'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=4,
+        help='Number of tables whose files are sent at the same time. Tables '
+             'are then waited for together. Default is 4.'
+    )
+    parser.add_argument(
+        '--bad_records_dir',
+        help='When set, bad records of the tables are saved in this directory.'
+    )
+    parser.add_argument(
+        '--results_file',
+        help='When set, results of the loads are written to this file as JSON.'
+    )
+    dic.addLoadArguments(parser)
+    args = parser.parse_args(argv[1:])
+    dic.checkLoadArguments(parser, args)
+    return args
+
+def main(argv):
+    """
+    Load the data files of a directory using arguments provided in command
+    line.
+    Args:
+        argv (list): List of command line arguments.
+    """
+    start_time = time.time()
+    args = parseCmd(argv)
+    if args.password is None:
+        args.password = getpass('Password for user ' + args.username + ': ')
+    tables = groupFilesByTable(args)
+    if not tables:
+        print('No', args.extension, 'files found in', args.data_dir)
+        return
+    print('Loading', sum(len(table['files']) for table in tables.values()),
+          'file(s) into', len(tables), 'table(s).')
+    if args.bad_records_dir:
+        os.makedirs(args.bad_records_dir, exist_ok=True)
+    # Workers only send and commit, the loads are then waited for together so
+    # that a table waiting for its load does not hold a worker.
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [executor.submit(sendTable, args, schema_name, table_name,
+                                   table)
+                   for (schema_name, table_name), table in tables.items()]
+        loads = [future.result() for future in futures]
+    waitForTables(args, loads)
+    results = [load['result'] for load in loads]
+    printSummary(results)
+    if args.results_file:
+        with open(args.results_file, 'w') as f:
+            json.dump(results, f, indent=2)
+    print('Time taken:', '%.2f' % (time.time() - start_time), 'seconds')
+    if not all(isLoadSuccessful(result) for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# Copyright: ThoughtSpot Inc 2024
+"""
+Unit tests of batch_loader.py: mapping data files to tables like load_files
+does with load.cfg, and waiting for the load cycles of the tables.
+
+Example command:
+
+>>> python batch_loader_test.py
+"""
+
+import argparse
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import batch_loader as bl
+import data_importer_client as dic
+
+
+class TestFileMapping(unittest.TestCase):
+
+    def test_map_file_to_table(self):
+        """Tests file names are mapped to tables like load_a_file does."""
+        cases = [
+            # file name, strip patterns, expected schema, table, empty_target
+            ('orders.csv', [], 'dflt', 'orders', None),
+            ('orders.CSV', [], 'dflt', 'orders', None),
+            ('orders-20240101.csv', [], 'dflt', 'orders', None),
+            ('orders-part-1.csv', [], 'dflt', 'orders', None),
+            ('orders_full.csv', [], 'dflt', 'orders', True),
+            ('orders_incremental.csv', [], 'dflt', 'orders', False),
+            ('orders_full-20240101.csv', [], 'dflt', 'orders', True),
+            ('sales/orders.csv', [], 'sales', 'orders', None),
+            ('sales/orders_incremental-2.csv', [], 'sales', 'orders', False),
+            ('orders_0001.csv', ['_0.*'], 'dflt', 'orders', None),
+            ('orders_20240101.csv', ['_[0-9]+$', '^x'], 'dflt', 'orders',
+             None),
+        ]
+        for file_name, strip_patterns, schema, table, empty_target in cases:
+            with self.subTest(file_name=file_name):
+                self.assertEqual(
+                    bl.mapFileToTable(file_name, 'dflt', '.csv',
+                                      strip_patterns),
+                    (schema, table, empty_target))
+
+    def test_list_data_files(self):
+        """Tests files are listed up to one level of sub-directories, like
+           find -maxdepth 2, skipping other extensions, excluded files and
+           ignored directories.
+        """
+        with tempfile.TemporaryDirectory() as data_dir:
+            for file_name in ['a.csv', 'b.CSV', 'c.txt', 'd_del.csv',
+                              'sales/e.csv', 'sales/deep/f.csv',
+                              'skipped/g.csv']:
+                path = os.path.join(data_dir, file_name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write('1\n')
+            cases = [
+                # exclude pattern, ignored directories, expected files
+                (None, (), ['a.csv', 'b.CSV', 'd_del.csv', 'sales/e.csv',
+                            'skipped/g.csv']),
+                ('_DEL.csv', ('skipped',), ['a.csv', 'b.CSV', 'sales/e.csv']),
+            ]
+            for exclude_pattern, ignore_dirs, expected in cases:
+                with self.subTest(exclude_pattern=exclude_pattern):
+                    self.assertEqual(
+                        bl.listDataFiles(data_dir, '.csv', exclude_pattern,
+                                         ignore_dirs),
+                        expected)
+
+
+class TestWaitForTables(unittest.TestCase):
+
+    ARGS = argparse.Namespace(username='u', password='p',
+                              min_poll_interval=0.01, max_poll_interval=0.02,
+                              poll_timeout=None, bad_records_dir=None)
+
+    @staticmethod
+    def makeLoad(table, hostport='node1:8442'):
+        return {'result': {'schema': 's', 'table': table, 'files': [],
+                           'cycle_id': table if hostport else None,
+                           'status': None, 'error': None},
+                'session': None, 'hostport': hostport, 'start_time': 0}
+
+    def waitForTables(self, loads, statuses, args=ARGS):
+        """Waits for the loads with the status responses of each cycle."""
+        def get_status(session, hostport, cycle_id):
+            response = mock.Mock()
+            response.json.return_value = statuses[cycle_id].pop(0)
+            return response
+
+        with mock.patch.object(dic, 'login') as login, \
+                mock.patch.object(dic, 'getStatus', get_status):
+            bl.waitForTables(args, loads)
+        return login
+
+    def test_wait_for_tables(self):
+        """Tests the committed cycles are polled together, logging in once
+           per node, while tables not committed are left as they are.
+        """
+        loads = [self.makeLoad('t1'), self.makeLoad('t2', 'node2:8442'),
+                 self.makeLoad('t3', None)]
+        statuses = {
+            't1': [{'internal_stage': 'INGESTING'},
+                   {'internal_stage': 'DONE', 'rows_written': 5}],
+            't2': [{'internal_stage': 'COMMITTING',
+                    'status': {'code': 'LOAD_FAILED'}}],
+        }
+        login = self.waitForTables(loads, statuses)
+        self.assertEqual(sorted(call.args[1] for call in login.call_args_list),
+                         ['node1:8442', 'node2:8442'])
+        results = [load['result'] for load in loads]
+        self.assertEqual(results[0]['status']['internal_stage'], 'DONE')
+        self.assertTrue(bl.isLoadSuccessful(results[0]))
+        self.assertFalse(bl.isLoadSuccessful(results[1]))
+        self.assertIsNone(results[2]['status'])
+        self.assertEqual(statuses, {'t1': [], 't2': []})
+
+    def test_wait_for_tables_timeout(self):
+        """Tests tables not loaded once the timeout is over are failed."""
+        loads = [self.makeLoad('t1'), self.makeLoad('t2')]
+        statuses = {'t1': [{'internal_stage': 'DONE'}],
+                    't2': [{'internal_stage': 'INGESTING'}] * 100}
+        args = argparse.Namespace(**vars(self.ARGS))
+        args.poll_timeout = 0.1
+        self.waitForTables(loads, statuses, args)
+        self.assertTrue(bl.isLoadSuccessful(loads[0]['result']))
+        self.assertIn('not finished', loads[1]['result']['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,15 +9,24 @@ using ThoughtSpot credentials.
 """
 
 import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from getpass import getpass
+import gzip
 import json
+import os
 import pprint
+import random
+import re
 import sys
 import time
 import urllib
+import uuid
+import zlib
 import urllib3
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests_toolbelt import MultipartEncoder
 
 # Disable warning that comes due to using verify=False in all the calls
@@ -112,26 +121,237 @@ def startLoad(session, hostport, load_params):
         raise Exception('Start request failed. Response: ' + response.text)
     return getCycleDetails(hostport, response)
 
-def load(session, hostport, cycle_id, file_path):
+# Size of the blocks source files are read and compressed in.
+READ_BLOCK_SIZE = 1024 * 1024
+
+class FileRange:
+    """
+    Read only file object over the bytes [start, end) of a file, optionally
+    preceded by a prefix, e.g. the header row of the file. Its length is the
+    number of bytes still to read, which is what MultipartEncoder expects of
+    objects without fileno, so that it can stream them.
+    """
+
+    def __init__(self, f, start, end, prefix=b''):
+        """
+        Args:
+            f (file): Source file opened in binary mode.
+            start (int): Offset of the first byte of the range.
+            end (int): Offset past the last byte of the range.
+            prefix (bytes): Bytes read before the range.
+        """
+        self.f = f
+        self.start = start
+        self.end = end
+        self.prefix = prefix
+        self.pos = 0
+        self.f.seek(start)
+
+    def __len__(self):
+        return len(self.prefix) + self.end - self.start - self.pos
+
+    def tell(self):
+        """
+        Get the number of bytes read so far.
+        """
+        return self.pos
+
+    def read(self, size=-1):
+        """
+        Read up to size bytes, all the remaining ones if size is negative.
+        Args:
+            size (int): Maximum number of bytes to read.
+        """
+        remaining = len(self)
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = b''
+        if self.pos < len(self.prefix):
+            data = self.prefix[self.pos:self.pos + size]
+        if len(data) < size:
+            data += self.f.read(size - len(data))
+        self.pos += len(data)
+        return data
+
+    def blocks(self):
+        """
+        Generate the bytes of the range in blocks of READ_BLOCK_SIZE.
+        """
+        while True:
+            block = self.read(READ_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+def splitFile(file_path, chunk_size):
+    """
+    Split a file into ranges of about chunk_size bytes ending on row
+    boundaries, i.e. after a newline. Only the bytes around the boundaries
+    are read. Rows are assumed not to contain newlines, hence files with
+    enclosed fields are not split, see checkLoadArguments.
+    Args:
+        file_path (str): Path of source data file.
+        chunk_size (int): Size of the ranges in bytes, None or 0 for one range
+                          spanning the file.
+    Returns:
+        list: (start, end) offsets of the ranges.
+    """
+    size = os.path.getsize(file_path)
+    if not chunk_size:
+        return [(0, size)]
+    offsets = [0]
+    with open(file_path, 'rb') as f:
+        while offsets[-1] + chunk_size < size:
+            f.seek(offsets[-1] + chunk_size)
+            f.readline()
+            if f.tell() >= size:
+                break
+            offsets.append(f.tell())
+    return list(zip(offsets, offsets[1:] + [size]))
+
+def gzipStream(blocks):
+    """
+    Gzip compress a stream of bytes on the fly.
+    Args:
+        blocks (iterable): Blocks of bytes to compress.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def multipartStream(field, file_name, content_type, blocks):
+    """
+    Generate a multipart/form-data body holding a single file, for contents
+    whose size is not known upfront. The body is sent with chunked transfer
+    encoding.
+    Args:
+        field (str): Name of the form field.
+        file_name (str): Name of the file sent.
+        content_type (str): Content type of the file.
+        blocks (iterable): Blocks of bytes of the file.
+    Returns:
+        tuple: Content type header value and generator of the body.
+    """
+    boundary = uuid.uuid4().hex
+
+    def body():
+        yield ('--{}\r\nContent-Disposition: form-data; name="{}"; '
+               'filename="{}"\r\nContent-Type: {}\r\n\r\n'.format(
+                   boundary, field, file_name, content_type).encode())
+        yield from blocks
+        yield '\r\n--{}--\r\n'.format(boundary).encode()
+
+    return 'multipart/form-data; boundary=' + boundary, body()
+
+def loadChunk(session, hostport, cycle_id, chunk, compress=False):
     """
-    Send data load request to ETL HTTP Server.
+    Send data load request for a range of a source file to ETL HTTP Server.
+    Args:
+        session (Session): Object to hold and persist session cookie.
+        hostport (str): Host and port of the ETL HTTP Server separated by colon.
+        cycle_id (str): Unique identifier of load cycle.
+        chunk (FileRange): Range of the source file to send.
+        compress (bool): Gzip compress the data while sending it.
+    """
+    if compress:
+        content_type, data = multipartStream(
+            'documents', 'filename.gz', 'application/gzip',
+            gzipStream(chunk.blocks()))
+    else:
+        data = MultipartEncoder({
+            "documents": ('filename', chunk, "application/octet-stream"),
+        })
+        content_type = data.content_type
+    headers = {"Content-Type": content_type}
+    response = session.post(getLoadsUrl(
+        hostport, cycle_id), headers=headers, data=data, verify=False)
+    if response.status_code // 100 != 2:  # 2xx response code
+        raise Exception('Load request failed. Response: ' + response.text)
+
+def load(session, hostport, cycle_id, file_path, chunk_size=None,
+         compress=False, retries=0, has_header_row=False):
+    """
+    Send data load request to ETL HTTP Server. A file larger than chunk_size
+    is sent as several chunks split on row boundaries, each with a request of
+    its own into the same load cycle, so that a failed request only needs
+    that chunk to be sent again. Files are streamed from disk and never read
+    into memory as a whole.
     Args:
         session (Session): Object to hold and persist session cookie.
         hostport (str): Host and port of the ETL HTTP Server separated by colon.
         cycle_id (str): Unique identifier of load cycle.
         file_path (str): Path of source data file.
+        chunk_size (int): Size of the chunks in bytes, None to send the file
+                          with one request.
+        compress (bool): Gzip compress the chunks while sending them.
+        retries (int): Number of times a failed chunk is sent again. Only
+                       applies when the file is sent in several chunks, as
+                       resending a whole file could load rows twice.
+        has_header_row (bool): Whether the file starts with a header row,
+                               which is then repeated at the start of every
+                               chunk.
     """
+    ranges = splitFile(file_path, chunk_size)
+    if len(ranges) == 1:
+        retries = 0
     with open(file_path, 'rb') as f:
-        form = MultipartEncoder({
-            "documents": ('filename', f, "application/octet-stream"),
-        })
-        headers = {"Content-Type": form.content_type}
-        response = session.post(getLoadsUrl(
-            hostport, cycle_id), headers=headers, data=form, verify=False)
-        if response.status_code // 100 != 2:  # 2xx response code
-            raise Exception('Load request failed. Response: ' + response.text)
+        header = f.readline() if has_header_row and len(ranges) > 1 else b''
+        for chunk_no, (start, end) in enumerate(ranges, 1):
+            prefix = header if start > 0 else b''
+            for attempt in range(retries + 1):
+                try:
+                    loadChunk(session, hostport, cycle_id,
+                              FileRange(f, start, end, prefix), compress)
+                    break
+                except Exception as e:  # pylint: disable=broad-except
+                    if attempt == retries:
+                        raise
+                    print('Chunk', chunk_no, 'of', file_path, 'failed, will '
+                          'send it again after', 2 ** attempt, 'sec:', str(e))
+                    time.sleep(2 ** attempt)
+            if len(ranges) > 1:
+                print('Chunk', chunk_no, 'of', len(ranges), 'of', file_path,
+                      'sent to server.')
     print('Data from', file_path, 'sent to server successfully.')
 
+def loadFiles(session, hostport, cycle_id, file_paths, parallel=1,
+              **load_args):
+    """
+    Send data load requests for several files to ETL HTTP Server, up to
+    parallel of them at a time. All the files are loaded into the same load
+    cycle, over a connection pool of the session holding at most parallel
+    connections. A failed file does not stop the others from being sent.
+    Args:
+        session (Session): Object to hold and persist session cookie.
+        hostport (str): Host and port of the ETL HTTP Server separated by colon.
+        cycle_id (str): Unique identifier of load cycle.
+        file_paths (list): Paths of source data files.
+        parallel (int): Maximum number of files sent at the same time.
+        load_args (dict): Keyword arguments of load, e.g. chunk_size.
+    Returns:
+        dict: Path of each file to None if it was sent successfully, else to
+              the exception its load request failed with.
+    """
+    parallel = max(1, min(parallel, len(file_paths)))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=parallel,
+                          pool_block=True)
+    session.mount(getBaseUrl(hostport), adapter)
+
+    def loadFile(file_path):
+        try:
+            load(session, hostport, cycle_id, file_path, **load_args)
+            return None
+        except Exception as e:  # pylint: disable=broad-except
+            print('Data from', file_path, 'failed to load:', str(e))
+            return e
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = executor.map(loadFile, file_paths)
+        return dict(zip(file_paths, results))
+
 def commitLoad(session, hostport, cycle_id):
     """
     Send commit load request to ETL HTTP Server.
@@ -174,21 +394,103 @@ def getStatus(session, hostport, cycle_id):
         raise Exception('Status request failed. Response: ' + response.text)
     return response
 
-def getBadRecords(session, hostport, cycle_id):
+def getBadRecords(session, hostport, cycle_id, stream=False):
     """
     Send get bad records request to ETL HTTP Server.
     Args:
         session (Session): Object to hold and persist session cookie.
         hostport (str): Host and port of the ETL HTTP Server separated by colon.
         cycle_id (str): Unique identifier of load cycle.
+        stream (bool): Do not read the records until asked for, e.g. with
+                       response.iter_content.
     """
     response = session.get((getLoadsUrl(hostport, cycle_id)
-                            + '/bad_records_file'), verify=False)
+                            + '/bad_records_file'), verify=False,
+                           stream=stream)
     if response.status_code // 100 != 2: # 2xx response code
         raise Exception('Bad records request failed. Response: '
                         + response.text)
     return response
 
+# Lines of bad records giving the reason records were rejected, e.g.
+# "Error: Parsing failed for column c1". The group is the reason.
+BAD_RECORD_REASON_RE = re.compile(r'(?i)^\s*#?\s*(?:error|reason)\w*\s*:\s*(.+)$')
+# Maximum number of different rejection reasons counted, the others are
+# counted as OTHER_REASONS so that memory does not grow with the records.
+MAX_BAD_RECORD_REASONS = 100
+OTHER_REASONS = '<other reasons>'
+# Size of the blocks bad records are downloaded in.
+BAD_RECORDS_BLOCK_SIZE = 64 * 1024
+
+def downloadBadRecords(session, hostport, cycle_id, file_path,
+                       reason_re=BAD_RECORD_REASON_RE):
+    """
+    Stream the bad records of a load cycle to a file, gzip compressed if the
+    file name ends with .gz, without holding them in memory. Rejection reasons
+    found in the records are counted on the way.
+    Args:
+        session (Session): Object to hold and persist session cookie.
+        hostport (str): Host and port of the ETL HTTP Server separated by colon.
+        cycle_id (str): Unique identifier of load cycle.
+        file_path (str): Path of the file to write the bad records to.
+        reason_re (Pattern): Regular expression matching the lines giving a
+                             rejection reason, with the reason as first group.
+    Returns:
+        dict: Summary of the bad records with the number of bytes and lines
+              downloaded, and the count of each rejection reason.
+    """
+    response = getBadRecords(session, hostport, cycle_id, stream=True)
+    opener = gzip.open if file_path.endswith('.gz') else open
+    reasons = Counter()
+    summary = {'file': file_path, 'bytes': 0, 'lines': 0}
+    # Part of the last line of the previous block, if not ended yet.
+    partial_line = b''
+    # Whether the last line is too long to be held on to and is skipped.
+    skipping = False
+
+    def countReason(line):
+        match = reason_re.match(line.decode('utf-8', 'replace'))
+        if match is None:
+            return
+        reason = match.group(1).strip()
+        if reason not in reasons and len(reasons) >= MAX_BAD_RECORD_REASONS:
+            reason = OTHER_REASONS
+        reasons[reason] += 1
+
+    with response, opener(file_path, 'wb') as f:
+        for block in response.iter_content(BAD_RECORDS_BLOCK_SIZE):
+            f.write(block)
+            summary['bytes'] += len(block)
+            lines = (partial_line + block).split(b'\n')
+            partial_line = lines.pop()
+            if skipping and lines:
+                lines[0] = b''
+                skipping = False
+            summary['lines'] += len(lines)
+            for line in lines:
+                countReason(line)
+            if len(partial_line) > BAD_RECORDS_BLOCK_SIZE:
+                # Do not hold on to overly long lines, their reason is lost.
+                partial_line = b''
+                skipping = True
+    if partial_line or skipping:
+        summary['lines'] += 1
+        countReason(partial_line)
+    summary['reasons'] = dict(reasons.most_common())
+    return summary
+
+def printBadRecordsSummary(summary):
+    """
+    Print the summary of the bad records of a load cycle.
+    Args:
+        summary (dict): Summary returned by downloadBadRecords.
+    """
+    print('Bad records written to', summary['file'] + ':',
+          formatCount(summary['lines']), 'lines,',
+          formatSize(summary['bytes']))
+    for reason, count in summary['reasons'].items():
+        print('%8s  %s' % (formatCount(count), reason))
+
 def cancelLoad(session, hostport, cycle_id):
     """
     Send cancel load request to ETL HTTP Server.
@@ -203,6 +505,136 @@ def cancelLoad(session, hostport, cycle_id):
         raise Exception('Cancel request failed. Response: ' + response.text)
     return response
 
+def isLoadFinished(status):
+    """
+    Check whether a load cycle reached its final state.
+    Args:
+        status (dict): Status response received from server.
+    """
+    # A failed load may not report its stage, hence the code is checked
+    # first.
+    if status.get('status', {}).get('code', 'OK') != 'OK':
+        return True
+    return status.get('internal_stage') == 'DONE'
+
+# Default bounds in seconds of the interval between status requests.
+MIN_POLL_INTERVAL = 1
+MAX_POLL_INTERVAL = 60
+
+def iterFinishedCycles(session, hostport, cycle_ids,
+                       min_interval=MIN_POLL_INTERVAL,
+                       max_interval=MAX_POLL_INTERVAL, backoff=2, jitter=0.2,
+                       timeout=None):
+    """
+    Poll the status of several load cycles from one loop, and generate each
+    of them as soon as it reaches its final state, i.e. the load is DONE or
+    failed. A cycle is first polled after min_interval, then the interval is
+    multiplied by backoff after each poll up to max_interval, so that short
+    loads are seen finishing quickly while long ones are not polled too often.
+    Intervals are spread by +/- jitter so that cycles started together are
+    not polled together.
+    Args:
+        session (Session): Object to hold and persist session cookie.
+        hostport (str): Host and port of the ETL HTTP Server separated by colon.
+        cycle_ids (iterable): Unique identifiers of the load cycles, or dict
+                              of them to the host and port of the node they
+                              were scheduled on, if not hostport.
+        min_interval (float): Seconds to wait before the first poll.
+        max_interval (float): Maximum seconds to wait between polls.
+        backoff (float): Factor the interval grows by after each poll.
+        jitter (float): Fraction the intervals are randomly spread by.
+        timeout (float): Seconds after which to stop polling, None to poll
+                         until all the cycles are finished.
+    Yields:
+        tuple: Cycle id and its final status response received from server.
+    Raises:
+        TimeoutError: If cycles are not finished once timeout is over.
+    """
+    if not isinstance(cycle_ids, dict):
+        cycle_ids = dict.fromkeys(cycle_ids, hostport)
+    now = time.time()
+    deadline = now + timeout if timeout is not None else None
+    # Cycle id to the time of its next poll and the interval before it.
+    pending = {cycle_id: (now + min_interval, min_interval)
+               for cycle_id in cycle_ids}
+    while pending:
+        cycle_id = min(pending, key=lambda cid: pending[cid][0])
+        poll_time, interval = pending[cycle_id]
+        if deadline is not None and poll_time > deadline:
+            raise TimeoutError(
+                'Load cycle(s) {} not finished after {} seconds'.format(
+                    ', '.join(sorted(pending)), timeout))
+        time.sleep(max(0, poll_time - time.time()))
+        interval = min(max_interval, interval * backoff)
+        pending[cycle_id] = (
+            time.time() + interval * random.uniform(1 - jitter, 1 + jitter),
+            interval)
+        response = None
+        try:
+            response = getStatus(session, cycle_ids[cycle_id] or hostport,
+                                 cycle_id)
+        except Exception as e:
+            print('getStatus of', cycle_id, 'failed with exception:', str(e))
+            continue
+        try:
+            status = response.json()
+            finished = isLoadFinished(status)
+        except Exception as e:
+            print('Failed to parse status response:', response.text)
+            print('Error:', str(e))
+            continue
+        if finished:
+            del pending[cycle_id]
+            yield cycle_id, status
+        else:
+            print('Load', cycle_id, 'is in progress, stage',
+                  status.get('internal_stage'))
+
+def wait_for_cycles(session, hostport, cycle_ids,
+                    min_interval=MIN_POLL_INTERVAL,
+                    max_interval=MAX_POLL_INTERVAL, timeout=None):
+    """
+    Wait for several load cycles to reach their final state. See
+    iterFinishedCycles for how they are polled.
+    Args:
+        session (Session): Object to hold and persist session cookie.
+        hostport (str): Host and port of the ETL HTTP Server separated by colon.
+        cycle_ids (iterable): Unique identifiers of the load cycles, or dict
+                              of them to the host and port of their node.
+        min_interval (float): Seconds to wait before the first poll.
+        max_interval (float): Maximum seconds to wait between polls.
+        timeout (float): Seconds after which to give up, None to wait until
+                         all the cycles are finished.
+    Returns:
+        dict: Cycle id to its final status response received from server.
+    Raises:
+        TimeoutError: If cycles are not finished once timeout is over.
+    """
+    return dict(iterFinishedCycles(session, hostport, cycle_ids,
+                                   min_interval, max_interval,
+                                   timeout=timeout))
+
+def waitForLoad(session, hostport, cycle_id, min_interval=MIN_POLL_INTERVAL,
+                max_interval=MAX_POLL_INTERVAL, timeout=None):
+    """
+    Wait for a load cycle to reach its final state, i.e. the load is DONE or
+    failed.
+    Args:
+        session (Session): Object to hold and persist session cookie.
+        hostport (str): Host and port of the ETL HTTP Server separated by colon.
+        cycle_id (str): Unique identifier of load cycle.
+        min_interval (float): Seconds to wait before the first poll.
+        max_interval (float): Maximum seconds to wait between polls.
+        timeout (float): Seconds after which to give up, None to wait until
+                         the cycle is finished.
+    Returns:
+        dict: Final status response received from server.
+    Raises:
+        TimeoutError: If the cycle is not finished once timeout is over.
+    """
+    return wait_for_cycles(session, hostport, [cycle_id], min_interval,
+                           max_interval, timeout)[cycle_id]
+
 # endregion CORE_METHODS
 
 def add_param(param_dict, key, value, default=None):
@@ -377,15 +809,12 @@ def AlterStatus(status):  # pylint: disable=too-many-branches
         )
     return status
 
-def parseCmd(argv):
+def addLoginArguments(parser):
     """
-    Parse command line arguments.
+    Add the arguments needed to log in to the ETL HTTP Server.
     Args:
-        argv (list): List of command line arguments.
+        parser (ArgumentParser): Parser to add the arguments to.
     """
-    parser = argparse.ArgumentParser(
-        description='Load data into Thoughtspot cluster using data importer '
-                    'REST service.')
     parser.add_argument(
         '--cluster_host', default='localhost',
         help='URL of the ThoughtSpot cluster. Default is localhost.'
@@ -408,21 +837,52 @@ def parseCmd(argv):
              'password is not provided as argument then user will be prompted '
              'to enter password in stdin.'
     )
+
+def addLoadArguments(parser):
+    """
+    Add the arguments describing how source files are sent and parsed.
+    Args:
+        parser (ArgumentParser): Parser to add the arguments to.
+    """
+    parser.add_argument(
+        '--parallel', type=int, default=1,
+        help='Number of source files sent to the server at the same time. '
+             'Default is 1, i.e. one file after the other.'
+    )
     parser.add_argument(
-        '--target_database', required=True,
-        help='Name of target database.'
+        '--chunk_size_mb', type=int,
+        help='When set, source files larger than this many MiB are split on '
+             'row boundaries and sent in chunks of about this size, each with '
+             'a request of its own. Rows must not contain newlines, hence it '
+             'cannot be used with --enclosing_character.'
     )
     parser.add_argument(
-        '--target_schema', default='falcon_default_schema',
-        help='Name of target schema.'
+        '--compress', dest='compress', action='store_true',
+        help='When set, source data is gzip compressed while being sent. The '
+             'server must accept gzip compressed source files.'
     )
+    parser.set_defaults(compress=False)
     parser.add_argument(
-        '--target_table', required=True,
-        help='Name of target table.'
+        '--retries', type=int, default=3,
+        help='Number of times a chunk which failed to be sent is sent '
+             'again, when files are sent in chunks. Files sent whole are not '
+             'sent again. Default is 3.'
     )
     parser.add_argument(
-        '--source_files', nargs='+', required=True,
-        help='Space separated list of files containing source data.'
+        '--min_poll_interval', type=float, default=MIN_POLL_INTERVAL,
+        help='Seconds to wait before the status of a load is first fetched. '
+             'The wait doubles after every fetch. Default is %d.'
+             % MIN_POLL_INTERVAL
+    )
+    parser.add_argument(
+        '--max_poll_interval', type=float, default=MAX_POLL_INTERVAL,
+        help='Maximum seconds to wait between fetches of the status of a '
+             'load. Default is %d.' % MAX_POLL_INTERVAL
+    )
+    parser.add_argument(
+        '--poll_timeout', type=float,
+        help='When set, waiting for a load to finish is given up after this '
+             'many seconds.'
     )
     parser.add_argument(
         '--max_ignored_rows', type=int,
@@ -551,9 +1011,70 @@ def parseCmd(argv):
         '--false_format',
         help='String that represents False for boolean values in input.'
     )
+
+def checkLoadArguments(parser, args):
+    """
+    Check the arguments added by addLoadArguments go together, exiting with a
+    usage error otherwise.
+    Args:
+        parser (ArgumentParser): Parser the arguments were parsed with.
+        args (dict): Parsed command line arguments.
+    """
+    # Files are split after any newline, which would cut a row whose enclosed
+    # field holds one.
+    if args.chunk_size_mb and args.enclosing_character:
+        parser.error('--chunk_size_mb cannot be used with '
+                     '--enclosing_character, as enclosed fields may hold '
+                     'newlines and files are split on every newline.')
+
+def parseCmd(argv):
+    """
+    Parse command line arguments.
+    Args:
+        argv (list): List of command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Load data into Thoughtspot cluster using data importer '
+                    'REST service.')
+    addLoginArguments(parser)
+    parser.add_argument(
+        '--target_database', required=True,
+        help='Name of target database.'
+    )
+    parser.add_argument(
+        '--target_schema', default='falcon_default_schema',
+        help='Name of target schema.'
+    )
+    parser.add_argument(
+        '--target_table', required=True,
+        help='Name of target table.'
+    )
+    parser.add_argument(
+        '--source_files', nargs='+', required=True,
+        help='Space separated list of files containing source data.'
+    )
+    parser.add_argument(
+        '--bad_records_file',
+        help='File to write the bad records of the load to, gzip compressed '
+             'if it ends with .gz. Default is <cycle_id>.bad_records.txt.'
+    )
+    addLoadArguments(parser)
     args = parser.parse_args(argv[1:])
+    checkLoadArguments(parser, args)
     return args
 
+def makeLoadArgs(args):
+    """
+    Create keyword arguments of load out of command line arguments.
+    Args:
+        args (dict): Parsed command line arguments.
+    """
+    return {'chunk_size': (args.chunk_size_mb * 1024 * 1024
+                           if args.chunk_size_mb else None),
+            'compress': args.compress,
+            'retries': args.retries,
+            'has_header_row': args.has_header_row}
+
 def main(argv):
     """
     Trigger data load using arguments provided in command line.
@@ -585,8 +1106,16 @@ def main(argv):
     #    and we call load on each of these files.
     #    This will just ingest the data and getStatus can be called anytime
     #    in between to get the actual status or any parsing errors etc.
-    for file_name in args.source_files:
-        load(session, load_hostport, cycle_id, file_name)
+    #    Files are sent --parallel at a time, and the load is committed only
+    #    once all of them were sent successfully.
+    results = loadFiles(session, load_hostport, cycle_id, args.source_files,
+                        args.parallel, **makeLoadArgs(args))
+    failed_files = [file_name for file_name, error in results.items()
+                    if error is not None]
+    if failed_files:
+        cancelLoad(session, load_hostport, cycle_id)
+        raise Exception('Load cancelled, failed to send data from: '
+                        + ', '.join(failed_files))
     # 5. Finaly, calling commitLoad will request the TS to commit the ingested
     #    data so far. Again, this just issues the request and returns.
     #    Commit will happen asynchronously and the status can be monitored
@@ -594,43 +1123,25 @@ def main(argv):
     commitLoad(session, load_hostport, cycle_id)
     # 6. Now that we have finished committing, we keep callign getStatus to
     #    know the status of the load.
-    get_bad_records = False
-    status = None
-    while True:
-        print('Will fetch status of load after 10 sec')
-        time.sleep(10)
-        response = None
-        try:
-            response = getStatus(session, load_hostport, cycle_id)
-        except Exception as e:
-            print('getStatus failed with exception:', str(e))
-            continue
-        try:
-            status = response.json()
-            # 6a. We check the ignored row counts to see if we need to fetch
-            #     the bad records from the server.
-            #     Also, if there are ignored rows, there'll be parsing errors
-            #     as part of the getStatus that one can view to see the exact
-            #     error.
-            get_bad_records = (int(status['ignored_row_count']) > 0)
-            if (status['internal_stage'] == 'DONE'
-                    or ('status' in status
-                        and 'code' in status['status']
-                        and status['status']['code'] != 'OK')):
-                print('Final load status:')
-                pprint.pprint(AlterStatus(status))
-                print('Load Params:')
-                pprint.pprint(load_params)
-                break
-            print('Load is in progress.')
-        except Exception as e:
-            print('Failed to parse status response:', response.text)
-            print('Error:', str(e))
+    status = waitForLoad(session, load_hostport, cycle_id,
+                         args.min_poll_interval, args.max_poll_interval,
+                         args.poll_timeout)
+    # 6a. We check the ignored row counts to see if we need to fetch the bad
+    #     records from the server.
+    #     Also, if there are ignored rows, there'll be parsing errors as part
+    #     of the getStatus that one can view to see the exact error.
+    get_bad_records = (int(status.get('ignored_row_count', 0)) > 0)
+    print('Final load status:')
+    pprint.pprint(AlterStatus(status))
+    print('Load Params:')
+    pprint.pprint(load_params)
     if get_bad_records:
         # 6b. If we have bad records, we send a request to the server to
-        #     fetch those records.
-        response = getBadRecords(session, load_hostport, cycle_id)
-        print('Bad records response:\n', response.text)
+        #     fetch those records, and stream them to a file.
+        bad_records_file = (args.bad_records_file
+                            or cycle_id + '.bad_records.txt')
+        printBadRecordsSummary(downloadBadRecords(
+            session, load_hostport, cycle_id, bad_records_file))
     time_taken = time.time() - start_time
     time_unit = 'seconds'
     if time_taken > 60:
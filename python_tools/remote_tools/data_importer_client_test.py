@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# Copyright: ThoughtSpot Inc 2024
+"""
+Unit tests for the data load calls of data_importer_client.py. Files are sent
+to a local HTTP server standing in for the ETL HTTP Server, which records the
+documents it receives.
+
+Example command:
+
+>>> python data_importer_client_test.py
+"""
+
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import requests
+from requests_toolbelt.multipart.decoder import MultipartDecoder
+
+import data_importer_client as dic
+
+
+class LoadHandler(BaseHTTPRequestHandler):
+    """Records the documents posted to /loads/<cycle_id>."""
+
+    def read_body(self):
+        """Reads the request body, sent with a length or chunked."""
+        if 'Content-Length' in self.headers:
+            return self.rfile.read(int(self.headers['Content-Length']))
+        body = b''
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            chunk = self.rfile.read(size + 2)[:size]
+            if size == 0:
+                return body
+            body += chunk
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.read_body()
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+        if fail:
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b'failed')
+            return
+        for part in MultipartDecoder(
+                body, self.headers['Content-Type']).parts:
+            disposition = part.headers[b'Content-Disposition'].decode()
+            content = part.content
+            if 'filename.gz' in disposition:
+                content = gzip.decompress(content)
+            with server.lock:
+                server.documents.append(content)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), LoadHandler)
+        self.server.lock = threading.Lock()
+        self.server.documents = []
+        self.server.requests = 0
+        self.server.failures = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.hostport = '127.0.0.1:%d' % self.server.server_address[1]
+        patcher = mock.patch.object(
+            dic, 'getBaseUrl', lambda hostport: 'http://' + hostport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def write_file(self, name, rows, header=b'c1,c2\n'):
+        """Writes a CSV file with rows of about 10 bytes."""
+        path = os.path.join(self.dir.name, name)
+        data = header + b''.join(b'%05d,row\n' % i for i in range(rows))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path, data
+
+    def test_load_whole_file(self):
+        """Tests a file is posted whole through MultipartEncoder."""
+        path, data = self.write_file('t.csv', 1000)
+        dic.load(self.session, self.hostport, 'cycle', path)
+        self.assertEqual(self.server.documents, [data])
+
+    def test_load_chunks(self):
+        """Tests a file is posted in chunks ending on rows, each chunk with
+           the header row.
+        """
+        path, data = self.write_file('t.csv', 1000)
+        dic.load(self.session, self.hostport, 'cycle', path, chunk_size=2000,
+                 has_header_row=True)
+        documents = self.server.documents
+        self.assertEqual(len(documents), 5)
+        for document in documents:
+            self.assertTrue(document.startswith(b'c1,c2\n'))
+            self.assertTrue(document.endswith(b'\n'))
+        self.assertEqual(documents[0] + b''.join(
+            document[len(b'c1,c2\n'):] for document in documents[1:]), data)
+
+    def test_load_compressed_chunks(self):
+        """Tests chunks are gzip compressed on the fly."""
+        path, data = self.write_file('t.csv', 1000, b'')
+        dic.load(self.session, self.hostport, 'cycle', path, chunk_size=3000,
+                 compress=True)
+        self.assertEqual(b''.join(self.server.documents), data)
+
+    def test_retry_chunks(self):
+        """Tests only a failed chunk is sent again."""
+        path, data = self.write_file('t.csv', 1000, b'')
+        self.server.failures = 1
+        dic.load(self.session, self.hostport, 'cycle', path, chunk_size=5000,
+                 retries=1)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(b''.join(self.server.documents), data)
+
+    def test_no_retry_whole_file(self):
+        """Tests a file sent whole is not sent again."""
+        path, _ = self.write_file('t.csv', 10)
+        self.server.failures = 1
+        with self.assertRaises(Exception):
+            dic.load(self.session, self.hostport, 'cycle', path, retries=3)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_load_files_parallel(self):
+        """Tests files are posted in parallel and results are per file."""
+        files = [self.write_file('t%d.csv' % i, 100 * (i + 1))
+                 for i in range(4)]
+        missing = os.path.join(self.dir.name, 'missing.csv')
+        results = dic.loadFiles(self.session, self.hostport, 'cycle',
+                                [path for path, _ in files] + [missing], 3)
+        self.assertEqual(sorted(self.server.documents),
+                         sorted(data for _, data in files))
+        self.assertIsNone(results[files[0][0]])
+        self.assertIsInstance(results[missing], Exception)
+
+
+class TestWaitForCycles(unittest.TestCase):
+
+    def test_wait_for_cycles(self):
+        """Tests cycles are polled until DONE or failed, going on polling
+           after malformed status responses.
+        """
+        statuses = {
+            'c1': [{'status': {'code': 'OK'}},
+                   {'internal_stage': 'INGESTING'},
+                   {'internal_stage': 'DONE'}],
+            'c2': [{'internal_stage': 'COMMITTING',
+                    'status': {'code': 'LOAD_FAILED'}}],
+        }
+
+        def get_status(session, hostport, cycle_id):
+            response = mock.Mock()
+            response.json.return_value = statuses[cycle_id].pop(0)
+            return response
+
+        with mock.patch.object(dic, 'getStatus', get_status):
+            final = dic.wait_for_cycles(None, 'host:1', ['c1', 'c2'],
+                                        min_interval=0.01, max_interval=0.02)
+        self.assertEqual(final['c1']['internal_stage'], 'DONE')
+        self.assertEqual(final['c2']['status']['code'], 'LOAD_FAILED')
+        self.assertEqual(statuses, {'c1': [], 'c2': []})
+
+    def test_wait_for_failed_cycle_without_stage(self):
+        """Tests a failed cycle which reports no stage is finished."""
+        response = mock.Mock()
+        response.json.return_value = {'status': {'code': 'LOAD_FAILED'}}
+        with mock.patch.object(dic, 'getStatus', return_value=response):
+            status = dic.waitForLoad(None, 'host:1', 'c1', min_interval=0.01,
+                                     max_interval=0.02, timeout=1)
+        self.assertEqual(status['status']['code'], 'LOAD_FAILED')
+
+    def test_wait_for_cycles_timeout(self):
+        """Tests waiting is given up once the timeout is over."""
+        response = mock.Mock()
+        response.json.return_value = {'internal_stage': 'INGESTING'}
+        with mock.patch.object(dic, 'getStatus', return_value=response):
+            with self.assertRaises(TimeoutError):
+                dic.wait_for_cycles(None, 'host:1', ['c1'], min_interval=0.01,
+                                    max_interval=0.02, timeout=0.1)
+
+
+class TestParseCmd(unittest.TestCase):
+
+    ARGV = ['data_importer_client.py', '--username', 'u',
+            '--target_database', 'db', '--target_table', 't',
+            '--source_files', 'a.csv']
+
+    def test_chunks_with_enclosing_character(self):
+        """Tests files are not split when enclosed fields may hold newlines."""
+        args = dic.parseCmd(self.ARGV + ['--chunk_size_mb', '8'])
+        self.assertEqual(args.chunk_size_mb, 8)
+        args = dic.parseCmd(self.ARGV + ['--enclosing_character', '"'])
+        self.assertEqual(args.enclosing_character, '"')
+        with mock.patch('sys.stderr'), self.assertRaises(SystemExit):
+            dic.parseCmd(self.ARGV + ['--chunk_size_mb', '8',
+                                      '--enclosing_character', '"'])
+
+
+if __name__ == '__main__':
+    unittest.main()